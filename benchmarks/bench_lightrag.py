@@ -0,0 +1,161 @@
+"""Offline benchmark of LightRAG insert, query, query_many and search_web.
+
+Runs the whole pipeline against in-memory stand-ins for Supabase, the LLM
+and the browser (see lightrag.testing), on synthetic corpora of several
+sizes, and writes the results as JSON:
+
+    python benchmarks/bench_lightrag.py --sizes 1000 10000 --output bench.json
+
+Compare two result files to catch regressions; latencies are in
+milliseconds.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.storage import SupabaseStorage
+from lightrag.testing import FakeBrowser, FakeLLM, FakeSupabaseClient, generate_corpus, generate_queries
+
+MODES = ["naive", "local", "global", "semantic", "hybrid"]
+
+
+def latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/max in milliseconds and throughput of a list of durations"""
+    samples = np.array(seconds) * 1000
+    total = float(np.sum(seconds))
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "max_ms": round(float(np.max(samples)), 3),
+        "per_second": round(len(samples) / total, 2) if total > 0 else None,
+    }
+
+
+def llm_usage(llm: FakeLLM) -> Dict[str, int]:
+    usage = {"llm_calls": llm.calls, "prompt_tokens": llm.prompt_tokens}
+    llm.reset()
+    return usage
+
+
+def run_size(size: int, queries: List[str], working_dir: str, batch_size: int,
+             llm_latency: float, web_searches: int) -> Dict:
+    """Benchmark one corpus size in a fresh working directory"""
+    llm = FakeLLM(latency=llm_latency)
+    client = FakeSupabaseClient()
+    rag = LightRAG(working_dir, llm, storage=SupabaseStorage(client=client),
+                   embedding_func=hash_embedding, llm_cache=False)
+    rag.browser = FakeBrowser()
+    result: Dict = {"documents": size}
+    try:
+        docs = generate_corpus(size)
+        start = time.perf_counter()
+        rag.insert_many(docs, batch_size=batch_size)
+        seconds = time.perf_counter() - start
+        result["insert"] = {
+            "seconds": round(seconds, 3),
+            "docs_per_second": round(size / seconds, 1),
+            "storage_requests": client.requests,
+            "chunks": len(rag.chunks),
+            "entities": rag.graph.node_count,
+            **llm_usage(llm),
+        }
+
+        start = time.perf_counter()
+        recomputed = rag.update_summaries()
+        result["summaries"] = {
+            "seconds": round(time.perf_counter() - start, 3),
+            "recomputed": recomputed,
+            **llm_usage(llm),
+        }
+
+        result["query"] = {}
+        for mode in MODES:
+            param = QueryParam(mode=mode)
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                rag.query(query, param)
+                timings.append(time.perf_counter() - start)
+            result["query"][mode] = {**latency_summary(timings), **llm_usage(llm)}
+
+        result["query_many"] = {}
+        for mode in MODES:
+            start = time.perf_counter()
+            rag.query_many(queries, QueryParam(mode=mode))
+            seconds = time.perf_counter() - start
+            result["query_many"][mode] = {
+                "seconds": round(seconds, 3),
+                "per_second": round(len(queries) / seconds, 2),
+                **llm_usage(llm),
+            }
+
+        timings = []
+        for query in queries[:web_searches]:
+            start = time.perf_counter()
+            asyncio.run(rag.search_web(query))
+            timings.append(time.perf_counter() - start)
+        if timings:
+            result["search_web"] = {**latency_summary(timings), **llm_usage(llm)}
+    finally:
+        rag.close()
+    return result
+
+
+def run(sizes: Sequence[int], query_count: int = 50, batch_size: int = 500,
+        llm_latency: float = 0.0, web_searches: int = 10, working_dir: str = None) -> Dict:
+    """Benchmark every corpus size and return the JSON-serialisable report"""
+    queries = generate_queries(query_count)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"queries": query_count, "batch_size": batch_size,
+                   "llm_latency": llm_latency, "web_searches": web_searches},
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory(dir=working_dir) as root:
+        for size in sizes:
+            print(f"Benchmarking {size} documents...", file=sys.stderr)
+            report["results"].append(run_size(
+                size, queries, os.path.join(root, str(size)), batch_size, llm_latency, web_searches
+            ))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=50, help="Queries per mode")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Seconds the fake LLM sleeps per call")
+    parser.add_argument("--web-searches", type=int, default=10)
+    parser.add_argument("--working-dir", default=None, help="Parent of the temporary index directories")
+    parser.add_argument("--output", default="-", help="JSON file to write, or - for stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.queries, args.batch_size, args.llm_latency,
+                 args.web_searches, args.working_dir)
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark of sharded keyword and vector search across worker processes.
+
+Builds a BM25Index and a VectorIndex over synthetic chunks, then times the
+same queries in-process and through a ShardedIndex with each shard count
+(one worker per shard), and writes the results as JSON:
+
+    python benchmarks/bench_shards.py --size 200000 --shards 1 2 4 8 --output shards.json
+
+``speedup`` is relative to one shard, so it isolates parallel scoring from
+the fixed cost of a round trip to the pool. Expect it to grow close to
+linearly until the shard count reaches the number of cores; latencies are
+in milliseconds.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.bm25 import BM25Index
+from lightrag.shards import ShardedIndex
+from lightrag.testing import generate_corpus, generate_queries
+from lightrag.vector_index import VectorIndex
+
+from bench_lightrag import latency_summary
+
+
+def time_call(call: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+def build(size: int, dim: int, seed: int = 0):
+    """Keyword and vector indexes over ``size`` synthetic chunks, and their texts"""
+    texts = {f"chunk{i}": text for i, text in enumerate(generate_corpus(size, seed=seed))}
+    keyword = BM25Index()
+    keyword.add_many(texts.items())
+    # Random unit vectors cost the same to score as real embeddings of that width
+    vectors = VectorIndex()
+    rng = np.random.default_rng(seed)
+    ids = list(texts)
+    for start in range(0, size, 50_000):
+        vectors.add_many(ids[start:start + 50_000],
+                         rng.standard_normal((len(ids[start:start + 50_000]), dim), dtype=np.float32))
+    return texts, keyword, vectors
+
+
+def run(size: int, shard_counts: Sequence[int], query_count: int = 50, batch: int = 16,
+        dim: int = 1536, top_k: int = 10) -> Dict:
+    """Benchmark in-process search and every shard count; returns the JSON-serialisable report"""
+    print(f"Indexing {size} chunks...", file=sys.stderr)
+    texts, keyword, vectors = build(size, dim)
+    queries = generate_queries(query_count)
+    embeddings = np.random.default_rng(1).standard_normal((query_count, dim), dtype=np.float32)
+    starts = range(0, query_count, batch)
+
+    def measure(keyword_search, vector_search) -> Dict:
+        """Latency of single-query and batched searches"""
+        return {
+            "keyword": latency_summary([time_call(lambda: keyword_search([query], top_k))
+                                        for query in queries]),
+            "vector": latency_summary([time_call(lambda: vector_search(embeddings[i:i + 1], top_k))
+                                       for i in range(query_count)]),
+            "keyword_batch": latency_summary([time_call(lambda: keyword_search(queries[i:i + batch], top_k))
+                                              for i in starts]),
+            "vector_batch": latency_summary([time_call(lambda: vector_search(embeddings[i:i + batch], top_k))
+                                             for i in starts]),
+        }
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {"size": size, "queries": query_count, "batch": batch, "dim": dim, "top_k": top_k},
+        "in_process": measure(keyword.search_many, vectors.search_many),
+        "sharded": [],
+    }
+    for shards in shard_counts:
+        print(f"Benchmarking {shards} shards...", file=sys.stderr)
+        sharded = ShardedIndex(shards, workers=shards)
+        try:
+            start = time.perf_counter()
+            sharded.sync_keyword(keyword, texts.get)
+            sharded.sync_vectors(vectors)
+            load_seconds = time.perf_counter() - start
+            sharded.search_keyword(queries[:1], top_k)  # Starts the workers
+            sharded.search_vectors(embeddings[:1], top_k)
+            result = {"shards": shards, "load_ms": round(load_seconds * 1000, 3),
+                      **measure(sharded.search_keyword, sharded.search_vectors)}
+        finally:
+            sharded.close()
+        report["sharded"].append(result)
+
+    base = report["sharded"][0] if report["sharded"] else None
+    for result in report["sharded"]:
+        result["speedup"] = {name: round(base[name]["p50_ms"] / result[name]["p50_ms"], 2)
+                             for name in ("keyword", "vector", "keyword_batch", "vector_batch")}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200_000, help="Chunks to index")
+    cores = os.cpu_count() or 1
+    parser.add_argument("--shards", type=int, nargs="+",
+                        default=sorted({1, *(2 ** i for i in range(1, cores.bit_length())), cores}))
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=16, help="Queries per batched search")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding width")
+    parser.add_argument("--output", default="-", help="JSON file to write, or - for stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.size, args.shards, args.queries, args.batch, args.dim)
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,52 @@
-from .lightrag import LightRAG, QueryParam
-from .llm import gpt_4o_mini_complete, gpt_4o_complete
+import importlib
+from typing import TYPE_CHECKING
 
-__all__ = ['LightRAG', 'QueryParam', 'gpt_4o_mini_complete', 'gpt_4o_complete']
+# Public names and the submodule defining each. Submodules are imported on
+# first attribute access, so ``import lightrag`` itself costs almost nothing.
+_EXPORTS = {
+    'LightRAG': 'lightrag', 'QueryParam': 'lightrag', 'QueryResult': 'lightrag',
+    'BatchStats': 'lightrag', 'StreamEvent': 'lightrag', 'Passage': 'lightrag',
+    'gpt_4o_mini_complete': 'llm', 'gpt_4o_complete': 'llm', 'gpt_4o_mini_stream': 'llm',
+    'gpt_4o_stream': 'llm', 'complete': 'llm', 'acomplete': 'llm', 'abatch_complete': 'llm',
+    'openai_embedding': 'llm', 'hash_embedding': 'llm',
+    'BaseStorage': 'storage', 'LocalStorage': 'storage', 'SupabaseStorage': 'storage',
+    'LLMResponseCache': 'cache', 'CacheStats': 'cache',
+    'SemanticAnswerCache': 'answer_cache', 'AnswerCacheStats': 'answer_cache',
+    'CorpusMirror': 'corpus',
+    'KnowledgeGraph': 'graph', 'extract_entities': 'graph',
+    'SummaryTree': 'summaries',
+    'reciprocal_rank_fusion': 'fusion',
+    'Deduplicator': 'dedup',
+    'QueryTrace': 'tracing', 'MetricsRegistry': 'tracing', 'REGISTRY': 'tracing',
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .lightrag import LightRAG, QueryParam, QueryResult, BatchStats, StreamEvent, Passage
+    from .llm import (
+        gpt_4o_mini_complete, gpt_4o_complete, gpt_4o_mini_stream, gpt_4o_stream, complete, acomplete,
+        abatch_complete, openai_embedding, hash_embedding,
+    )
+    from .storage import BaseStorage, LocalStorage, SupabaseStorage
+    from .cache import LLMResponseCache, CacheStats
+    from .answer_cache import SemanticAnswerCache, AnswerCacheStats
+    from .corpus import CorpusMirror
+    from .graph import KnowledgeGraph, extract_entities
+    from .summaries import SummaryTree
+    from .fusion import reciprocal_rank_fusion
+    from .dedup import Deduplicator
+    from .tracing import QueryTrace, MetricsRegistry, REGISTRY
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
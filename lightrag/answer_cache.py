@@ -0,0 +1,145 @@
+"""Semantic cache of query answers keyed by query embedding"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Hashable, List, Optional, Sequence
+import numpy as np
+import logging
+
+from .vector_index import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AnswerCacheStats:
+    """Hit and miss counters of a SemanticAnswerCache"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0  # Entries dropped because the corpus changed
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class CachedAnswer:
+    """An answer served from the cache, with the query it was computed for"""
+    query: str
+    answer: str
+    documents: List[str] = field(default_factory=list)
+    similarity: float = 1.0
+
+
+@dataclass
+class _Entry:
+    query: str
+    answer: str
+    documents: List[str]
+    scope: Hashable
+    version: int
+
+
+class SemanticAnswerCache:
+    """Answers of recent queries, reused for queries with a similar embedding.
+
+    A lookup compares the query embedding with every cached one in a single
+    matrix-vector product and returns the most similar entry when its
+    cosine similarity reaches ``threshold``. Only entries with the same
+    ``scope`` (the query parameters) and corpus ``version`` are considered;
+    invalidate() drops entries cached for an older version. The least
+    recently used entry is evicted once ``max_entries`` are cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, threshold: float = 0.95):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        if not -1 <= threshold <= 1:
+            raise ValueError("threshold must be a cosine similarity in [-1, 1]")
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.stats = AnswerCacheStats()
+        self.version = 0  # Oldest corpus version still accepted by put()
+        # Slot -> entry, least recently used first; rows of _matrix are indexed by slot
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._occupied = np.zeros(max_entries, dtype=bool)
+        self._free: List[int] = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, embedding: Sequence[float], scope: Hashable = None,
+            version: int = 0) -> Optional[CachedAnswer]:
+        """Return the cached answer closest to ``embedding``, or None on a miss"""
+        query = normalize_rows(embedding)[0]
+        with self._lock:
+            best = None
+            if self._entries and self._matrix is not None and query.shape[0] == self._matrix.shape[1]:
+                scores = self._matrix @ query
+                scores[~self._occupied] = -np.inf
+                candidates = np.flatnonzero(scores >= self.threshold)
+                for slot in candidates[np.argsort(-scores[candidates], kind="stable")].tolist():
+                    entry = self._entries[slot]
+                    if entry.scope == scope and entry.version == version:
+                        best = slot
+                        break
+            if best is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.stats.hits += 1
+            entry = self._entries[best]
+            return CachedAnswer(entry.query, entry.answer, list(entry.documents), float(scores[best]))
+
+    def put(self, embedding: Sequence[float], answer: str, documents: Sequence[str] = (),
+            scope: Hashable = None, version: int = 0, query: str = "") -> None:
+        """Cache an answer; ignored when computed for a corpus version since invalidated"""
+        vector = normalize_rows(embedding)[0]
+        with self._lock:
+            if version < self.version:
+                return
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if vector.shape[0] != self._matrix.shape[1]:
+                raise ValueError(f"Expected embeddings of dimension {self._matrix.shape[1]}, "
+                                 f"got {vector.shape[0]}")
+            if not self._free:
+                slot, _ = self._entries.popitem(last=False)
+                self._occupied[slot] = False
+                self._free.append(slot)
+                self.stats.evictions += 1
+            slot = self._free.pop()
+            self._matrix[slot] = vector
+            self._occupied[slot] = True
+            self._entries[slot] = _Entry(query, answer, list(documents), scope, version)
+
+    def invalidate(self, version: int) -> int:
+        """Drop entries cached for corpus versions older than ``version``.
+
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            self.version = max(self.version, version)
+            stale = [slot for slot, entry in self._entries.items() if entry.version < version]
+            self._drop(stale)
+            self.stats.invalidations += len(stale)
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached answers")
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drop every cached answer"""
+        with self._lock:
+            self._drop(list(self._entries))
+
+    def _drop(self, slots: List[int]):
+        for slot in slots:
+            del self._entries[slot]
+            self._occupied[slot] = False
+            self._free.append(slot)
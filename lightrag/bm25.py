@@ -0,0 +1,261 @@
+"""Persistent inverted index with BM25 ranking"""
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+if TYPE_CHECKING:
+    import numpy as np
+    from .snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have how i if in
+into is it its me my no not of on or our so such than that the their them then
+there these they this to was we were what when where which who why will with
+you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric terms, dropping stopwords"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+@dataclass
+class PostingArrays:
+    """Postings of a whole index as arrays: documents of ``terms[i]`` are
+    ``rows[term_offsets[i]:term_offsets[i + 1]]``, rows indexing ``ids``"""
+    ids: List[str]
+    lengths: "np.ndarray"
+    terms: List[str]
+    term_offsets: "np.ndarray"
+    rows: "np.ndarray"
+    tfs: "np.ndarray"
+    total_length: int
+    log_offset: int  # Size of the postings log the arrays reflect
+
+
+class BM25Index:
+    """Inverted index mapping terms to postings of ``{doc_id: term_frequency}``.
+
+    Every added document is appended as one JSON line to a postings log in
+    ``working_dir``; opening the index replays the log. A search only touches
+    the postings of the query terms, so its cost grows with the number of
+    matching postings rather than with the size of the corpus.
+
+    When started from a snapshot, the postings it holds stay in
+    memory-mapped arrays sorted by term, and only the part of the log
+    written after it is replayed into the in-memory postings.
+    """
+
+    FILENAME = "bm25_postings.jsonl"
+
+    def __init__(self, working_dir: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+                 snapshot: Optional["Snapshot"] = None):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}  # Documents not in the snapshot
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self.base: Optional[SnapshotPostings] = None
+        self._lock = threading.Lock()
+        self.path = os.path.join(working_dir, self.FILENAME) if working_dir else None
+        offset = 0
+        section = snapshot.section("bm25") if snapshot else None
+        if section:
+            from .snapshot import replay_offset
+            self.base = SnapshotPostings(snapshot)
+            self.total_length = section["total_length"]
+            offset = replay_offset(self.path, section["log_offset"]) if self.path else 0
+            logger.info(f"Mapped BM25 postings of {len(self.base.ids)} documents from snapshot {snapshot.directory}")
+        if self.path and os.path.exists(self.path) and os.path.getsize(self.path) > offset:
+            self._load(offset)
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.doc_lengths) + (len(self.base.ids) if self.base else 0)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths or (self.base is not None and doc_id in self.base.rows)
+
+    def _load(self, offset: int = 0):
+        with open(self.path, encoding="utf-8") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["id"] not in self:
+                    self._add_postings(entry["id"], entry["tf"], entry["len"])
+        logger.info(f"Loaded BM25 index with {self.doc_count} documents from {self.path}")
+
+    def _add_postings(self, doc_id: str, term_freqs: Dict[str, int], length: int):
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index a single document"""
+        self.add_many([(doc_id, text)])
+
+    def add_many(self, docs: Iterable[Tuple[str, str]]) -> None:
+        """Index ``(doc_id, text)`` pairs; documents already indexed are skipped"""
+        entries = []
+        with self._lock:
+            for doc_id, text in docs:
+                if doc_id in self:
+                    continue
+                tokens = tokenize(text)
+                term_freqs = dict(Counter(tokens))
+                self._add_postings(doc_id, term_freqs, len(tokens))
+                entries.append({"id": doc_id, "tf": term_freqs, "len": len(tokens)})
+
+            if self.path and entries:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(e) + "\n" for e in entries))
+
+    def _term_scores(self, term: str, postings: List[Tuple[str, int, int]], n_docs: int,
+                     avg_len: float) -> List[Tuple[str, float]]:
+        """BM25 contribution of one term to each document containing it.
+
+        ``postings`` are ``(doc_id, tf, doc_length)`` of the documents not in the snapshot.
+        """
+        base_rows, base_tfs = self.base.term(term) if self.base else ((), ())
+        df = len(postings) + len(base_rows)
+        if not df:
+            return []
+        k1, b = self.k1, self.b
+        idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        scores = [(doc_id, idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len)))
+                  for doc_id, tf, length in postings]
+        if len(base_rows):
+            # Vectorised over the mapped arrays; numpy is already loaded by the snapshot
+            tfs = base_tfs.astype("float64")
+            lengths = self.base.lengths[base_rows]
+            values = idf * tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * lengths / avg_len))
+            ids = self.base.ids
+            scores.extend(zip([ids[row] for row in base_rows.tolist()], values.tolist()))
+        return scores
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` ``(doc_id, score)`` pairs, best first"""
+        return self.search_many([query], top_k)[0]
+
+    def search_many(self, queries: Sequence[str], top_k: int = 5) -> List[List[Tuple[str, float]]]:
+        """search() for several queries; the postings of a term shared by
+        several queries are scored once"""
+        results: List[List[Tuple[str, float]]] = [[] for _ in queries]
+        by_term: Dict[str, List[int]] = {}
+        for position, query in enumerate(queries):
+            for term in set(tokenize(query)):
+                by_term.setdefault(term, []).append(position)
+
+        # Copy what is needed under the lock, so inserts on other threads can go on while scoring
+        with self._lock:
+            n_docs = self.doc_count
+            total_length = self.total_length
+            doc_lengths = self.doc_lengths
+            postings = {term: [(doc_id, tf, doc_lengths[doc_id]) for doc_id, tf in self.postings[term].items()]
+                        for term in by_term if term in self.postings}
+        if not n_docs:
+            return results
+
+        avg_len = total_length / n_docs or 1.0
+        scores: List[Dict[str, float]] = [{} for _ in queries]
+        for term, positions in by_term.items():
+            contributions = self._term_scores(term, postings.get(term, []), n_docs, avg_len)
+            for position in positions:
+                query_scores = scores[position]
+                for doc_id, value in contributions:
+                    query_scores[doc_id] = query_scores.get(doc_id, 0.0) + value
+
+        for position, query_scores in enumerate(scores):
+            results[position] = heapq.nlargest(top_k, query_scores.items(), key=lambda item: item[1])
+        return results
+
+    def ids_since(self, start: int) -> List[str]:
+        """Ids of the documents indexed after the first ``start``, in the order they were added"""
+        with self._lock:
+            base = self.base.ids if self.base else []
+            return base[start:] + list(itertools.islice(self.doc_lengths, max(start - len(base), 0), None))
+
+    def export(self) -> PostingArrays:
+        """Every posting, in compressed sparse row form sorted by term"""
+        import numpy as np
+        from .snapshot import log_size
+        with self._lock:
+            base = self.base
+            ids = (list(base.ids) if base else []) + list(self.doc_lengths)
+            row_of = {doc_id: row for row, doc_id in enumerate(ids)}
+            lengths = np.array(list(self.doc_lengths.values()), dtype=np.int32)
+            if base:
+                lengths = np.concatenate([base.lengths, lengths])
+            terms = sorted(set(base.terms if base else ()) | set(self.postings))
+            term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            rows, tfs = [], []
+            count = 0
+            for position, term in enumerate(terms):
+                if base:
+                    base_rows, base_tfs = base.term(term)
+                    rows.append(np.asarray(base_rows, dtype=np.int32))
+                    tfs.append(np.asarray(base_tfs, dtype=np.int32))
+                    count += len(base_rows)
+                postings = self.postings.get(term)
+                if postings:
+                    rows.append(np.fromiter((row_of[doc_id] for doc_id in postings), dtype=np.int32,
+                                            count=len(postings)))
+                    tfs.append(np.fromiter(postings.values(), dtype=np.int32, count=len(postings)))
+                    count += len(postings)
+                term_offsets[position + 1] = count
+            return PostingArrays(
+                ids=ids, lengths=lengths, terms=terms, term_offsets=term_offsets,
+                rows=np.concatenate(rows) if rows else np.zeros(0, np.int32),
+                tfs=np.concatenate(tfs) if tfs else np.zeros(0, np.int32),
+                total_length=self.total_length, log_offset=log_size(self.path),
+            )
+
+    def write_snapshot(self, directory: str) -> Dict:
+        """Write all postings, sorted by term, to a snapshot directory; returns its manifest section"""
+        from .snapshot import save_array, save_lines
+        arrays = self.export()
+        save_lines(directory, "bm25_ids.txt", arrays.ids)
+        save_lines(directory, "terms.txt", arrays.terms)
+        save_array(directory, "doc_lengths.npy", arrays.lengths)
+        save_array(directory, "term_offsets.npy", arrays.term_offsets)
+        save_array(directory, "posting_rows.npy", arrays.rows)
+        save_array(directory, "posting_tfs.npy", arrays.tfs)
+        return {"documents": len(arrays.ids), "terms": len(arrays.terms),
+                "total_length": arrays.total_length, "log_offset": arrays.log_offset}
+
+
+class SnapshotPostings:
+    """Postings of the documents in a snapshot, read from memory-mapped arrays"""
+
+    def __init__(self, snapshot: "Snapshot"):
+        self.ids = snapshot.lines("bm25_ids.txt")
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.terms = {term: position for position, term in enumerate(snapshot.lines("terms.txt"))}
+        self.lengths = snapshot.array("doc_lengths.npy")
+        self.term_offsets = snapshot.array("term_offsets.npy")
+        self.posting_rows = snapshot.array("posting_rows.npy")
+        self.posting_tfs = snapshot.array("posting_tfs.npy")
+
+    def term(self, term: str):
+        """``(rows, term frequencies)`` arrays of the documents containing term"""
+        position = self.terms.get(term)
+        if position is None:
+            return (), ()
+        start, end = int(self.term_offsets[position]), int(self.term_offsets[position + 1])
+        return self.posting_rows[start:end], self.posting_tfs[start:end]
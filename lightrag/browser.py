@@ -1,10 +1,15 @@
 """Browser integration for LightRAG"""
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Optional, Sequence, Tuple
 from dataclasses import dataclass
-from browser_use import Agent, Controller
-from langchain_openai import ChatOpenAI
+from urllib.parse import urlsplit, urlunsplit
+import asyncio
 import logging
 
+if TYPE_CHECKING:
+    # browser_use and langchain_openai take seconds to import; they are
+    # loaded when the first BrowserManager is created
+    from browser_use import Agent, Controller
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,26 +25,66 @@ class BrowseResult:
     done: bool = False
     error: Optional[str] = None
 
+# Builds an agent for a task on a given controller; must provide ``async step()``
+AgentFactory = Callable[[str, "Controller"], "Agent"]
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL for deduplication: no fragment, lowercase host, no trailing slash"""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
 class BrowserManager:
-    def __init__(self, model_name: str = MODEL_NAME, timeout: int = 25):
-        """Initialize browser manager with a controller to maintain state"""
-        self.controller = Controller()
+    def __init__(self, model_name: str = MODEL_NAME, timeout: int = 25,
+                 agent_factory: Optional[AgentFactory] = None,
+                 controller_factory: Optional[Callable[[], "Controller"]] = None):
+        """Initialize browser manager with a controller to maintain state
+
+        Args:
+            model_name: Model driving the browser agents
+            timeout: LLM request timeout of each agent, in seconds
+            agent_factory: Builds the agent for a task and controller; defaults to
+                a browser_use Agent. Pass a stub to run without a browser.
+            controller_factory: Creates the browser state an agent runs on; defaults
+                to a browser_use Controller. Pass a stub along with agent_factory
+                to run without browser_use installed.
+        """
+        self.controller_factory = controller_factory or self._create_controller
+        self.controller = self.controller_factory()
         self.model_name = model_name
         self.timeout = timeout
+        self.agent_factory = agent_factory or self._create_agent
+        self._idle_controllers: List["Controller"] = [self.controller]
         logger.info(f"Initialized BrowserManager with model {model_name}")
-        
-    async def search_and_extract(self, query: str, max_steps: int = 20) -> BrowseResult:
+
+    @staticmethod
+    def _create_controller() -> "Controller":
+        from browser_use import Controller
+        return Controller()
+
+    def _create_agent(self, task: str, controller: "Controller") -> "Agent":
+        from browser_use import Agent
+        from langchain_openai import ChatOpenAI
+        return Agent(
+            task=task,
+            llm=ChatOpenAI(
+                model=self.model_name,
+                timeout=self.timeout,
+                stop=None
+            ),
+            controller=controller
+        )
+
+    async def search_and_extract(self, query: str, max_steps: int = 20,
+                                 controller: Optional["Controller"] = None) -> BrowseResult:
         """Search the web and extract relevant information"""
         logger.info(f"Starting web search for query: {query}")
         try:
-            agent = Agent(
-                task=f"Go to google.com and find information about: {query}",
-                llm=ChatOpenAI(
-                    model=self.model_name,
-                    timeout=self.timeout,
-                    stop=None
-                ),
-                controller=self.controller
+            agent = self.agent_factory(
+                f"Go to google.com and find information about: {query}",
+                controller or self.controller
             )
             logger.info("Created browser agent")
             
@@ -69,8 +114,9 @@ class BrowserManager:
                     
             logger.warning("Max steps reached without completion")
             return BrowseResult(
-                content="Max steps reached without completion",
+                content="",
                 url="",
+                error="Max steps reached without completion",
                 done=True
             )
             
@@ -83,8 +129,50 @@ class BrowserManager:
                 done=True
             )
     
+    async def search_many(self, queries: Sequence[str], concurrency: int = 4,
+                          timeout: Optional[float] = None,
+                          max_steps: int = 20) -> AsyncIterator[Tuple[int, BrowseResult]]:
+        """Run many searches concurrently on a pool of controllers.
+
+        Each running search holds its own controller, so agents never share
+        browser state. A search taking longer than ``timeout`` seconds is
+        cancelled and reported as an error.
+
+        Yields:
+            ``(index into queries, result)`` in completion order
+        """
+        pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(min(concurrency, len(queries))):
+            pool.put_nowait(self._idle_controllers.pop() if self._idle_controllers
+                           else self.controller_factory())
+
+        async def run(index: int, query: str) -> Tuple[int, BrowseResult]:
+            controller = await pool.get()
+            try:
+                result = await asyncio.wait_for(
+                    self.search_and_extract(query, max_steps, controller), timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Web search for {query!r} timed out after {timeout}s")
+                result = BrowseResult(content="", url="", error=f"Timed out after {timeout}s", done=True)
+            finally:
+                pool.put_nowait(controller)
+            return index, result
+
+        tasks = [asyncio.ensure_future(run(i, query)) for i, query in enumerate(queries)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            while not pool.empty():
+                self._idle_controllers.append(pool.get_nowait())
+
     def close(self):
         """Clean up browser resources"""
         if hasattr(self, 'controller'):
             logger.info("Cleaning up browser resources")
             self.controller = None
+            self._idle_controllers = []
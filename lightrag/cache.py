@@ -0,0 +1,151 @@
+"""Two-tier cache for LLM responses"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    """Hit and miss counters of an LLMResponseCache"""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LLMResponseCache:
+    """LLM responses keyed by a hash of model, prompt and temperature.
+
+    Lookups go to an in-memory LRU first and then to a SQLite file in
+    ``working_dir``; a disk hit is promoted into memory. Entries older than
+    ``ttl`` seconds are treated as misses, and each tier is trimmed back to
+    its size limit by dropping the least recently used entries.
+    """
+
+    FILENAME = "llm_cache.db"
+
+    def __init__(self, working_dir: Optional[str] = None, max_memory_entries: int = 1024,
+                 max_disk_entries: int = 100_000, ttl: Optional[float] = None):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if working_dir:
+            os.makedirs(working_dir, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(working_dir, self.FILENAME),
+                                         check_same_thread=False)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, "
+                    "response TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, "
+                    "accessed_at REAL NOT NULL)"
+                )
+            self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: Optional[float]) -> str:
+        payload = json.dumps([model, prompt, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, key: str, persistent: bool = True) -> Optional[str]:
+        """Return the cached response for ``key``, or None on a miss; ``persistent=False`` skips the disk tier"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return entry[0]
+
+            if self._conn is not None and persistent:
+                row = self._conn.execute(
+                    "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    with self._conn:
+                        self._conn.execute(
+                            "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                    self._remember(key, row[0], row[1])
+                    self.stats.disk_hits += 1
+                    return row[0]
+
+            self.stats.misses += 1
+            return None
+
+    def set(self, key: str, response: str, persistent: bool = True) -> None:
+        """Store a response in both tiers, or in memory only with ``persistent=False``"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            if self._conn is None or not persistent:
+                return
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, response, now, now)
+                )
+            self._disk_entries += 1
+            # Trim in chunks so the occasional DELETE is amortised over many writes
+            if self._disk_entries > self.max_disk_entries * 1.1:
+                self._trim_disk()
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _trim_disk(self):
+        with self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,)
+            )
+        self.stats.evictions += max(cursor.rowcount, 0)
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def clear(self) -> None:
+        """Drop every cached response"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM llm_cache")
+                self._disk_entries = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
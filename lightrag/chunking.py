@@ -0,0 +1,230 @@
+"""Document chunking and token-budgeted context packing"""
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+import logging
+
+if TYPE_CHECKING:
+    from .snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+# Words and individual punctuation marks; close enough to BPE token counts
+# for budgeting, and much cheaper than running a real tokenizer.
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+T = TypeVar("T")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local estimate of the number of LLM tokens in text"""
+    return sum(1 for _ in TOKEN_PATTERN.finditer(text))
+
+
+def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50) -> List[Tuple[int, int]]:
+    """Split text into overlapping windows of about ``chunk_size`` tokens.
+
+    Returns:
+        ``(start, end)`` character offsets of each chunk; consecutive chunks
+        share ``overlap`` tokens
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+    spans = [m.span() for m in TOKEN_PATTERN.finditer(text)]
+    if len(spans) <= chunk_size:
+        return [(0, len(text))]
+
+    offsets = []
+    step = chunk_size - overlap
+    for first in range(0, len(spans), step):
+        last = min(first + chunk_size, len(spans)) - 1
+        offsets.append((spans[first][0], spans[last][1]))
+        if last == len(spans) - 1:
+            break
+    return offsets
+
+
+def pack_context(candidates: Sequence[Tuple[T, str]], max_tokens: int) -> List[Tuple[T, str]]:
+    """Take ``(key, text)`` candidates in rank order while they fit in ``max_tokens``.
+
+    A candidate that does not fit is skipped so that smaller, lower ranked
+    ones can still use the remaining budget.
+    """
+    packed = []
+    remaining = max_tokens
+    for key, text in candidates:
+        cost = estimate_tokens(text)
+        if cost <= remaining:
+            packed.append((key, text))
+            remaining -= cost
+    return packed
+
+
+@dataclass
+class Chunk:
+    """A slice of a document, addressed by character offsets"""
+    id: str
+    doc_id: str
+    start: int
+    end: int
+
+
+class ChunkStore:
+    """Chunk offsets of every indexed document.
+
+    Each document's chunks are appended as one JSON line to ``chunks.jsonl``
+    in ``working_dir``. Only offsets are kept; chunk text is sliced from the
+    document content on demand. When started from a snapshot, offsets of
+    the documents it holds are read from memory-mapped arrays and only the
+    part of the log written after it is replayed.
+    """
+
+    FILENAME = "chunks.jsonl"
+
+    def __init__(self, working_dir: Optional[str] = None, chunk_size: int = 300, overlap: int = 50,
+                 snapshot: Optional["Snapshot"] = None):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.chunks: Dict[str, Chunk] = {}  # Chunks not in the snapshot
+        self.by_doc: Dict[str, List[Chunk]] = {}
+        self.base: Optional[SnapshotChunks] = None
+        self._lock = threading.Lock()
+        self.path = os.path.join(working_dir, self.FILENAME) if working_dir else None
+        offset = 0
+        section = snapshot.section("chunks") if snapshot else None
+        if section:
+            from .snapshot import replay_offset
+            self.base = SnapshotChunks(snapshot)
+            offset = replay_offset(self.path, section["log_offset"]) if self.path else 0
+            logger.info(f"Mapped {len(self.base)} chunks from snapshot {snapshot.directory}")
+        if self.path and os.path.exists(self.path) and os.path.getsize(self.path) > offset:
+            self._load(offset)
+
+    def __len__(self) -> int:
+        return len(self.chunks) + (len(self.base) if self.base else 0)
+
+    def has_doc(self, doc_id: str) -> bool:
+        """Whether the document has been chunked"""
+        return doc_id in self.by_doc or (self.base is not None and doc_id in self.base.rows)
+
+    def _load(self, offset: int = 0):
+        with open(self.path, encoding="utf-8") as f:
+            f.seek(offset)
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if not self.has_doc(entry["doc"]):
+                        self._remember(entry["doc"], entry["spans"])
+        logger.info(f"Loaded {len(self)} chunks from {self.path}")
+
+    def _remember(self, doc_id: str, spans: List[List[int]]) -> List[Chunk]:
+        chunks = [Chunk(f"{doc_id}#{i}", doc_id, start, end) for i, (start, end) in enumerate(spans)]
+        self.by_doc[doc_id] = chunks
+        for chunk in chunks:
+            self.chunks[chunk.id] = chunk
+        return chunks
+
+    def get(self, chunk_id: str) -> Optional[Chunk]:
+        chunk = self.chunks.get(chunk_id)
+        if chunk is None and self.base is not None:
+            chunk = self.base.get(chunk_id)
+        return chunk
+
+    def chunk_ids(self) -> List[str]:
+        """Ids of every chunk, in the order their documents were chunked"""
+        with self._lock:
+            ids = self.base.chunk_ids() if self.base is not None else []
+            ids.extend(self.chunks)
+        return ids
+
+    def split(self, docs: Iterable[Tuple[str, str]]) -> List[Chunk]:
+        """Chunks of ``(doc_id, content)`` pairs: the stored ones of known documents,
+        freshly computed ones of the others, which are not stored until commit()"""
+        chunks = []
+        for doc_id, content in docs:
+            known = self.by_doc.get(doc_id)
+            if known is None and self.base is not None and doc_id in self.base.rows:
+                known = self.base.doc_chunks(doc_id)
+            if known is not None:
+                chunks.extend(known)
+                continue
+            spans = chunk_text(content, self.chunk_size, self.overlap)
+            chunks.extend(Chunk(f"{doc_id}#{i}", doc_id, start, end) for i, (start, end) in enumerate(spans))
+        return chunks
+
+    def commit(self, chunks: Iterable[Chunk]) -> None:
+        """Store chunks from split(); documents already stored are skipped"""
+        by_doc: Dict[str, Dict[str, List[int]]] = {}
+        for chunk in chunks:
+            by_doc.setdefault(chunk.doc_id, {})[chunk.id] = [chunk.start, chunk.end]
+        entries = []
+        with self._lock:
+            for doc_id, doc_chunks in by_doc.items():
+                doc_spans = list(doc_chunks.values())
+                if not self.has_doc(doc_id):
+                    self._remember(doc_id, doc_spans)
+                    entries.append({"doc": doc_id, "spans": doc_spans})
+            if self.path and entries:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(e) + "\n" for e in entries))
+
+    def add_many(self, docs: Iterable[Tuple[str, str]]) -> List[Chunk]:
+        """Chunk ``(doc_id, content)`` pairs, store them and return the chunks of all of them"""
+        chunks = self.split(docs)
+        self.commit(chunks)
+        return chunks
+
+    def write_snapshot(self, directory: str) -> Dict:
+        """Write every document's chunk offsets to a snapshot directory; returns its manifest section"""
+        import numpy as np
+        from .snapshot import log_size, save_array, save_lines
+        with self._lock:
+            doc_ids = (list(self.base.ids) if self.base else []) + list(self.by_doc)
+            spans = []
+            offsets = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+            for row, doc_id in enumerate(doc_ids):
+                chunks = self.by_doc.get(doc_id) or self.base.doc_chunks(doc_id)
+                spans.extend((chunk.start, chunk.end) for chunk in chunks)
+                offsets[row + 1] = len(spans)
+            log_offset = log_size(self.path)
+        save_lines(directory, "chunk_docs.txt", doc_ids)
+        save_array(directory, "chunk_offsets.npy", offsets)
+        save_array(directory, "chunk_spans.npy", np.array(spans, dtype=np.int32).reshape(-1, 2))
+        return {"chunks": len(spans), "documents": len(doc_ids), "log_offset": log_offset}
+
+
+class SnapshotChunks:
+    """Chunk offsets of the documents in a snapshot, read from memory-mapped arrays"""
+
+    def __init__(self, snapshot: "Snapshot"):
+        self.ids = snapshot.lines("chunk_docs.txt")
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.offsets = snapshot.array("chunk_offsets.npy")
+        self.spans = snapshot.array("chunk_spans.npy")
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def chunk_ids(self) -> List[str]:
+        counts = (self.offsets[1:] - self.offsets[:-1]).tolist()
+        return [f"{doc_id}#{i}" for doc_id, count in zip(self.ids, counts) for i in range(count)]
+
+    def doc_chunks(self, doc_id: str) -> List[Chunk]:
+        row = self.rows[doc_id]
+        first, last = int(self.offsets[row]), int(self.offsets[row + 1])
+        return [Chunk(f"{doc_id}#{i}", doc_id, int(start), int(end))
+                for i, (start, end) in enumerate(self.spans[first:last].tolist())]
+
+    def get(self, chunk_id: str) -> Optional[Chunk]:
+        doc_id, _, index = chunk_id.rpartition("#")
+        row = self.rows.get(doc_id)
+        if row is None or not index.isdigit():
+            return None
+        position = int(self.offsets[row]) + int(index)
+        if position >= int(self.offsets[row + 1]):
+            return None
+        start, end = self.spans[position].tolist()
+        return Chunk(chunk_id, doc_id, start, end)
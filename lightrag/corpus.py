@@ -0,0 +1,167 @@
+"""In-process mirror of the documents table"""
+import itertools
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+import logging
+
+from .storage import BaseStorage, utc_now
+
+if TYPE_CHECKING:
+    from .snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusMirror:
+    """Local copy of every stored document, kept current incrementally.
+
+    The first refresh loads the whole table with keyset pagination on
+    ``(created_at, id)``, one page of at most ``page_size`` rows at a time,
+    so corpora larger than the PostgREST ``max_rows`` limit load completely.
+    Later refreshes only ask for rows past the ``(created_at, id)``
+    high-water mark, which is an empty page when nothing changed.
+
+    Rows whose ``created_at`` is older than the high-water mark when they
+    become visible (a transaction that committed late) are not picked up.
+
+    When started from a snapshot, the documents it holds are read from the
+    memory-mapped text blob and only rows past its high-water mark are
+    fetched.
+    """
+
+    def __init__(self, storage: BaseStorage, page_size: int = 1000,
+                 refresh_interval: float = 0.0, snapshot: Optional["Snapshot"] = None):
+        """
+        Args:
+            storage: Backend to mirror
+            page_size: Rows per request; keep at or below the server's max_rows
+            refresh_interval: Minimum seconds between two checks for new rows
+            snapshot: Snapshot to start from
+        """
+        self.storage = storage
+        self.page_size = page_size
+        self.refresh_interval = refresh_interval
+        self.documents: Dict[str, Dict] = {}  # Documents not in the snapshot
+        self.base: Mapping[str, Dict] = {}
+        self.high_water_mark: Optional[Tuple[str, str]] = None
+        self._last_refresh = float("-inf")
+        self._lock = threading.Lock()
+        section = snapshot.section("corpus") if snapshot else None
+        if section:
+            self.base = SnapshotDocuments(snapshot)
+            mark = section["high_water_mark"]
+            self.high_water_mark = tuple(mark) if mark else None
+            logger.info(f"Mapped {len(self.base)} documents from snapshot {snapshot.directory}")
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.documents)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.documents or doc_id in self.base
+
+    def refresh(self, force: bool = False) -> List[Dict]:
+        """Pull rows added since the last refresh and return the ones not seen before"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return []
+            self._last_refresh = now
+
+            new_docs = []
+            pages = 0
+            while True:
+                page = self.storage.fetch_page(self.high_water_mark, self.page_size)
+                if not page:
+                    break
+                pages += 1
+                for doc in page:
+                    if doc["id"] in self.base:
+                        continue
+                    if doc["id"] not in self.documents:
+                        new_docs.append(doc)
+                    self.documents[doc["id"]] = doc
+                last = page[-1]
+                self.high_water_mark = (last["created_at"], last["id"])
+
+            if new_docs:
+                logger.info(f"Mirrored {len(new_docs)} new documents in {pages} pages "
+                            f"({len(self.documents)} total)")
+            return new_docs
+
+    def add(self, rows: Iterable[Tuple[str, str]]) -> None:
+        """Record documents this process just wrote, without waiting for a refresh"""
+        created_at = utc_now()
+        with self._lock:
+            for doc_id, content in rows:
+                if doc_id not in self.base:
+                    self.documents.setdefault(
+                        doc_id, {"id": doc_id, "content": content, "created_at": created_at}
+                    )
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        doc = self.documents.get(doc_id)
+        return doc if doc is not None else self.base.get(doc_id)
+
+    def get_many(self, doc_ids: Iterable[str]) -> List[Dict]:
+        """Documents for the given ids in the same order, skipping unknown ids"""
+        docs = (self.get(doc_id) for doc_id in doc_ids)
+        return [doc for doc in docs if doc is not None]
+
+    def ids(self) -> Iterator[str]:
+        """Ids of all documents, without reading their contents"""
+        with self._lock:
+            ids = list(self.documents)
+        return itertools.chain(self.base, ids)
+
+    def all(self) -> List[Dict]:
+        return [self.base[doc_id] for doc_id in self.base] + list(self.documents.values())
+
+    def write_snapshot(self, directory: str) -> Dict:
+        """Write every document to a snapshot directory; returns its manifest section"""
+        import numpy as np
+        from .snapshot import save_array, save_lines
+        with self._lock:
+            docs = self.all()
+            mark = self.high_water_mark
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        with open(os.path.join(directory, "texts.bin"), "wb") as f:
+            for row, doc in enumerate(docs):
+                offsets[row + 1] = offsets[row] + f.write(doc["content"].encode("utf-8"))
+        save_array(directory, "text_offsets.npy", offsets)
+        save_lines(directory, "documents.txt", (f"{doc['id']}\t{doc.get('created_at') or ''}" for doc in docs))
+        return {"documents": len(docs), "high_water_mark": list(mark) if mark else None}
+
+
+class SnapshotDocuments(Mapping):
+    """Read-only ``{doc_id: document}`` view of the documents in a snapshot.
+
+    Contents are decoded from the memory-mapped text blob on access.
+    """
+
+    def __init__(self, snapshot: "Snapshot"):
+        self.ids: List[str] = []
+        self.created_at: List[str] = []
+        for line in snapshot.lines("documents.txt"):
+            doc_id, _, created_at = line.partition("\t")
+            self.ids.append(doc_id)
+            self.created_at.append(created_at)
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.offsets = snapshot.array("text_offsets.npy")
+        self.texts = snapshot.blob("texts.bin")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self.rows
+
+    def __getitem__(self, doc_id: str) -> Dict:
+        row = self.rows[doc_id]
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        content = self.texts[start:end].decode("utf-8")
+        return {"id": doc_id, "content": content, "created_at": self.created_at[row] or None}
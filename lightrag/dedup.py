@@ -0,0 +1,225 @@
+"""Exact and near-duplicate detection of documents with MinHash and LSH"""
+import hashlib
+import os
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+SHINGLE_SIZE = 3  # Words per shingle
+_PRIME = 4294967291  # Largest prime below 2**32, so hashes fit in uint32
+_EMPTY = np.uint32(0xFFFFFFFF)
+_BLOCK = 4096  # Shingles hashed per numpy pass, bounding temporary memory
+
+
+def content_hash(text: str) -> str:
+    """Hash of the text with case and whitespace differences removed"""
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def shingles(text: str) -> Set[int]:
+    """CRC32 hashes of the overlapping word 3-grams of the text"""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = (" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+    return {zlib.crc32(gram.encode("utf-8")) for gram in grams}
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """``(bands, rows)`` with ``bands * rows == num_perm`` for a Jaccard threshold.
+
+    Two documents become candidates with probability ``1 - (1 - s**rows) ** bands``
+    at similarity ``s``; the curve is steepest around ``(1 / bands) ** (1 / rows)``.
+    That point is placed as close below the threshold as possible, so few
+    true duplicates are missed and candidates are verified afterwards.
+    """
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    below = [(b, r) for b, r in options if (1 / b) ** (1 / r) <= threshold]
+    return max(below or options, key=lambda br: (1 / br[0]) ** (1 / br[1]))
+
+
+class MinHasher:
+    """MinHash signatures from ``num_perm`` universal hash functions"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        # a * x stays below 2**63 for 32-bit shingle hashes, so uint64 cannot overflow
+        self.a = rng.randint(1, 1 << 31, num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 31, num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(shingles(text), dtype=np.uint64)
+        signature = np.full(self.num_perm, _EMPTY, dtype=np.uint32)
+        for start in range(0, len(hashes), _BLOCK):
+            block = hashes[start:start + _BLOCK, None]
+            values = (block * self.a + self.b) % _PRIME
+            np.minimum(signature, values.min(axis=0).astype(np.uint32), out=signature)
+        return signature
+
+
+class Deduplicator:
+    """Fingerprints of stored documents for insert-time duplicate detection.
+
+    A document is an exact duplicate when its normalised content hash is
+    known, and a near duplicate when the estimated Jaccard similarity of
+    its word 3-grams to a stored document reaches ``threshold``. Candidates
+    come from an LSH index over banded MinHash signatures, so a check costs
+    a fixed number of bucket lookups however large the corpus is.
+
+    Signatures are appended to ``minhash.u32`` and ``doc_id<TAB>hash`` lines
+    to ``minhash_ids.txt`` in ``working_dir``; buckets are rebuilt on load.
+    """
+
+    SIGNATURES_FILENAME = "minhash.u32"
+    IDS_FILENAME = "minhash_ids.txt"
+
+    def __init__(self, working_dir: Optional[str] = None, threshold: float = 0.9,
+                 num_perm: int = 128):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self.ids: List[str] = []
+        self.id_set: Set[str] = set()
+        self.exact: Dict[str, str] = {}
+        self.signatures: List[np.ndarray] = []
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._pending: Dict[str, Tuple[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.signatures_path = os.path.join(working_dir, self.SIGNATURES_FILENAME) if working_dir else None
+        self.ids_path = os.path.join(working_dir, self.IDS_FILENAME) if working_dir else None
+        if self.ids_path and os.path.exists(self.ids_path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.id_set
+
+    def _load(self):
+        with open(self.ids_path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        raw = np.fromfile(self.signatures_path, dtype=np.uint32)
+        num_perm = self.hasher.num_perm
+        signatures = raw[:raw.size - raw.size % num_perm].reshape(-1, num_perm)
+        # A crash between the two appends can leave one file longer than the other
+        count = min(len(lines), len(signatures))
+        for line, signature in zip(lines[:count], signatures[:count]):
+            doc_id, digest = line.split("\t")
+            self._remember(doc_id, digest, signature)
+        logger.info(f"Loaded {count} document fingerprints from {self.signatures_path}")
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        rows = self.rows
+        return [signature[band * rows:(band + 1) * rows].tobytes() for band in range(self.bands)]
+
+    def _remember(self, doc_id: str, digest: str, signature: np.ndarray):
+        index = len(self.ids)
+        self.ids.append(doc_id)
+        self.id_set.add(doc_id)
+        self.exact.setdefault(digest, doc_id)
+        self.signatures.append(signature)
+        for buckets, key in zip(self.buckets, self._band_keys(signature)):
+            buckets.setdefault(key, []).append(index)
+
+    def _match(self, signature: np.ndarray, keys: List[bytes], buckets: List[Dict[bytes, List[int]]],
+               signatures: List[np.ndarray], ids: List[str]) -> Optional[str]:
+        """Id of a document in the given LSH buckets similar enough to the signature"""
+        candidates = set()
+        for band, key in zip(buckets, keys):
+            candidates.update(band.get(key, ()))
+        for index in candidates:
+            if np.mean(signatures[index] == signature) >= self.threshold:
+                return ids[index]
+        return None
+
+    def filter(self, rows: Sequence[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], Dict[str, str]]:
+        """Split ``(doc_id, content)`` rows into new documents and duplicates.
+
+        Rows are also checked against earlier rows of the same call. New
+        documents are fingerprinted but only remembered once commit() is
+        called with their ids, after they have been stored.
+
+        Returns:
+            ``(new_rows, duplicates)`` where ``duplicates`` maps the id of each
+            skipped row to the id of the document it duplicates
+        """
+        new_rows = []
+        duplicates: Dict[str, str] = {}
+        batch_exact: Dict[str, str] = {}
+        batch_ids: List[str] = []
+        batch_signatures: List[np.ndarray] = []
+        batch_buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        with self._lock:
+            for doc_id, content in rows:
+                if doc_id in self.id_set or doc_id in self._pending:
+                    duplicates[doc_id] = doc_id
+                    continue
+                digest = content_hash(content)
+                existing = self.exact.get(digest) or batch_exact.get(digest)
+                if existing is None:
+                    signature = self.hasher.signature(content)
+                    keys = self._band_keys(signature)
+                    existing = (self._match(signature, keys, self.buckets, self.signatures, self.ids)
+                                or self._match(signature, keys, batch_buckets, batch_signatures, batch_ids))
+                if existing is not None:
+                    duplicates[doc_id] = existing
+                    continue
+                batch_exact[digest] = doc_id
+                for band, key in zip(batch_buckets, keys):
+                    band.setdefault(key, []).append(len(batch_ids))
+                batch_ids.append(doc_id)
+                batch_signatures.append(signature)
+                self._pending[doc_id] = (digest, signature)
+                new_rows.append((doc_id, content))
+        if duplicates:
+            logger.info(f"Skipped {len(duplicates)} duplicate documents")
+        return new_rows, duplicates
+
+    def commit(self, doc_ids: Iterable[str]) -> None:
+        """Remember documents returned by filter() once they are stored"""
+        with self._lock:
+            entries = []
+            for doc_id in doc_ids:
+                pending = self._pending.pop(doc_id, None)
+                if pending is not None and doc_id not in self.id_set:
+                    self._remember(doc_id, *pending)
+                    entries.append((doc_id, *pending))
+            self._persist(entries)
+
+    def discard(self, doc_ids: Iterable[str]) -> None:
+        """Forget documents returned by filter() that could not be stored"""
+        with self._lock:
+            for doc_id in doc_ids:
+                self._pending.pop(doc_id, None)
+
+    def add_many(self, rows: Iterable[Tuple[str, str]]) -> None:
+        """Fingerprint documents that are already stored, without checking them"""
+        with self._lock:
+            entries = []
+            for doc_id, content in rows:
+                if doc_id in self.id_set:
+                    continue
+                entry = (doc_id, content_hash(content), self.hasher.signature(content))
+                self._remember(*entry)
+                entries.append(entry)
+            self._persist(entries)
+
+    def _persist(self, entries: List[Tuple[str, str, np.ndarray]]):
+        if not self.ids_path or not entries:
+            return
+        with open(self.signatures_path, "ab") as f:
+            f.write(b"".join(signature.tobytes() for _, _, signature in entries))
+        with open(self.ids_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{doc_id}\t{digest}\n" for doc_id, digest, _ in entries))
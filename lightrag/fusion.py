@@ -0,0 +1,22 @@
+"""Rank fusion of candidate lists from several retrievers"""
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[Sequence[Hashable]], k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[Hashable, float]]:
+    """Merge ranked lists with reciprocal rank fusion.
+
+    Each item scores ``weight / (k + rank)`` summed over the lists it
+    appears in (rank starting at 1). Only ranks matter, so retrievers with
+    incomparable score scales (BM25, cosine similarity) can be combined.
+
+    Returns:
+        ``(item, score)`` pairs, best first; every item appears once
+    """
+    if weights is None:
+        weights = [1.0] * len(ranked_lists)
+    scores: Dict[Hashable, float] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, item in enumerate(ranked, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
@@ -0,0 +1,241 @@
+"""Entity/relation graph built from document chunks"""
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+from collections import deque
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+if TYPE_CHECKING:
+    from .snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+Extraction = Tuple[List[str], List[Tuple[str, str]]]
+
+# Runs of capitalised words: "Supervised Fine-Tuning", "PyTorch", "LoRA"
+ENTITY_PATTERN = re.compile(r"\b[A-Z][\w-]*(?:\s+[A-Z][\w-]*)*")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD_PATTERN = re.compile(r"[\w-]+")
+MAX_ENTITY_WORDS = 4
+
+# Capitalised only because they start a sentence
+LEADING_STOPWORDS = frozenset("""
+a an and as at but by for from how i if in is it its of on or so that the their
+these this those to what when where which who why with
+""".split())
+
+
+def normalize_entity(name: str) -> str:
+    """Case-insensitive key of an entity name"""
+    return " ".join(WORD_PATTERN.findall(name.lower()))
+
+
+def extract_entities(text: str) -> Extraction:
+    """Heuristic, LLM-free entity and relation extraction.
+
+    Entities are runs of capitalised words; two entities are related when
+    they appear in the same sentence.
+
+    Returns:
+        ``(entities, relations)`` where relations are pairs of entity names
+    """
+    entities = []
+    relations = []
+    for sentence in SENTENCE_PATTERN.split(text):
+        found = []
+        for match in ENTITY_PATTERN.finditer(sentence):
+            words = match.group().split()
+            while words and words[0].lower() in LEADING_STOPWORDS:
+                words = words[1:]
+            if words and len(words) <= MAX_ENTITY_WORDS:
+                found.append(" ".join(words))
+        found = list(dict.fromkeys(found))
+        entities.extend(found)
+        relations.extend(itertools.combinations(found, 2))
+    return list(dict.fromkeys(entities)), relations
+
+
+class KnowledgeGraph:
+    """Entities with weighted relations and the chunks they were seen in.
+
+    Nodes are integers; ``adjacency[node]`` maps neighbour to relation
+    weight (the number of co-occurrences). Each extracted chunk is appended
+    as one JSON line to ``graph.jsonl`` in ``working_dir`` and replayed on
+    load. A snapshot holds the graph as arrays, from which it is rebuilt
+    without extracting entity keys again; only the log written after the
+    snapshot is replayed.
+    """
+
+    FILENAME = "graph.jsonl"
+
+    def __init__(self, working_dir: Optional[str] = None, snapshot: Optional["Snapshot"] = None):
+        self.node_ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.adjacency: List[Dict[int, float]] = []
+        self.sources: List[List[str]] = []
+        self.chunk_ids: Set[str] = set()
+        self._lock = threading.Lock()
+        self.path = os.path.join(working_dir, self.FILENAME) if working_dir else None
+        offset = 0
+        section = snapshot.section("graph") if snapshot else None
+        if section:
+            from .snapshot import replay_offset
+            self._load_snapshot(snapshot)
+            offset = replay_offset(self.path, section["log_offset"]) if self.path else 0
+        if self.path and os.path.exists(self.path) and os.path.getsize(self.path) > offset:
+            self._load(offset)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.chunk_ids
+
+    def _load(self, offset: int = 0):
+        with open(self.path, encoding="utf-8") as f:
+            f.seek(offset)
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._add(entry["chunk"], entry["entities"], entry["relations"])
+        logger.info(f"Loaded graph with {self.node_count} entities from {self.path}")
+
+    def _load_snapshot(self, snapshot: "Snapshot"):
+        chunks = snapshot.lines("graph_chunks.txt")
+        self.chunk_ids = set(chunks)
+        self.names = [json.loads(line) for line in snapshot.lines("graph_names.jsonl")]
+        self.node_ids = {normalize_entity(name): node for node, name in enumerate(self.names)}
+        self.adjacency = [{} for _ in self.names]
+        edges = snapshot.array("graph_edges.npy").tolist()
+        for (u, v), weight in zip(edges, snapshot.array("graph_weights.npy").tolist()):
+            self.adjacency[u][v] = weight
+            self.adjacency[v][u] = weight
+        offsets = snapshot.array("graph_source_offsets.npy").tolist()
+        sources = snapshot.array("graph_sources.npy").tolist()
+        self.sources = [[chunks[i] for i in sources[start:end]]
+                        for start, end in zip(offsets, offsets[1:])]
+        logger.info(f"Loaded graph with {self.node_count} entities from snapshot {snapshot.directory}")
+
+    def write_snapshot(self, directory: str) -> Dict:
+        """Write the graph as arrays to a snapshot directory; returns its manifest section"""
+        import numpy as np
+        from .snapshot import log_size, save_array, save_lines
+        with self._lock:
+            chunks = list(self.chunk_ids)
+            rows = {chunk_id: row for row, chunk_id in enumerate(chunks)}
+            edges = [(u, v, weight) for u, neighbours in enumerate(self.adjacency)
+                     for v, weight in neighbours.items() if u < v]
+            offsets = np.zeros(self.node_count + 1, dtype=np.int64)
+            np.cumsum([len(sources) for sources in self.sources], out=offsets[1:])
+            sources = np.array([rows[chunk_id] for node_sources in self.sources for chunk_id in node_sources],
+                               dtype=np.int32)
+            names = list(self.names)
+            log_offset = log_size(self.path)
+        # Names come from entity_extract_func and may contain any character
+        save_lines(directory, "graph_names.jsonl", map(json.dumps, names))
+        save_lines(directory, "graph_chunks.txt", chunks)
+        save_array(directory, "graph_edges.npy", np.array([(u, v) for u, v, _ in edges], dtype=np.int32).reshape(-1, 2))
+        save_array(directory, "graph_weights.npy", np.array([weight for _, _, weight in edges], dtype=np.float64))
+        save_array(directory, "graph_source_offsets.npy", offsets)
+        save_array(directory, "graph_sources.npy", sources)
+        return {"entities": len(names), "relations": len(edges), "log_offset": log_offset}
+
+    def _node(self, name: str) -> Optional[int]:
+        key = normalize_entity(name)
+        if not key:
+            return None
+        node = self.node_ids.get(key)
+        if node is None:
+            node = len(self.names)
+            self.node_ids[key] = node
+            self.names.append(name)
+            self.adjacency.append({})
+            self.sources.append([])
+        return node
+
+    def _add(self, chunk_id: str, entities: List[str], relations: List[List[str]]):
+        self.chunk_ids.add(chunk_id)
+        for name in entities:
+            node = self._node(name)
+            if node is not None and (not self.sources[node] or self.sources[node][-1] != chunk_id):
+                self.sources[node].append(chunk_id)
+        for a, b in relations:
+            u, v = self._node(a), self._node(b)
+            if u is None or v is None or u == v:
+                continue
+            self.adjacency[u][v] = self.adjacency[u].get(v, 0.0) + 1.0
+            self.adjacency[v][u] = self.adjacency[v].get(u, 0.0) + 1.0
+
+    def add_many(self, extractions: Iterable[Tuple[str, Extraction]]) -> None:
+        """Add ``(chunk_id, (entities, relations))`` pairs; known chunks are skipped"""
+        entries = []
+        with self._lock:
+            for chunk_id, (entities, relations) in extractions:
+                if chunk_id in self.chunk_ids:
+                    continue
+                relations = [list(pair) for pair in relations]
+                self._add(chunk_id, entities, relations)
+                entries.append({"chunk": chunk_id, "entities": entities, "relations": relations})
+
+            if self.path and entries:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(e) + "\n" for e in entries))
+
+    def match(self, query: str) -> List[int]:
+        """Entities mentioned in the query, found by looking up its word n-grams"""
+        words = WORD_PATTERN.findall(query.lower())
+        found = []
+        for size in range(min(MAX_ENTITY_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                node = self.node_ids.get(" ".join(words[start:start + size]))
+                if node is not None:
+                    found.append(node)
+        return list(dict.fromkeys(found))
+
+    def neighbourhood(self, seeds: Iterable[int], hops: int) -> Dict[int, int]:
+        """Nodes within ``hops`` of the seeds, mapped to their distance"""
+        distances = {node: 0 for node in seeds}
+        frontier = deque(distances)
+        with self._lock:
+            while frontier:
+                node = frontier.popleft()
+                if distances[node] == hops:
+                    continue
+                for neighbour in self.adjacency[node]:
+                    if neighbour not in distances:
+                        distances[neighbour] = distances[node] + 1
+                        frontier.append(neighbour)
+        return distances
+
+    def degree(self, node: int) -> int:
+        return len(self.adjacency[node])
+
+    def top_nodes(self, count: int) -> List[int]:
+        """Highest-degree entities of the whole graph"""
+        with self._lock:
+            return heapq.nlargest(count, range(self.node_count), key=self.degree)
+
+    def rank_relations(self, nodes: Iterable[int], top_k: int) -> List[Tuple[int, int, float]]:
+        """Relations touching ``nodes``, ranked by combined degree and then weight"""
+        nodes = set(nodes)
+        edges = {}
+        with self._lock:
+            for u in nodes:
+                for v, weight in self.adjacency[u].items():
+                    edges[(min(u, v), max(u, v))] = weight
+            return heapq.nlargest(
+                top_k,
+                ((u, v, weight) for (u, v), weight in edges.items()),
+                key=lambda edge: (self.degree(edge[0]) + self.degree(edge[1]), edge[2])
+            )
+
+    def shared_sources(self, u: int, v: int) -> List[str]:
+        """Chunks in which both entities appear"""
+        with self._lock:
+            other = set(self.sources[v])
+            return [chunk_id for chunk_id in self.sources[u] if chunk_id in other]
@@ -0,0 +1,295 @@
+"""Background ingestion: documents are indexed by worker threads while writers move on"""
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+import logging
+
+if TYPE_CHECKING:
+    from .lightrag import LightRAG, StagedBatch
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+@dataclass
+class IngestStats:
+    """Progress counters of an IngestPipeline"""
+    submitted: int = 0
+    indexed: int = 0  # Includes skipped duplicates
+    duplicates: int = 0
+    failed: int = 0
+    batches: int = 0
+    stage_seconds: float = 0.0  # Storage writes, chunking and embedding
+    commit_seconds: float = 0.0  # Index updates
+
+    @property
+    def pending(self) -> int:
+        return self.submitted - self.indexed - self.failed
+
+
+class IngestPipeline:
+    """Inserts documents on two worker threads behind a write-ahead journal.
+
+    submit() appends documents to ``ingest_journal.jsonl`` in the working
+    directory, queues them and returns. A staging thread collects up to
+    ``batch_size`` queued documents (waiting at most ``max_delay`` seconds
+    for a batch to fill), skips duplicates, writes them to storage, chunks
+    them and embeds the chunks in one call. A commit thread adds the
+    result to the indexes, marks the documents done in the journal and
+    wakes flush() and wait_indexed() callers. Staging of the next batch
+    overlaps with the commit of the previous one.
+
+    The document queue holds at most ``max_queued`` documents; submit()
+    blocks while it is full. Documents in the journal that were never
+    marked done, because the process stopped or their batch failed, are
+    submitted again when the next pipeline starts. Ids are content hashes
+    and storage writes are idempotent, so replaying a document that was
+    partly indexed is safe.
+    """
+
+    JOURNAL_FILENAME = "ingest_journal.jsonl"
+    COMPACT_BYTES = 64 << 20  # Journal size at which it is rewritten while busy
+
+    def __init__(self, rag: "LightRAG", batch_size: int = 256, max_delay: float = 0.05,
+                 max_queued: int = 10_000):
+        self.rag = rag
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.stats = IngestStats()
+        self.journal_path = os.path.join(rag.working_dir, self.JOURNAL_FILENAME)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued)
+        self._staged: queue.Queue = queue.Queue(maxsize=2)
+        self._cond = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._pending: Dict[str, int] = {}  # Queued doc id -> times queued
+        self._contents: Dict[str, str] = {}  # Queued doc id -> content, for journal compaction
+        self._failed: Dict[str, Tuple[str, BaseException]] = {}
+        self._duplicates: Dict[str, str] = {}
+        self._journal = None
+        self._closed = False
+
+        recovered = self._recover()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._threads = [
+            threading.Thread(target=self._stage_loop, name="lightrag-ingest-stage", daemon=True),
+            threading.Thread(target=self._commit_loop, name="lightrag-ingest-commit", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        if recovered:
+            logger.info(f"Resuming ingestion of {len(recovered)} journaled documents")
+            self._enqueue(recovered)
+
+    def _recover(self) -> List[Tuple[str, str]]:
+        """Documents journaled but not marked done, with the journal rewritten to hold only them"""
+        if not os.path.exists(self.journal_path):
+            return []
+        pending: Dict[str, str] = {}
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A torn final line from a crash mid-write
+                if "done" in entry:
+                    for doc_id in entry["done"]:
+                        pending.pop(doc_id, None)
+                else:
+                    pending[entry["id"]] = entry["content"]
+        rows = list(pending.items())
+        self._rewrite_journal(rows)
+        return rows
+
+    def _rewrite_journal(self, rows: Sequence[Tuple[str, str]]):
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps({"id": doc_id, "content": content}) + "\n"
+                            for doc_id, content in rows))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def submit(self, rows: Sequence[Tuple[str, str]]) -> None:
+        """Journal ``(doc_id, content)`` rows and queue them for indexing.
+
+        Returns once the rows are durable in the journal and queued; blocks
+        while the queue is full.
+        """
+        if self._closed:
+            raise RuntimeError("IngestPipeline is closed")
+        if not rows:
+            return
+        with self._journal_lock:
+            self._journal.write("".join(json.dumps({"id": doc_id, "content": content}) + "\n"
+                                        for doc_id, content in rows))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            # Registered before the journal lock is released, so compaction keeps these rows
+            self._register(rows)
+        for row in rows:
+            self._queue.put(row)
+
+    def _enqueue(self, rows: Sequence[Tuple[str, str]]):
+        self._register(rows)
+        for row in rows:
+            self._queue.put(row)
+
+    def _register(self, rows: Sequence[Tuple[str, str]]):
+        with self._cond:
+            for doc_id, content in rows:
+                self._pending[doc_id] = self._pending.get(doc_id, 0) + 1
+                self._contents[doc_id] = content
+                self._failed.pop(doc_id, None)
+            self.stats.submitted += len(rows)
+
+    def _next_batch(self) -> Optional[List[Tuple[str, str]]]:
+        """Up to batch_size queued rows, or None once the pipeline is stopping"""
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # Seen again after this batch is staged
+                break
+            batch.append(item)
+        return batch
+
+    def _stage_loop(self):
+        while (batch := self._next_batch()) is not None:
+            start = time.perf_counter()
+            try:
+                # Later copies of a document queued twice in one batch are duplicates of the first
+                staged = self.rag._stage_batch(list(dict(batch).items()))
+            except Exception as e:
+                logger.error(f"Ingesting a batch of {len(batch)} documents failed: {e}")
+                self._finish(batch, error=e)
+                continue
+            self.stats.stage_seconds += time.perf_counter() - start
+            self._staged.put((batch, staged))
+        self._staged.put(_STOP)
+
+    def _commit_loop(self):
+        while (item := self._staged.get()) is not _STOP:
+            batch, staged = item
+            start = time.perf_counter()
+            try:
+                self.rag._commit_batch(staged)
+            except Exception as e:
+                logger.error(f"Indexing a batch of {len(batch)} documents failed: {e}")
+                self._finish(batch, error=e)
+                continue
+            self.stats.commit_seconds += time.perf_counter() - start
+            self._finish(batch, staged=staged)
+
+    def _finish(self, batch: List[Tuple[str, str]], staged: Optional["StagedBatch"] = None,
+                error: Optional[BaseException] = None):
+        """Record the outcome of a batch and wake up waiters"""
+        if error is None:
+            with self._journal_lock:
+                self._journal.write(json.dumps({"done": [doc_id for doc_id, _ in batch]}) + "\n")
+                self._journal.flush()
+        with self._cond:
+            for doc_id, content in batch:
+                if error is not None:
+                    self._failed[doc_id] = (content, error)
+                elif doc_id in staged.duplicates and staged.duplicates[doc_id] != doc_id:
+                    self._duplicates[doc_id] = staged.duplicates[doc_id]
+                count = self._pending.pop(doc_id) - 1
+                if count:
+                    self._pending[doc_id] = count
+                else:
+                    self._contents.pop(doc_id, None)
+            if error is None:
+                self.stats.indexed += len(batch)
+                self.stats.duplicates += len(staged.duplicates)
+                self.stats.batches += 1
+            else:
+                self.stats.failed += len(batch)
+            idle = not self._pending
+            self._cond.notify_all()
+        if idle or self._journal.tell() > self.COMPACT_BYTES:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with only queued and failed documents"""
+        with self._journal_lock, self._cond:
+            rows = list(self._contents.items())
+            rows += [(doc_id, content) for doc_id, (content, _) in self._failed.items()
+                     if doc_id not in self._contents]
+            if not rows and self._journal.tell() == 0:
+                return
+            self._journal.close()
+            self._rewrite_journal(rows)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every document submitted so far is indexed or has failed.
+
+        Returns:
+            False if ``timeout`` seconds passed first
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout)
+
+    def wait_indexed(self, doc_id: str, timeout: Optional[float] = None) -> str:
+        """Wait until a submitted document is indexed.
+
+        Returns:
+            The document id, or the id of the stored document it duplicates
+
+        Raises:
+            TimeoutError: ``timeout`` seconds passed first
+            Exception: The error its batch failed with
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: doc_id not in self._pending, timeout):
+                raise TimeoutError(f"Document {doc_id} was not indexed within {timeout}s")
+            if doc_id in self._failed:
+                raise self._failed[doc_id][1]
+            return self._duplicates.get(doc_id, doc_id)
+
+    @property
+    def failed(self) -> Dict[str, BaseException]:
+        """Ids of documents whose batch failed, with the error; retried on the next start"""
+        with self._cond:
+            return {doc_id: error for doc_id, (_, error) in self._failed.items()}
+
+    def close(self, wait: bool = True) -> None:
+        """Stop the workers, after the queued documents are indexed when ``wait`` is set.
+
+        Without ``wait`` the queued documents stay in the journal and are
+        resumed by the next pipeline on the same working directory.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if not wait:
+            # Drop what is queued; the journal still has it
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except queue.Empty:
+                pass
+        self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        with self._journal_lock:
+            self._journal.close()
+        with self._cond:
+            error = RuntimeError("IngestPipeline was closed before the document was indexed")
+            for doc_id in self._pending:
+                self._failed[doc_id] = (self._contents.get(doc_id, ""), error)
+            self.stats.failed += sum(self._pending.values())
+            self._pending.clear()
+            self._cond.notify_all()
@@ -1,14 +1,43 @@
 import os
-from dataclasses import dataclass
-from typing import Callable, Optional, Dict, List, Union
-import json
-import numpy as np
-from supabase import create_client
+from dataclasses import astuple, dataclass, field, replace
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Deque, Optional, Dict, Iterable, Iterator, List, Sequence, Set, Tuple, Union
+import concurrent.futures
+import contextvars
+from collections import deque
+import functools
+import hashlib
+import heapq
+import inspect
+import itertools
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 import asyncio
-from .browser import BrowserManager, BrowseResult
+from .browser import BrowserManager, normalize_url
+from .storage import BaseStorage, create_storage
+from .bm25 import BM25Index
+from .llm import openai_embedding
+from .cache import LLMResponseCache
+from .corpus import CorpusMirror
+from .chunking import Chunk, ChunkStore, estimate_tokens, pack_context
+from .graph import Extraction, KnowledgeGraph, extract_entities
+from .summaries import SummaryTree
+from .fusion import reciprocal_rank_fusion
+from .snapshot import open_snapshot, write_snapshot
+from .tracing import REGISTRY, MetricsRegistry, QueryTrace, TraceSink, current_trace, stage, traced
 import logging
 
+if TYPE_CHECKING:
+    # numpy is only needed once embeddings are indexed or searched; the
+    # modules using it are imported on first use to keep startup fast
+    import numpy as np
+    from .answer_cache import CachedAnswer, SemanticAnswerCache
+    from .ingest import IngestPipeline
+    from .shards import ShardedIndex
+    from .dedup import Deduplicator
+    from .vector_index import VectorIndex
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -18,121 +47,1266 @@ class QueryParam:
     mode: str = "hybrid"  # Can be "naive", "local", "global", "semantic", or "hybrid"
     max_results: int = 5
     temperature: float = 0.7
+    cache: bool = False  # Reuse cached LLM responses even at non-zero temperature
+    max_context_tokens: int = 4000  # Token budget for retrieved passages in the prompt
+    hops: int = 1  # Depth of the entity neighbourhood expanded by local mode
+
+@dataclass
+class BatchStats:
+    """Throughput of one insert_many batch"""
+    batch_index: int
+    size: int
+    seconds: float
+    total_inserted: int
+    duplicates: int = 0  # Documents of the batch skipped as duplicates
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.size / self.seconds if self.seconds > 0 else float("inf")
+
+def run_sync(coro):
+    """Run a coroutine to completion from synchronous code.
+
+    Works both from plain scripts and from code already running inside an
+    event loop (for example an async web handler calling ``rag.query``), in
+    which case the coroutine runs on a short-lived helper thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+def iterate_sync(aiterator: AsyncIterator) -> Iterator:
+    """Consume an async iterator from synchronous code, one item at a time.
+
+    The iterator runs on its own event loop in a helper thread and hands
+    items over through a queue as soon as they are produced.
+    """
+    items: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    end = object()
+
+    async def pump():
+        try:
+            async for item in aiterator:
+                items.put((item, None))
+                if stop.is_set():
+                    break
+        except Exception as e:
+            items.put((None, e))
+            return
+        items.put((end, None))
+
+    thread = threading.Thread(target=asyncio.run, args=(pump(),), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stop.set()
+
+class ConcurrencyLimiter:
+    """Async semaphore shared by every thread and event loop of the process.
+
+    asyncio.Semaphore belongs to one loop, so sync calls made from several
+    threads (each running its own loop through run_sync) would each get
+    their own cap. Waiters here are woken on their own loop instead. With a
+    limit of 1 it serves as a cross-loop lock.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, waiter) in self._waiters:
+                    self._waiters.remove((loop, waiter))
+                    raise
+            if not waiter.cancelled():
+                self.release()  # The slot was granted as the waiter went away
+            raise
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the longest waiting caller if any"""
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._grant, waiter)
+                    return  # The slot passes on; active is unchanged
+                except RuntimeError:
+                    continue  # Its loop is closed
+            self.active -= 1
+
+    def _grant(self, waiter: asyncio.Future) -> None:
+        if waiter.cancelled():
+            self.release()
+        else:
+            waiter.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+async def _single(item):
+    yield item
+
+def stable_model_name(func: Callable) -> Optional[str]:
+    """Dotted name of a module-level function, which is the same in every process.
+
+    None for lambdas, closures, bound methods, callable instances and
+    partials, whose names do not tell two differently configured ones apart.
+    """
+    module = getattr(func, "__module__", None)
+    qualname = getattr(func, "__qualname__", None)
+    if inspect.ismethod(func) or not module or not isinstance(qualname, str) or "<" in qualname:
+        return None
+    return f"{module}.{qualname}"
+
+def compute_doc_id(content: str) -> str:
+    """Content-addressed document id: identical content always maps to the same id"""
+    return "doc_" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+@dataclass
+class StreamEvent:
+    """One event of a streamed query"""
+    type: str  # "retrieval", "token" or "done"
+    text: str = ""
+    documents: Optional[List[str]] = None
+    time_to_first_token: Optional[float] = None
+
+@dataclass
+class Passage:
+    """A retrieved chunk of a document"""
+    id: str
+    doc_id: str
+    content: str
+    score: float = 0.0
+    sources: List[str] = field(default_factory=list)  # Retrievers that returned it
+
+@dataclass
+class QueryResult:
+    """Outcome of one query of a query_many batch"""
+    query: str
+    answer: Optional[str] = None
+    documents: List[str] = field(default_factory=list)
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+@dataclass
+class _Prefetched:
+    """Keyword and vector hits, and query embeddings, computed ahead of retrieval"""
+    depth: int
+    hits: Dict[Tuple[str, str], List[Tuple[str, float]]] = field(default_factory=dict)
+    embeddings: Dict[str, "np.ndarray"] = field(default_factory=dict)
+
+    def get(self, retriever: str, query: str, top_k: int) -> Optional[List[Tuple[str, float]]]:
+        hits = self.hits.get((retriever, query))
+        if hits is None or top_k > self.depth:
+            return None
+        return hits[:top_k]
+
+# Set while query_many runs, or a query was embedded for the answer cache, so
+# per-query retrieval reuses the results
+_prefetched: contextvars.ContextVar[Optional[_Prefetched]] = contextvars.ContextVar(
+    "lightrag_prefetched", default=None
+)
+
+@dataclass
+class IndexUpdate:
+    """Index entries computed for a batch of documents, not applied yet"""
+    chunks: List[Chunk] = field(default_factory=list)  # Stored in the ChunkStore once applied
+    chunk_ids: List[str] = field(default_factory=list)
+    keyword: List[Tuple[str, str]] = field(default_factory=list)
+    vector_ids: List[str] = field(default_factory=list)
+    vectors: Optional["np.ndarray"] = None
+    extractions: List[Tuple[str, Extraction]] = field(default_factory=list)
+
+@dataclass
+class StagedBatch:
+    """Documents written to storage and prepared for indexing, not yet visible to queries"""
+    rows: List[Tuple[str, str]]
+    duplicates: Dict[str, str]  # Skipped id -> id of the document it duplicates
+    index: IndexUpdate
+
+@dataclass
+class PreparedQuery:
+    """Final synthesis prompt of a query and the documents it was built from"""
+    prompt: Optional[str] = None
+    documents: List[str] = field(default_factory=list)
+    answer: Optional[str] = None  # Set instead of prompt when no LLM call is needed
 
 class LightRAG:
-    def __init__(self, working_dir: str, llm_model_func: Callable):
+    def __init__(self, working_dir: str, llm_model_func: Callable,
+                 storage: Union[str, BaseStorage] = "supabase",
+                 embedding_func: Callable[[List[str]], "np.ndarray"] = openai_embedding,
+                 llm_concurrency: int = 4,
+                 llm_cache: Union[bool, LLMResponseCache] = True,
+                 llm_model_name: Optional[str] = None,
+                 corpus_refresh_interval: float = 0.0,
+                 llm_stream_func: Optional[Callable] = None,
+                 chunk_size: int = 300,
+                 chunk_overlap: int = 50,
+                 entity_extract_func: Callable[[str], Extraction] = extract_entities,
+                 summary_fanout: int = 8,
+                 dedup_threshold: Optional[float] = 0.9,
+                 answer_cache: Union[bool, "SemanticAnswerCache"] = False,
+                 background_ingest: bool = False,
+                 shards: Optional[int] = None,
+                 metrics: Optional[MetricsRegistry] = REGISTRY,
+                 trace_sink: Optional[TraceSink] = None):
+        """
+        Args:
+            working_dir: Directory for local state (the "local" backend keeps its database here)
+            llm_model_func: Completion function taking a prompt and a temperature
+            storage: "supabase", "local", or a ready-made BaseStorage instance
+            embedding_func: Maps a list of texts to a (len(texts), dim) array of embeddings
+            llm_concurrency: Maximum number of LLM calls in flight at once across all
+                queries of this instance, whichever thread or event loop they run
+                on; llm_model_func may be a plain function or a coroutine function
+            llm_cache: True for the default response cache under working_dir, False to
+                disable caching, or a configured LLMResponseCache. Only calls at
+                temperature 0 or with QueryParam.cache set are cached.
+            llm_model_name: Name the response cache keys llm_model_func's answers by;
+                defaults to the dotted name of a module-level function. Without
+                either, responses are cached in memory only, since nothing
+                identifies the function in another process.
+            corpus_refresh_interval: Minimum seconds between two checks of storage
+                for documents written by other processes
+            llm_stream_func: Optional streaming counterpart of llm_model_func used by
+                query_stream; takes a prompt and a temperature and returns an iterator
+                or async iterator of text chunks
+            chunk_size: Approximate tokens per chunk documents are split into at insert time
+            chunk_overlap: Tokens shared by consecutive chunks of a document
+            entity_extract_func: Maps chunk text to (entities, relations) for the
+                knowledge graph; relations are pairs of entity names
+            summary_fanout: Chunks per group, and groups per parent, in the summary
+                tree read by global mode
+            dedup_threshold: Estimated Jaccard similarity of word 3-grams at which an
+                inserted document counts as a near duplicate of a stored one and is
+                skipped; None disables duplicate detection
+            answer_cache: True for a default SemanticAnswerCache, or a configured one,
+                to answer queries whose embedding is close to a recent query's with
+                the same parameters from cache; entries are invalidated whenever
+                the corpus changes. Off by default.
+            background_ingest: Make insert and insert_many journal documents and
+                return at once, leaving storage writes, embedding and indexing to
+                the worker threads of an IngestPipeline (``self.ingest``); use
+                flush() or wait_indexed() before querying for them. Documents
+                left in the journal by an earlier process are resumed.
+            shards: Partition the keyword and vector indexes into this many shards,
+                scored in parallel by a pool of up to os.cpu_count() worker
+                processes (see lightrag.shards.ShardedIndex); None scores them in
+                this process. Pays off on large corpora only.
+            metrics: Registry every query's trace is aggregated into (the shared
+                lightrag.tracing.REGISTRY by default); None disables metrics
+            trace_sink: Called with the QueryTrace of every finished query
+        """
         self.working_dir = working_dir
         self.llm_model_func = llm_model_func
-        self.browser = BrowserManager()
-        
-        # Initialize Supabase client
-        supabase_url = os.environ.get("SUPABASE_URL")
-        supabase_key = os.environ.get("SUPABASE_KEY")
-        self.supabase = create_client(supabase_url, supabase_key)
-        
-        # Create tables if they don't exist
-        self._init_database()
+        self.embedding_func = embedding_func
+        self.entity_extract_func = entity_extract_func
+        self.llm_stream_func = llm_stream_func
+        self.metrics = metrics
+        self.trace_sink = trace_sink
+        self.llm_concurrency = llm_concurrency
+        # Shared by all threads and event loops, so concurrent sync calls share the cap
+        self._llm_limiter = ConcurrencyLimiter(llm_concurrency)
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._summary_lock = ConcurrencyLimiter(1)
+        self._browser: Optional[BrowserManager] = None
+
+        os.makedirs(working_dir, exist_ok=True)
+        if llm_cache is True:
+            llm_cache = LLMResponseCache(working_dir)
+        self.llm_cache: Optional[LLMResponseCache] = llm_cache or None
+        llm_model_name = llm_model_name or stable_model_name(llm_model_func)
+        # Only a name that identifies the function across processes may key the disk tier
+        self._llm_cache_persistent = llm_model_name is not None
+        self._llm_model_name = llm_model_name or f"{type(llm_model_func).__name__}@{id(llm_model_func):x}"
+        if isinstance(storage, str):
+            storage = create_storage(storage, working_dir)
+        self.storage = storage
+        # A snapshot written by save_snapshot() replaces the network load of the
+        # corpus and most of the index log replay
+        self._snapshot = open_snapshot(working_dir)
+        self.corpus = CorpusMirror(storage, refresh_interval=corpus_refresh_interval,
+                                   snapshot=self._snapshot)
+        self.chunks = ChunkStore(working_dir, chunk_size, chunk_overlap, snapshot=self._snapshot)
+        self.keyword_index = BM25Index(working_dir, snapshot=self._snapshot)
+        self._synced = False
+        self._vector_index: Optional["VectorIndex"] = None
+        self._graph: Optional[KnowledgeGraph] = None
+        self.shards = shards
+        self._sharded: Optional["ShardedIndex"] = None
+        self.summaries = SummaryTree(working_dir, summary_fanout)
+        self._summary_leaves_restored = False
+        self.dedup_threshold = dedup_threshold
+        self._dedup: Optional["Deduplicator"] = None
+        self._lazy_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._unindexed: Set[str] = set()  # Mirrored documents whose indexing failed
+        if answer_cache is True:
+            from .answer_cache import SemanticAnswerCache
+            answer_cache = SemanticAnswerCache()
+        self.answer_cache: Optional["SemanticAnswerCache"] = answer_cache if answer_cache is not False else None
+        self.corpus_version = 0  # Bumped whenever documents are added to the corpus
+        self.ingest: Optional["IngestPipeline"] = None
+        if background_ingest:
+            from .ingest import IngestPipeline
+            self.ingest = IngestPipeline(self)
+
+    @property
+    def vector_index(self) -> "VectorIndex":
+        """Embedding index, loaded from working_dir on first use"""
+        if self._vector_index is None:
+            with self._lazy_lock:
+                if self._vector_index is None:
+                    from .vector_index import VectorIndex
+                    self._vector_index = VectorIndex(self.working_dir, snapshot=self._snapshot)
+        return self._vector_index
+
+    @property
+    def sharded(self) -> Optional["ShardedIndex"]:
+        """Sharded copy of the keyword and vector indexes, built on first use; None without shards"""
+        if self._sharded is None and self.shards:
+            with self._lazy_lock:
+                if self._sharded is None:
+                    from .shards import ShardedIndex
+                    self._sharded = ShardedIndex(self.shards)
+        return self._sharded
+
+    @property
+    def graph(self) -> KnowledgeGraph:
+        """Entity graph, replayed from working_dir on first use"""
+        if self._graph is None:
+            with self._lazy_lock:
+                if self._graph is None:
+                    self._graph = KnowledgeGraph(self.working_dir, snapshot=self._snapshot)
+        return self._graph
+
+    @property
+    def dedup(self) -> Optional["Deduplicator"]:
+        """Duplicate detector, loaded from working_dir on first use; None when disabled"""
+        if self._dedup is None and self.dedup_threshold is not None:
+            with self._lazy_lock:
+                if self._dedup is None:
+                    from .dedup import Deduplicator
+                    self._dedup = Deduplicator(self.working_dir, self.dedup_threshold)
+        return self._dedup
+
+    @property
+    def browser(self) -> BrowserManager:
+        """Browser used by search_web, created on first use"""
+        if self._browser is None:
+            self._browser = BrowserManager()
+        return self._browser
+
+    @browser.setter
+    def browser(self, browser: BrowserManager):
+        self._browser = browser
+
+    @property
+    def supabase(self):
+        """Underlying Supabase client, when the Supabase backend is in use"""
+        return getattr(self.storage, "client", None)
 
-    def _init_database(self):
-        """Initialize the database tables"""
-        # Create documents table
-        self.supabase.table("documents").select("*").limit(1).execute()
-        
     def insert(self, content: str, doc_id: Optional[str] = None) -> str:
-        """Insert a document into the RAG system"""
+        """Insert a document into the RAG system.
+
+        Returns:
+            The document id, or the id of the stored document it duplicates.
+            With background ingestion the document is only queued and its own
+            id is returned; wait_indexed() gives the final one.
+        """
         if doc_id is None:
-            # Get the count of existing documents
-            result = self.supabase.table("documents").select("id").execute()
-            doc_id = f"doc_{len(result.data)}"
-        
-        # Insert document
-        self.supabase.table("documents").insert({
-            "id": doc_id,
-            "content": content,
-            "created_at": "now()"
-        }).execute()
-        
-        return doc_id
+            doc_id = compute_doc_id(content)
+
+        if self.ingest is not None:
+            self.ingest.submit([(doc_id, content)])
+            return doc_id
+        duplicates = self._insert_batch([(doc_id, content)])
+        return duplicates.get(doc_id, doc_id)
+
+    def insert_many(self, documents: Iterable[str], batch_size: int = 500,
+                    on_batch: Optional[Callable[[BatchStats], None]] = None) -> List[str]:
+        """Stream documents into the RAG system in batches.
+
+        Each batch costs one bulk write to storage and one embedding call.
+        Ids are derived from content, so re-inserting a document is a no-op,
+        and near duplicates of stored documents are skipped.
+
+        With background ingestion batches are only journaled and queued, and
+        the pipeline regroups them into its own micro-batches.
+
+        Args:
+            documents: Document contents; may be a lazy iterable
+            batch_size: Documents per storage write and embedding call
+            on_batch: Called with the BatchStats of every finished (or, with
+                background ingestion, queued) batch
+
+        Returns:
+            Document ids in input order; a skipped duplicate gets the id of the
+            document it duplicates, except with background ingestion
+        """
+        doc_ids = []
+        iterator = iter(documents)
+        for batch_index in itertools.count():
+            batch = list(itertools.islice(iterator, batch_size))
+            if not batch:
+                break
+            rows = [(compute_doc_id(content), content) for content in batch]
+
+            start = time.perf_counter()
+            if self.ingest is not None:
+                self.ingest.submit(rows)
+                duplicates = {}
+            else:
+                duplicates = self._insert_batch(rows)
+            stats = BatchStats(
+                batch_index=batch_index,
+                size=len(rows),
+                seconds=time.perf_counter() - start,
+                total_inserted=len(doc_ids) + len(rows),
+                duplicates=len(duplicates)
+            )
+            logger.info(f"Inserted batch {batch_index} ({stats.size} documents, "
+                        f"{stats.docs_per_second:.1f} docs/s)")
+            if on_batch:
+                on_batch(stats)
+            doc_ids.extend(duplicates.get(doc_id, doc_id) for doc_id, _ in rows)
+        return doc_ids
+
+    def _insert_batch(self, rows: List[Tuple[str, str]]) -> Dict[str, str]:
+        """Write documents to storage and add them to every index.
+
+        Returns:
+            Ids of skipped duplicates mapped to the id of the document they duplicate
+        """
+        staged = self._stage_batch(rows)
+        self._commit_batch(staged)
+        return staged.duplicates
+
+    def _stage_batch(self, rows: List[Tuple[str, str]]) -> StagedBatch:
+        """First half of an insert: skip duplicates, write to storage, chunk and embed"""
+        duplicates = {}
+        if self.dedup is not None:
+            rows, duplicates = self.dedup.filter(rows)
+        try:
+            if rows:
+                self.storage.insert_many(rows)
+            return StagedBatch(rows, duplicates, self._prepare_index(rows))
+        except BaseException:
+            self._abort_batch(rows)
+            raise
+
+    def _commit_batch(self, staged: StagedBatch) -> None:
+        """Second half of an insert: make staged documents visible to queries"""
+        rows = staged.rows
+        try:
+            if rows:
+                self.corpus.add(rows)
+                self._apply_index(staged.index)
+                self._corpus_changed()
+        except BaseException:
+            self._abort_batch(rows)
+            # Already mirrored, so the next sync has to be told to index them
+            self._retry_indexing(doc_id for doc_id, _ in rows)
+            raise
+        if self.dedup is not None:
+            self.dedup.commit(doc_id for doc_id, _ in rows)
+
+    def _retry_indexing(self, doc_ids: Iterable[str]):
+        """Have the next sync index these mirrored documents"""
+        with self._lazy_lock:
+            self._unindexed.update(doc_ids)
+
+    def _abort_batch(self, rows: List[Tuple[str, str]]):
+        if self.dedup is not None:
+            self.dedup.discard(doc_id for doc_id, _ in rows)
+
+    def _index_documents(self, docs: List[Tuple[str, str]]):
+        """Chunk documents and add chunks missing from the keyword, vector and graph indexes"""
+        self._apply_index(self._prepare_index(docs))
+
+    def _prepare_index(self, docs: List[Tuple[str, str]]) -> IndexUpdate:
+        """Chunk documents; embed and extract entities from chunks not indexed yet.
+
+        Chunks are only stored by _apply_index, so a document whose embedding
+        or extraction fails still counts as unindexed on the next sync.
+        """
+        chunks = self.chunks.split(docs)
+        contents = dict(docs)
+        texts = {chunk.id: contents[chunk.doc_id][chunk.start:chunk.end] for chunk in chunks}
+        update = IndexUpdate(chunks=chunks, chunk_ids=[chunk.id for chunk in chunks])
+
+        update.keyword = [(chunk_id, text) for chunk_id, text in texts.items()
+                          if chunk_id not in self.keyword_index]
+        missing = [(chunk_id, text) for chunk_id, text in texts.items()
+                   if chunk_id not in self.vector_index]
+        if missing:
+            update.vector_ids = [chunk_id for chunk_id, _ in missing]
+            update.vectors = self.embedding_func([text for _, text in missing])
+        update.extractions = [(chunk_id, self.entity_extract_func(text))
+                              for chunk_id, text in texts.items() if chunk_id not in self.graph]
+        return update
+
+    def _apply_index(self, update: IndexUpdate):
+        """Add prepared entries to the keyword, vector and graph indexes and the summary tree.
+
+        Inserts, background commits and catch-up indexing during a sync apply
+        one batch at a time; readers are guarded by each index's own lock.
+        """
+        with self._index_lock:
+            if update.keyword:
+                self.keyword_index.add_many(update.keyword)
+            if update.vector_ids:
+                self.vector_index.add_many(update.vector_ids, update.vectors)
+            self.graph.add_many(update.extractions)
+            # Last, so a failure or crash above leaves the documents to be indexed again
+            self.chunks.commit(update.chunks)
+            self.summaries.add(update.chunk_ids)
+
+    def _sync_indexes(self):
+        """Mirror new documents from storage and index the ones insert has not seen"""
+        first_load = not self._synced
+        self._synced = True
+        with stage("storage"):
+            new_docs = fetched = self.corpus.refresh()
+        trace = current_trace()
+        if trace is not None and new_docs:
+            trace.record_fetch(len(new_docs), sum(len(doc["content"].encode("utf-8")) for doc in new_docs))
+        if first_load:
+            # Indexes on disk may predate documents already in storage
+            new_ids = self.corpus.ids()
+        else:
+            new_ids = (doc["id"] for doc in new_docs)
+        with self._lazy_lock:
+            retry, self._unindexed = self._unindexed, set()
+        candidates = itertools.chain(new_ids, retry)
+        missing = [(doc["id"], doc["content"])
+                   for doc in self.corpus.get_many(dict.fromkeys(
+                       doc_id for doc_id in candidates if not self.chunks.has_doc(doc_id)))]
+        if missing:
+            logger.info(f"Indexing {len(missing)} documents that were not inserted through LightRAG "
+                        f"or failed to index")
+            with stage("indexing"):
+                try:
+                    self._index_documents(missing)
+                except BaseException:
+                    self._retry_indexing(doc_id for doc_id, _ in missing)
+                    raise
+                if self.dedup is not None:
+                    self.dedup.add_many(missing)
+        if fetched:
+            self._corpus_changed()
+
+    def _corpus_changed(self):
+        """Move to a new corpus version, invalidating answers cached for older ones"""
+        with self._lazy_lock:
+            self.corpus_version += 1
+            version = self.corpus_version
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate(version)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every document inserted so far is indexed (or has failed).
+
+        Returns at once without background ingestion.
+
+        Returns:
+            False if ``timeout`` seconds passed first
+        """
+        if self.ingest is None:
+            return True
+        return self.ingest.flush(timeout)
+
+    async def aflush(self, timeout: Optional[float] = None) -> bool:
+        """Async version of flush"""
+        return await asyncio.to_thread(self.flush, timeout)
+
+    def wait_indexed(self, doc_id: str, timeout: Optional[float] = None) -> str:
+        """Wait until an inserted document is indexed.
+
+        Returns:
+            The document id, or the id of the stored document it duplicates
+
+        Raises:
+            TimeoutError: ``timeout`` seconds passed first
+            Exception: The error ingestion of the document failed with
+        """
+        if self.ingest is None:
+            return doc_id
+        return self.ingest.wait_indexed(doc_id, timeout)
+
+    async def await_indexed(self, doc_id: str, timeout: Optional[float] = None) -> str:
+        """Async version of wait_indexed"""
+        return await asyncio.to_thread(self.wait_indexed, doc_id, timeout)
+
+    def save_snapshot(self) -> str:
+        """Write the corpus and indexes to a memory-mapped snapshot in working_dir.
+
+        Later LightRAG instances on the same working_dir map the snapshot
+        instead of loading the corpus from storage and replaying the index
+        logs, and processes sharing it share its pages. Documents still
+        queued for background ingestion are not included; flush() first.
+
+        Returns:
+            Directory of the snapshot
+        """
+        self._sync_indexes()
+        return write_snapshot(self)
+
+    async def ainsert(self, content: str, doc_id: Optional[str] = None) -> str:
+        """Async version of insert; storage and embedding work runs on a worker thread"""
+        return await asyncio.to_thread(self.insert, content, doc_id)
+
+    async def ainsert_many(self, documents: Iterable[str], batch_size: int = 500,
+                           on_batch: Optional[Callable[[BatchStats], None]] = None) -> List[str]:
+        """Async version of insert_many"""
+        return await asyncio.to_thread(self.insert_many, documents, batch_size, on_batch)
 
     def query(self, query: str, param: Optional[QueryParam] = None) -> str:
         """Query the RAG system using specified mode"""
+        return run_sync(self.aquery(query, param))
+
+    async def aquery(self, query: str, param: Optional[QueryParam] = None) -> str:
+        """Async version of query; independent LLM calls are awaited concurrently"""
+        return (await self.aquery_traced(query, param))[0]
+
+    def query_traced(self, query: str, param: Optional[QueryParam] = None) -> Tuple[str, QueryTrace]:
+        """Query and also return the trace of where time and tokens went"""
+        return run_sync(self.aquery_traced(query, param))
+
+    async def aquery_traced(self, query: str,
+                            param: Optional[QueryParam] = None) -> Tuple[str, QueryTrace]:
+        """Async version of query_traced"""
+        if param is None:
+            param = QueryParam()
+        with traced(query, param.mode, self.metrics, self.trace_sink) as trace:
+            answer, _ = await self._query(query, param)
+        return answer, trace
+
+    def query_many(self, queries: Sequence[str], param: Optional[QueryParam] = None,
+                   concurrency: int = 16) -> List[QueryResult]:
+        """Answer a batch of queries with shared retrieval and LLM dispatch.
+
+        Storage is synced once for the whole batch, and the keyword and
+        vector indexes score all queries in a single pass (one embedding
+        call and one matrix product for the vector index; the same
+        embeddings serve answer cache lookups). Identical queries
+        and identical synthesis prompts are answered once. At most
+        ``concurrency`` queries are in progress at a time, and LLM calls are
+        further bounded by ``llm_concurrency``.
+
+        Returns:
+            One QueryResult per query, in input order; a query that fails
+            carries its exception instead of failing the batch. When the
+            shared sync or retrieval fails, each query does its own instead.
+        """
+        return run_sync(self.aquery_many(queries, param, concurrency))
+
+    async def aquery_many(self, queries: Sequence[str], param: Optional[QueryParam] = None,
+                          concurrency: int = 16) -> List[QueryResult]:
+        """Async version of query_many"""
+        if param is None:
+            param = QueryParam()
+        unique = list(dict.fromkeys(queries))
+        sync = False
+        try:
+            await asyncio.to_thread(self._sync_indexes)
+        except Exception as e:
+            logger.warning(f"Storage sync for a batch of {len(unique)} queries failed, syncing per query: {e}")
+            sync = True
+        prefetched = None
+        if not sync:
+            try:
+                prefetched = await asyncio.to_thread(self._prefetch, unique, param)
+            except Exception as e:
+                logger.warning(f"Batched retrieval of {len(unique)} queries failed, retrieving per query: {e}")
+
+        semaphore = asyncio.Semaphore(concurrency)
+        completions: Dict[str, asyncio.Future] = {}
+
+        async def complete(prompt: str) -> str:
+            completion = completions.get(prompt)
+            if completion is None:
+                completion = asyncio.ensure_future(self._acomplete(prompt, param))
+                completions[prompt] = completion
+            return await asyncio.shield(completion)
+
+        async def answer(query: str) -> QueryResult:
+            async with semaphore:
+                try:
+                    with traced(query, param.mode, self.metrics, self.trace_sink):
+                        text, documents = await self._query(query, param, sync=sync, complete=complete)
+                        return QueryResult(query, text, documents)
+                except Exception as e:
+                    logger.error(f"Query {query!r} failed: {e}")
+                    return QueryResult(query, error=e)
+
+        token = _prefetched.set(prefetched)
+        try:
+            results = await asyncio.gather(*(answer(query) for query in unique))
+        finally:
+            _prefetched.reset(token)
+        by_query = dict(zip(unique, results))
+        return [by_query[query] for query in queries]
+
+    def retrieve(self, query: str, param: Optional[QueryParam] = None) -> List[Passage]:
+        """Scored passages for a query, without any LLM call.
+
+        Candidates from the keyword, vector and graph retrievers are merged
+        with reciprocal rank fusion; at most ``param.max_results`` passages
+        are returned, best first.
+        """
+        return run_sync(self.aretrieve(query, param))
+
+    async def aretrieve(self, query: str, param: Optional[QueryParam] = None) -> List[Passage]:
+        """Async version of retrieve"""
+        if param is None:
+            param = QueryParam()
+        await asyncio.to_thread(self._sync_indexes)
+        return await asyncio.to_thread(self._fused_retrieve, query, param)
+
+    def query_stream(self, query: str, param: Optional[QueryParam] = None) -> Iterator[StreamEvent]:
+        """Sync version of aquery_stream"""
+        return iterate_sync(self.aquery_stream(query, param))
+
+    async def aquery_stream(self, query: str,
+                            param: Optional[QueryParam] = None) -> AsyncIterator[StreamEvent]:
+        """Stream a query answer as it is generated.
+
+        Yields one "retrieval" event listing the selected document ids once
+        retrieval (and any intermediate LLM step) is done, then a "token"
+        event per chunk of the final synthesis call, then a "done" event with
+        the full answer and the time to first token in seconds.
+        """
         if param is None:
             param = QueryParam()
+        with traced(query, param.mode, self.metrics, self.trace_sink) as trace:
+            start = time.perf_counter()
+            cached = embedding = None
+            if self.answer_cache is not None:
+                await asyncio.to_thread(self._sync_indexes)
+                version = self.corpus_version
+                cached, embedding = await asyncio.to_thread(self._lookup_answer, query, param, version)
+            if cached is not None:
+                prepared = PreparedQuery(answer=cached.answer, documents=cached.documents)
+            else:
+                prepared = await self._prepare(query, param, sync=embedding is None, embedding=embedding)
+            yield StreamEvent("retrieval", documents=prepared.documents)
+
+            if prepared.answer is not None:
+                tokens = _single(prepared.answer)
+            else:
+                tokens = self._astream(prepared.prompt, param)
+
+            chunks = []
+            time_to_first_token = None
+            async for token in tokens:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - start
+                    trace.add_stage("first_token", time_to_first_token)
+                chunks.append(token)
+                yield StreamEvent("token", text=token)
+
+            answer = "".join(chunks)
+            if embedding is not None and cached is None and prepared.answer is None:
+                self.answer_cache.put(embedding, answer, prepared.documents, astuple(param), version, query)
+            yield StreamEvent("done", text=answer, documents=prepared.documents,
+                              time_to_first_token=time_to_first_token)
+
+    async def _prepare(self, query: str, param: QueryParam, sync: bool = True,
+                       embedding: Optional["np.ndarray"] = None) -> PreparedQuery:
+        """Run retrieval and intermediate LLM steps, up to the final synthesis prompt.
+
+        ``embedding``, when given, is the query's embedding and is reused by
+        vector retrieval.
+        """
+        # Pull only documents added since the last query, then search locally
+        if sync:
+            await asyncio.to_thread(self._sync_indexes)
+        if len(self.corpus) == 0:
+            return PreparedQuery(answer="No documents available to search.")
+        if embedding is not None and _prefetched.get() is None:
+            token = _prefetched.set(_Prefetched(0, embeddings={query: embedding}))
+            try:
+                return await self._prepare(query, param, sync=False)
+            finally:
+                _prefetched.reset(token)
+        with stage("retrieval"):
+            if param.mode == "naive":
+                return await self._naive_search(query, param)
+            elif param.mode == "semantic":
+                return await self._semantic_search(query, param)
+            elif param.mode == "local":
+                return await self._local_search(query, param)
+            elif param.mode == "global":
+                return await self._global_search(query, param)
+            else:  # hybrid
+                return await self._hybrid_search(query, param)
+
+    async def _query(self, query: str, param: QueryParam, sync: bool = True,
+                     complete: Optional[Callable[[str], Awaitable[str]]] = None) -> Tuple[str, List[str]]:
+        """Answer a query, through the answer cache when enabled.
+
+        Args:
+            complete: Completes the synthesis prompt; defaults to _acomplete
+
+        Returns:
+            ``(answer, document ids)``
+        """
+        if complete is None:
+            complete = functools.partial(self._acomplete, param=param)
+        embedding = None
+        if self.answer_cache is not None:
+            if sync:
+                await asyncio.to_thread(self._sync_indexes)
+                sync = False
+            version = self.corpus_version
+            cached, embedding = await asyncio.to_thread(self._lookup_answer, query, param, version)
+            if cached is not None:
+                return cached.answer, cached.documents
+
+        prepared = await self._prepare(query, param, sync, embedding)
+        if prepared.answer is not None:
+            return prepared.answer, prepared.documents
+        answer = await complete(prepared.prompt)
+        if embedding is not None:
+            self.answer_cache.put(embedding, answer, prepared.documents, astuple(param), version, query)
+        return answer, prepared.documents
+
+    def _lookup_answer(self, query: str, param: QueryParam,
+                       version: int) -> Tuple[Optional["CachedAnswer"], "np.ndarray"]:
+        """Embed a query and look it up in the answer cache"""
+        embedding = self._embed_query(query)
+        cached = self.answer_cache.get(embedding, astuple(param), version)
+        trace = current_trace()
+        if trace is not None:
+            trace.record_answer_cache(cached is not None)
+        if cached is not None:
+            logger.info(f"Answered {query!r} from the answer cache entry for {cached.query!r} "
+                        f"(similarity {cached.similarity:.3f})")
+        return cached, embedding
+
+    async def _acomplete(self, prompt: str, param: QueryParam) -> str:
+        """Call the LLM for a query, going through the response cache when allowed"""
+        temperature = param.temperature
+        if self.llm_cache is None or not (temperature == 0 or param.cache):
+            return await self._call_llm(prompt, temperature)
+
+        key = self.llm_cache.make_key(self._llm_model_name, prompt, temperature)
+        cached = self.llm_cache.get(key, self._llm_cache_persistent)
+        trace = current_trace()
+        if trace is not None:
+            trace.record_cache(cached is not None)
+        if cached is not None:
+            return cached
+
+        # Identical prompts issued concurrently, from any thread, share a single LLM call
+        with self._inflight_lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                future = self._inflight[key] = concurrent.futures.Future()
+        if pending is not None:
+            return await asyncio.shield(asyncio.wrap_future(pending))
+        try:
+            response = await self._call_llm(prompt, temperature)
+            self.llm_cache.set(key, response, self._llm_cache_persistent)
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    async def _call_llm(self, prompt: str, temperature: float) -> str:
+        """Call llm_model_func without blocking the event loop"""
+        async with self._llm_limiter:
+            with stage("llm"):
+                if asyncio.iscoroutinefunction(self.llm_model_func):
+                    response = await self.llm_model_func(prompt, temperature=temperature)
+                else:
+                    response = await asyncio.to_thread(self.llm_model_func, prompt, temperature=temperature)
+        trace = current_trace()
+        if trace is not None:
+            trace.record_llm(estimate_tokens(prompt), estimate_tokens(response))
+        return response
+
+    async def _astream(self, prompt: str, param: QueryParam) -> AsyncIterator[str]:
+        """Stream the LLM answer to a prompt; falls back to one chunk without llm_stream_func"""
+        if self.llm_stream_func is None:
+            yield await self._acomplete(prompt, param)
+            return
+
+        key = None
+        if self.llm_cache is not None and (param.temperature == 0 or param.cache):
+            key = self.llm_cache.make_key(self._llm_model_name, prompt, param.temperature)
+            cached = self.llm_cache.get(key, self._llm_cache_persistent)
+            trace = current_trace()
+            if trace is not None:
+                trace.record_cache(cached is not None)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks = []
+        async with self._llm_limiter:
+            start = time.perf_counter()
+            stream = self.llm_stream_func(prompt, temperature=param.temperature)
+            if hasattr(stream, "__aiter__"):
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+            else:
+                # Pull from a blocking iterator on a worker thread
+                done = object()
+                while (chunk := await asyncio.to_thread(next, stream, done)) is not done:
+                    chunks.append(chunk)
+                    yield chunk
+        trace = current_trace()
+        if trace is not None:
+            trace.add_stage("llm", time.perf_counter() - start)
+            trace.record_llm(estimate_tokens(prompt), estimate_tokens("".join(chunks)))
+        if key is not None:
+            self.llm_cache.set(key, "".join(chunks), self._llm_cache_persistent)
+
+    def _resolve(self, hits: List[Tuple[str, float]]) -> List[Passage]:
+        """Turn ranked ``(chunk_id, score)`` hits into passages, in rank order"""
+        passages = []
+        for chunk_id, score in hits:
+            chunk = self.chunks.get(chunk_id)
+            doc = self.corpus.get(chunk.doc_id) if chunk else None
+            if doc is not None:
+                text = doc["content"][chunk.start:chunk.end]
+                passages.append(Passage(chunk_id, chunk.doc_id, text, score))
+        return passages
 
-        # Get all documents
-        result = self.supabase.table("documents").select("*").execute()
-        if not result.data:
-            return "No documents available to search."
-
-        # Different search strategies based on mode
-        if param.mode == "naive":
-            return self._naive_search(query, result.data, param)
-        elif param.mode == "semantic":
-            return self._semantic_search(query, result.data, param)
-        elif param.mode == "local":
-            return self._local_search(query, result.data, param)
-        elif param.mode == "global":
-            return self._global_search(query, result.data, param)
-        else:  # hybrid
-            return self._hybrid_search(query, result.data, param)
-
-    def _naive_search(self, query: str, documents: List[Dict], param: QueryParam) -> str:
-        """Simple keyword-based search"""
+    def _keyword_retrieve(self, query: str, top_k: int) -> List[Passage]:
+        """Top chunks for the query by BM25"""
+        prefetched = _prefetched.get()
+        hits = prefetched.get("keyword", query, top_k) if prefetched else None
+        if hits is None:
+            hits = self._keyword_search([query], top_k)[0]
+        return self._resolve(hits)
+
+    def _vector_retrieve(self, query: str, top_k: int) -> List[Passage]:
+        """Top chunks for the query by embedding similarity"""
+        prefetched = _prefetched.get()
+        hits = prefetched.get("vector", query, top_k) if prefetched else None
+        if hits is None:
+            hits = self._vector_search([self._embed_query(query)], top_k)[0]
+        return self._resolve(hits)
+
+    def _keyword_search(self, queries: Sequence[str], top_k: int) -> List[List[Tuple[str, float]]]:
+        """BM25 hits of each query, scored by the shards when sharding is on"""
+        if self.sharded is None:
+            return self.keyword_index.search_many(queries, top_k)
+        self.sharded.sync_keyword(self.keyword_index, self._chunk_text)
+        return self.sharded.search_keyword(queries, top_k)
+
+    def _vector_search(self, embeddings, top_k: int) -> List[List[Tuple[str, float]]]:
+        """Embedding hits of each query vector, scored by the shards when sharding is on"""
+        if self.sharded is None:
+            return self.vector_index.search_many(embeddings, top_k)
+        self.sharded.sync_vectors(self.vector_index)
+        return self.sharded.search_vectors(embeddings, top_k)
+
+    def _embed_query(self, query: str) -> "np.ndarray":
+        """Embedding of a query, reusing one computed ahead of retrieval"""
+        prefetched = _prefetched.get()
+        if prefetched is not None and query in prefetched.embeddings:
+            return prefetched.embeddings[query]
+        with stage("embedding"):
+            return self.embedding_func([query])[0]
+
+    def _prefetch(self, queries: List[str], param: QueryParam) -> _Prefetched:
+        """Keyword and vector hits of every query, in one pass per index.
+
+        Only the retrievers the mode uses are run, deep enough for every
+        top_k the mode asks for.
+        """
+        mode = param.mode
+        if mode == "hybrid":
+            depth = 4 * param.max_results
+        elif mode == "global":
+            depth = max(param.max_results, param.max_context_tokens // 10)
+        else:
+            depth = param.max_results
+        prefetched = _Prefetched(depth)
+
+        if mode in ("naive", "local", "hybrid"):
+            for query, hits in zip(queries, self._keyword_search(queries, depth)):
+                prefetched.hits[("keyword", query)] = hits
+        vector = mode in ("semantic", "hybrid") or (mode == "global" and self.graph.node_count == 0)
+        if vector or self.answer_cache is not None:
+            embeddings = self.embedding_func(queries)
+            prefetched.embeddings.update(zip(queries, embeddings))
+        if vector:
+            for query, hits in zip(queries, self._vector_search(embeddings, depth)):
+                prefetched.hits[("vector", query)] = hits
+        return prefetched
+
+    def _fused_retrieve(self, query: str, param: QueryParam) -> List[Passage]:
+        """Keyword, vector and graph candidates merged by reciprocal rank fusion.
+
+        Each retriever contributes a ranked list four times longer than
+        ``param.max_results``. Passages are deduplicated by chunk and by
+        identical text, and the top ``param.max_results`` are returned with
+        their fused score and the retrievers that found them.
+        """
+        depth = 4 * param.max_results
+        candidates = {
+            "keyword": self._keyword_retrieve(query, depth),
+            "vector": self._vector_retrieve(query, depth),
+            "graph": self._graph_local_retrieve(query, replace(param, max_results=depth))[1],
+        }
+        by_id: Dict[str, Passage] = {}
+        sources: Dict[str, List[str]] = {}
+        for name, passages in candidates.items():
+            for passage in passages:
+                by_id.setdefault(passage.id, passage)
+                sources.setdefault(passage.id, []).append(name)
+
+        fused = reciprocal_rank_fusion([[p.id for p in passages] for passages in candidates.values()])
         results = []
-        for doc in documents:
-            if query.lower() in doc["content"].lower():
-                results.append(doc["content"])
-                if len(results) >= param.max_results:
-                    break
-        
+        seen_texts = set()
+        for chunk_id, score in fused:
+            passage = by_id[chunk_id]
+            text = passage.content.strip()
+            if text in seen_texts:
+                continue
+            seen_texts.add(text)
+            results.append(replace(passage, score=score, sources=sources[chunk_id]))
+            if len(results) == param.max_results:
+                break
+        return results
+
+    def _graph_local_retrieve(self, query: str, param: QueryParam) -> Tuple[List[str], List[Passage]]:
+        """Relations and chunks around the entities the query mentions.
+
+        Expands the ``param.hops`` neighbourhood of the matched entities and
+        scores each chunk by the entities it mentions, weighted by their
+        distance. Returns nothing when the query names no known entity.
+        """
+        seeds = self.graph.match(query)
+        if not seeds:
+            return [], []
+
+        distances = self.graph.neighbourhood(seeds, param.hops)
+        scores: Dict[str, float] = {}
+        for node, distance in distances.items():
+            for chunk_id in self.graph.sources[node]:
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (1 + distance)
+        hits = heapq.nlargest(param.max_results, scores.items(), key=lambda item: item[1])
+        relations = self.graph.rank_relations(seeds, top_k=2 * param.max_results)
+        return self._format_relations(relations), self._resolve(hits)
+
+    def _graph_global_retrieve(self, query: str, param: QueryParam) -> Tuple[List[str], List[Passage]]:
+        """Strongest relations of the graph region relevant to the query.
+
+        Relations are ranked by the combined degree of their entities and
+        their weight, starting from the query's entities expanded by two hops,
+        or from the highest-degree entities when the query names none.
+        Supporting chunks are those where both entities of a top relation
+        appear, followed by those mentioning the region's best connected
+        entities. Falls back to vector search while the graph is empty.
+        """
+        if self.graph.node_count == 0:
+            top_k = max(param.max_results, param.max_context_tokens // 10)
+            return [], self._vector_retrieve(query, top_k)
+
+        seeds = self.graph.match(query)
+        if seeds:
+            nodes = self.graph.neighbourhood(seeds, max(2, param.hops))
+        else:
+            nodes = self.graph.top_nodes(param.max_results)
+        relations = self.graph.rank_relations(nodes, top_k=4 * param.max_results)
+
+        # Chunks backing the top relations first, then those mentioning the region's hubs
+        supporting = [self.graph.shared_sources(u, v) for u, v, _ in relations]
+        hubs = heapq.nlargest(param.max_results, nodes, key=self.graph.degree)
+        supporting += [self.graph.sources[node] for node in hubs]
+        hits = {}
+        for rank, chunk_ids in enumerate(supporting):
+            for chunk_id in chunk_ids:
+                hits.setdefault(chunk_id, -float(rank))
+        return self._format_relations(relations), self._resolve(list(hits.items()))
+
+    def update_summaries(self) -> int:
+        """Recompute the summaries affected by documents inserted since the last update"""
+        return run_sync(self.aupdate_summaries())
+
+    async def aupdate_summaries(self) -> int:
+        """Async version of update_summaries; global queries call this lazily"""
+        await asyncio.to_thread(self._sync_indexes)
+        async with self._summary_lock:
+            if not self._summary_leaves_restored:
+                await asyncio.to_thread(self._restore_summary_leaves)
+            if not self.summaries.is_stale:
+                return 0
+            with stage("summaries"):
+                return await self.summaries.refresh(self._summarize, self._chunk_text)
+
+    def _restore_summary_leaves(self):
+        """Add chunks indexed by an earlier process but never summarized back to the summary tree.
+
+        The summary log only records leaves of groups that were summarized, so
+        chunks inserted after the last refresh are not in it.
+        """
+        missing = [chunk_id for chunk_id in self.chunks.chunk_ids()
+                   if chunk_id not in self.summaries and chunk_id.rpartition("#")[0] in self.corpus]
+        if missing:
+            logger.info(f"Restoring {len(missing)} unsummarized chunks to the summary tree")
+            self.summaries.add(missing)
+        self._summary_leaves_restored = True
+
+    async def _summarize(self, texts: List[str]) -> str:
+        text = "\n\n".join(texts)
+        return await self._acomplete(
+            "Summarize the key entities, facts and relationships in the following text "
+            f"in a few sentences:\n\n{text}",
+            QueryParam(temperature=0.0)
+        )
+
+    def _chunk_text(self, chunk_id: str) -> str:
+        chunk = self.chunks.get(chunk_id)
+        doc = self.corpus.get(chunk.doc_id) if chunk else None
+        return doc["content"][chunk.start:chunk.end] if doc else ""
+
+    def _format_relations(self, relations: List[Tuple[int, int, float]]) -> List[str]:
+        names = self.graph.names
+        return [f"{names[u]} -- {names[v]} (weight {weight:g})" for u, v, weight in relations]
+
+    def _pack_graph_context(self, relations: List[str], passages: List[Passage],
+                            param: QueryParam, summaries: List[str] = ()) -> Tuple[str, List[Passage]]:
+        """Summaries, relations, then passages, up to the token budget, formatted as prompt context"""
+        candidates = ([("summary", text) for text in summaries]
+                      + [("relation", line) for line in relations]
+                      + [(p, p.content) for p in passages])
+        packed = pack_context(candidates, param.max_context_tokens)
+        summaries = [text for key, text in packed if key == "summary"]
+        lines = [text for key, text in packed if key == "relation"]
+        passages = [key for key, _ in packed if isinstance(key, Passage)]
+        context = "\n".join(p.content for p in passages)
+        if lines:
+            context = "Relations:\n" + "\n".join(lines) + "\n\nPassages:\n" + context
+        if summaries:
+            context = "Summaries:\n" + "\n".join(summaries) + "\n\n" + context
+        return context, passages
+
+    @staticmethod
+    def _pack(passages: List[Passage], param: QueryParam) -> List[Passage]:
+        """Highest ranked passages that fit in the query's token budget"""
+        packed = pack_context([(p, p.content) for p in passages], param.max_context_tokens)
+        return [p for p, _ in packed]
+
+    @staticmethod
+    def _doc_ids(passages: List[Passage]) -> List[str]:
+        return list(dict.fromkeys(p.doc_id for p in passages))
+
+    async def _naive_search(self, query: str, param: QueryParam) -> PreparedQuery:
+        """Keyword search ranked by BM25 over the inverted index"""
+        results = await asyncio.to_thread(self._keyword_retrieve, query, param.max_results)
+        results = self._pack(results, param)
+
         if not results:
-            return "No relevant documents found."
-        
-        context = "\n".join(results)
-        return self.llm_model_func(
-            f"Based on the following context, answer the query: {query}\n\nContext: {context}",
-            temperature=param.temperature
+            return PreparedQuery(answer="No relevant documents found.")
+
+        context = "\n".join(p.content for p in results)
+        return PreparedQuery(
+            prompt=f"Based on the following context, answer the query: {query}\n\nContext: {context}",
+            documents=self._doc_ids(results)
         )
 
-    def _local_search(self, query: str, documents: List[Dict], param: QueryParam) -> str:
+    async def _local_search(self, query: str, param: QueryParam) -> PreparedQuery:
         """Search focusing on immediate context"""
-        results = self._naive_search(query, documents, param)
-        return self.llm_model_func(
-            f"Analyze the local context and answer: {query}\n\nContext: {results}",
-            temperature=param.temperature
+        # The retrieved passages are the context; no intermediate LLM answer is needed
+        relations, results = await asyncio.to_thread(self._graph_local_retrieve, query, param)
+        if not results:
+            results = await asyncio.to_thread(self._keyword_retrieve, query, param.max_results)
+        context, results = self._pack_graph_context(relations, results, param)
+        if not context:
+            context = "No relevant documents found."
+        return PreparedQuery(
+            prompt=f"Analyze the local context and answer: {query}\n\nContext: {context}",
+            documents=self._doc_ids(results)
         )
 
-    def _global_search(self, query: str, documents: List[Dict], param: QueryParam) -> str:
+    async def _global_search(self, query: str, param: QueryParam) -> PreparedQuery:
         """Search considering broader context and relationships"""
-        all_content = "\n".join(doc["content"] for doc in documents)
-        return self.llm_model_func(
-            f"Consider the entire context and answer: {query}\n\nGlobal Context: {all_content}",
-            temperature=param.temperature
+        # Precomputed corpus summaries come first; only stale branches are recomputed
+        await self.aupdate_summaries()
+        summaries = self.summaries.select(query, param.max_results)
+        relations, results = await asyncio.to_thread(self._graph_global_retrieve, query, param)
+        all_content, results = self._pack_graph_context(relations, results, param, summaries)
+        return PreparedQuery(
+            prompt=f"Consider the entire context and answer: {query}\n\nGlobal Context: {all_content}",
+            documents=self._doc_ids(results)
         )
 
-    def _hybrid_search(self, query: str, documents: List[Dict], param: QueryParam) -> str:
+    async def _hybrid_search(self, query: str, param: QueryParam) -> PreparedQuery:
         """Combine local and global search strategies"""
-        local_results = self._local_search(query, documents, param)
-        global_results = self._global_search(query, documents, param)
-        
-        return self.llm_model_func(
-            f"Combining local and global insights, answer: {query}\n\n"
-            f"Local Context: {local_results}\n\nGlobal Context: {global_results}",
-            temperature=param.temperature
+        # Fuse the retrievers' ranked candidates, then make a single synthesis call
+        results = await asyncio.to_thread(self._fused_retrieve, query, param)
+        results = self._pack(results, param)
+
+        if not results:
+            return PreparedQuery(answer="No relevant documents found.")
+
+        context = "\n".join(p.content for p in results)
+        return PreparedQuery(
+            prompt=f"Combining local and global insights, answer: {query}\n\nContext: {context}",
+            documents=self._doc_ids(results)
         )
 
-    def _semantic_search(self, query: str, documents: List[Dict], param: QueryParam) -> str:
+    async def _semantic_search(self, query: str, param: QueryParam) -> PreparedQuery:
         """Semantic search using embeddings"""
-        # Use LLM to analyze semantic relevance
-        context = "\n".join(doc["content"] for doc in documents)
+        # Only the max_results nearest chunks are sent to the LLM
+        results = await asyncio.to_thread(self._vector_retrieve, query, param.max_results)
+        results = self._pack(results, param)
+        context = "\n".join(p.content for p in results)
         prompt = f"""Given the following documents, find the most semantically relevant information for the query: {query}
         
 Documents:
 {context}
 
 Please provide a detailed answer based on the most relevant information found."""
-        
-        return self.llm_model_func(prompt, temperature=param.temperature)
+
+        return PreparedQuery(prompt=prompt, documents=self._doc_ids(results))
 
     async def search_web(self, query: str) -> Union[str, None]:
         """Search web for information and add to RAG system"""
@@ -156,7 +1330,68 @@ Please provide a detailed answer based on the most relevant information found.""
             logger.error(f"Error in search_web: {e}")
             return None
 
+    async def search_web_many(self, queries: Sequence[str], concurrency: int = 4,
+                              timeout: Optional[float] = 120.0,
+                              batch_size: int = 20) -> List[Optional[str]]:
+        """Search the web for many queries concurrently and add the results.
+
+        Searches run on a pool of ``concurrency`` browser agents, each with
+        its own controller. Results are inserted in batches of
+        ``batch_size`` as searches finish, and a page whose URL was already
+        fetched by another search in this call is only inserted once.
+
+        Args:
+            queries: Topics to search for
+            concurrency: Number of searches running at once
+            timeout: Seconds after which a single search is abandoned
+            batch_size: Pages per insert_many call
+
+        Returns:
+            Extracted content per query, in input order; None where the
+            search failed or timed out
+        """
+        contents: List[Optional[str]] = [None] * len(queries)
+        seen_urls = set()
+        pending: List[str] = []
+        inserted = 0
+
+        async def flush():
+            nonlocal inserted
+            if pending:
+                batch = list(pending)
+                pending.clear()
+                await asyncio.to_thread(self.insert_many, batch, batch_size)
+                inserted += len(batch)
+
+        async for index, result in self.browser.search_many(queries, concurrency, timeout):
+            if result.error or not result.content:
+                logger.error(f"Web search for {queries[index]!r} failed: {result.error or 'no content'}")
+                continue
+            contents[index] = result.content
+            url = normalize_url(result.url)
+            if url in seen_urls:
+                logger.info(f"Skipping {result.url}, already fetched in this run")
+                continue
+            if url:
+                seen_urls.add(url)
+            pending.append(result.content)
+            if len(pending) >= batch_size:
+                await flush()
+        await flush()
+
+        succeeded = sum(content is not None for content in contents)
+        logger.info(f"Web search finished: {succeeded}/{len(queries)} succeeded, {inserted} pages inserted")
+        return contents
+
     def close(self):
-        """Clean up resources"""
-        if hasattr(self, 'browser'):
-            self.browser.close()
+        """Clean up resources; documents still queued for background ingestion are indexed first"""
+        if getattr(self, 'ingest', None) is not None:
+            self.ingest.close()
+        if getattr(self, '_browser', None) is not None:
+            self._browser.close()
+        if getattr(self, '_sharded', None) is not None:
+            self._sharded.close()
+        if hasattr(self, 'storage'):
+            self.storage.close()
+        if getattr(self, 'llm_cache', None) is not None:
+            self.llm_cache.close()
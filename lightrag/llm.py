@@ -1,20 +1,201 @@
-from langchain_openai import ChatOpenAI
-from typing import Optional
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import functools
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+
+if TYPE_CHECKING:
+    # numpy, openai and langchain_openai are loaded on first use; the latter
+    # two take over a second to import
+    import numpy as np
+    import openai
+    from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"  # 1536 dimensions, matching the documents table
+HASH_EMBEDDING_DIM = 256
+
+@functools.lru_cache(maxsize=None)
+def _retryable_errors() -> Tuple[type, ...]:
+    """Errors worth retrying: throttling, timeouts, dropped connections and 5xx responses"""
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+def __getattr__(name: str):
+    # RETRYABLE_ERRORS and the openai module are resolved on first access so
+    # importing this module stays cheap
+    if name == "RETRYABLE_ERRORS":
+        return _retryable_errors()
+    if name == "openai":
+        import openai
+        return openai
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_clients: Dict[Tuple, "ChatOpenAI"] = {}
+_clients_lock = threading.Lock()
+
+def get_chat_client(model: str, timeout: float, temperature: Optional[float],
+                    base_url: Optional[str] = None) -> "ChatOpenAI":
+    """Shared ChatOpenAI client for a (model, timeout, temperature, base_url) combination.
+
+    Clients are created once and kept alive, so their HTTP connection pools
+    are reused across completions. Retries are handled by complete() and
+    acomplete(), not by the client itself.
+    """
+    key = (model, timeout, temperature, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                from langchain_openai import ChatOpenAI
+                client = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    timeout=timeout,
+                    max_retries=0,
+                    base_url=base_url
+                )
+                _clients[key] = client
+    return client
+
+def clear_chat_clients():
+    """Drop every pooled client (mainly for tests)"""
+    with _clients_lock:
+        _clients.clear()
+
+def _retry_delay(error: Exception, attempt: int, backoff: float) -> float:
+    """Seconds to wait before the next attempt, honouring Retry-After on 429s"""
+    import openai
+    if isinstance(error, openai.RateLimitError):
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+def complete(prompt: str, model: str = "gpt-4", temperature: Optional[float] = 0.7,
+             timeout: float = 60, base_url: Optional[str] = None,
+             max_retries: int = 3, backoff: float = 0.5) -> str:
+    """Single completion through a pooled client, retrying transient errors with backoff"""
+    client = get_chat_client(model, timeout, temperature, base_url)
+    for attempt in range(max_retries + 1):
+        try:
+            return client.invoke(prompt).content
+        except _retryable_errors() as e:
+            if attempt == max_retries:
+                raise
+            delay = _retry_delay(e, attempt, backoff)
+            logger.warning(f"LLM call failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+async def acomplete(prompt: str, model: str = "gpt-4", temperature: Optional[float] = 0.7,
+                    timeout: float = 60, base_url: Optional[str] = None,
+                    max_retries: int = 3, backoff: float = 0.5) -> str:
+    """Async version of complete()"""
+    return (await abatch_complete(
+        [prompt], model=model, temperature=temperature, timeout=timeout,
+        base_url=base_url, concurrency=1, max_retries=max_retries, backoff=backoff
+    ))[0]
+
+async def abatch_complete(prompts: Sequence[str], model: str = "gpt-4",
+                          temperature: Optional[float] = 0.7, timeout: float = 60,
+                          base_url: Optional[str] = None, concurrency: int = 8,
+                          max_retries: int = 5, backoff: float = 0.5) -> List[str]:
+    """Complete many prompts with bounded concurrency.
+
+    Transient errors are retried with exponential backoff. A rate-limit
+    response pauses every worker of the batch until its Retry-After delay
+    has passed, instead of letting the others keep hammering the API.
+
+    Returns:
+        Completions in the same order as ``prompts``
+    """
+    import openai
+    client = get_chat_client(model, timeout, temperature, base_url)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    resume_at = 0.0
+
+    async def run(prompt: str) -> str:
+        nonlocal resume_at
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                pause = resume_at - loop.time()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                try:
+                    return (await client.ainvoke(prompt)).content
+                except _retryable_errors() as e:
+                    if attempt == max_retries:
+                        raise
+                    delay = _retry_delay(e, attempt, backoff)
+                    if isinstance(e, openai.RateLimitError):
+                        resume_at = max(resume_at, loop.time() + delay)
+                    logger.warning(f"LLM call failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+    return list(await asyncio.gather(*(run(prompt) for prompt in prompts)))
+
+async def astream_complete(prompt: str, model: str = "gpt-4", temperature: Optional[float] = 0.7,
+                          timeout: float = 60, base_url: Optional[str] = None) -> AsyncIterator[str]:
+    """Stream a completion chunk by chunk through a pooled client"""
+    client = get_chat_client(model, timeout, temperature, base_url)
+    async for chunk in client.astream(prompt):
+        if chunk.content:
+            yield chunk.content
 
 def gpt_4o_mini_complete(prompt: str, temperature: Optional[float] = 0.7) -> str:
     """Lightweight GPT-4 completion function"""
-    llm = ChatOpenAI(
-        model="gpt-4",
-        temperature=temperature,
-        timeout=25
-    )
-    return llm.predict(prompt)
+    return complete(prompt, model="gpt-4", temperature=temperature, timeout=25)
 
 def gpt_4o_complete(prompt: str, temperature: Optional[float] = 0.7) -> str:
     """Full GPT-4 completion function with longer context"""
-    llm = ChatOpenAI(
-        model="gpt-4",
-        temperature=temperature,
-        timeout=60
-    )
-    return llm.predict(prompt)
+    return complete(prompt, model="gpt-4", temperature=temperature, timeout=60)
+
+def gpt_4o_mini_stream(prompt: str, temperature: Optional[float] = 0.7) -> AsyncIterator[str]:
+    """Streaming counterpart of gpt_4o_mini_complete, for LightRAG's llm_stream_func"""
+    return astream_complete(prompt, model="gpt-4", temperature=temperature, timeout=25)
+
+def gpt_4o_stream(prompt: str, temperature: Optional[float] = 0.7) -> AsyncIterator[str]:
+    """Streaming counterpart of gpt_4o_complete, for LightRAG's llm_stream_func"""
+    return astream_complete(prompt, model="gpt-4", temperature=temperature, timeout=60)
+
+@functools.lru_cache(maxsize=None)
+def _embedding_client() -> "openai.OpenAI":
+    import openai
+    return openai.OpenAI()
+
+def openai_embedding(texts: List[str], model: str = EMBEDDING_MODEL) -> "np.ndarray":
+    """Embed texts with the OpenAI embeddings API, one row per text"""
+    import numpy as np
+    response = _embedding_client().embeddings.create(model=model, input=list(texts))
+    return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+def hash_embedding(texts: List[str], dim: int = HASH_EMBEDDING_DIM) -> "np.ndarray":
+    """Deterministic offline embedding: hashed bag of words.
+
+    Texts sharing words get similar vectors, which is enough to exercise
+    semantic search in tests without calling an embedding API.
+    """
+    import numpy as np
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vectors[row, bucket] += sign
+    return vectors
@@ -0,0 +1,447 @@
+"""Long-running async HTTP service around a LightRAG instance
+
+    python -m lightrag.server --working-dir ./lightrag_data --storage local --port 8080
+
+Endpoints (JSON in and out):
+
+    POST /query         {"query": ..., "mode": ..., ...QueryParam fields} -> {"answer", "documents"}
+    POST /query/stream  same body; server-sent "retrieval", "token" and "done" events
+    POST /retrieve      same body; {"passages": [...]} without any LLM call
+    POST /insert        {"content": ...} or {"documents": [...]} -> {"ids": [...]}
+    GET  /health        status, document count and admission queue depth
+    GET  /metrics       Prometheus text of the instance's metrics registry
+
+Identical queries in progress at the same time are answered once, and
+concurrent queries are gathered into query_many batches that share one
+index sync, one scoring pass and one embedding call. Query endpoints pass
+an admission controller first: beyond ``max_active`` queries in progress
+and ``max_queued`` waiting, requests are refused with 429 rather than
+queued without bound.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, astuple, fields
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+import logging
+
+from aiohttp import web
+
+from .lightrag import LightRAG, QueryParam, QueryResult
+from .tracing import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+MODES = ("naive", "local", "global", "semantic", "hybrid")
+
+
+class EmbeddingBatcher:
+    """embedding_func wrapper that merges calls made at the same time.
+
+    The first call of a batch waits ``max_delay`` seconds for calls from
+    other threads to add their texts, then embeds all of them with one call
+    of ``embed`` and hands each caller its rows. Callers block until their
+    batch is done, so it can stand in for the function it wraps.
+    """
+
+    def __init__(self, embed: Callable, max_delay: float = 0.002, max_texts: int = 512):
+        self.embed = embed
+        self.max_delay = max_delay
+        self.max_texts = max_texts
+        self.calls = 0
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._batch: Optional[List[Tuple[List[str], concurrent.futures.Future]]] = None
+        self._batch_texts = 0
+
+    def __call__(self, texts):
+        texts = list(texts)
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            self.calls += 1
+            leader = self._batch is None or self._batch_texts + len(texts) > self.max_texts
+            if leader:
+                self._batch, self._batch_texts = [], 0
+            batch = self._batch
+            batch.append((texts, future))
+            self._batch_texts += len(texts)
+        if leader:
+            time.sleep(self.max_delay)
+            with self._lock:
+                if self._batch is batch:
+                    self._batch = None
+                self.batches += 1
+            self._run(batch)
+        return future.result()
+
+    def _run(self, batch: List[Tuple[List[str], concurrent.futures.Future]]):
+        try:
+            vectors = self.embed([text for texts, _ in batch for text in texts])
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for texts, future in batch:
+            future.set_result(vectors[start:start + len(texts)])
+            start += len(texts)
+
+
+class AdmissionController:
+    """Bounds queries in progress, with a bounded queue of waiting ones.
+
+    ``acquire`` returns False at once when ``max_active`` slots are taken
+    and ``max_queued`` requests already wait; the caller sheds the request.
+    """
+
+    def __init__(self, max_active: int = 16, max_queued: int = 64):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.max_queued:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # The slot was handed over as the request went away
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        return True
+
+    def release(self, *_) -> None:
+        """Free a slot, handing it straight to the longest waiting request if any"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # The slot passes on; active is unchanged
+                return
+        self.active -= 1
+
+
+class QueryBatcher:
+    """Runs queries through query_many, merging concurrent and identical ones.
+
+    Queries with the same QueryParam arriving within ``max_delay`` seconds of
+    the first go to one aquery_many call, up to ``max_batch`` of them. A
+    query identical to one still in progress gets that query's result
+    instead of a new run.
+    """
+
+    def __init__(self, rag: LightRAG, max_delay: float = 0.005, max_batch: int = 32):
+        self.rag = rag
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.batches = 0
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._pending: Dict[Tuple, List[str]] = {}  # QueryParam -> queries waiting for their batch
+        self._tasks: Set[asyncio.Task] = set()
+
+    def running(self, query: str, param: QueryParam) -> bool:
+        return (query, astuple(param)) in self._inflight
+
+    def submit(self, query: str, param: QueryParam) -> Tuple[asyncio.Future, bool]:
+        """Future of the query's result, and whether this call started it"""
+        scope = astuple(param)
+        future = self._inflight.get((query, scope))
+        if future is not None:
+            return future, False
+        loop = asyncio.get_running_loop()
+        future = self._inflight[(query, scope)] = loop.create_future()
+        pending = self._pending.get(scope)
+        if pending is None:
+            pending = self._pending[scope] = []
+            loop.call_later(self.max_delay, self._flush, scope, param)
+        pending.append(query)
+        if len(pending) >= self.max_batch:
+            self._flush(scope, param)
+        return future, True
+
+    def _flush(self, scope: Tuple, param: QueryParam):
+        queries = self._pending.pop(scope, None)
+        if queries:
+            self.batches += 1
+            task = asyncio.ensure_future(self._run(queries, scope, param))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, queries: List[str], scope: Tuple, param: QueryParam):
+        results = None
+        try:
+            results = await self.rag.aquery_many(queries, param, concurrency=len(queries))
+        except Exception as e:
+            logger.error(f"Query batch of {len(queries)} failed: {e}")
+            results = [QueryResult(query, error=e) for query in queries]
+        finally:
+            # Also when cancelled, so later identical queries never join a dead batch
+            for position, query in enumerate(queries):
+                future = self._inflight.pop((query, scope), None)
+                if future is not None and not future.done():
+                    if results is None:
+                        future.cancel()
+                    else:
+                        future.set_result(results[position])
+
+    async def close(self) -> None:
+        """Cancel batches in progress and queries still waiting for one"""
+        self._pending.clear()
+        for future in self._inflight.values():
+            future.cancel()
+        self._inflight.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class QueryService:
+    """Request handlers and the shared state behind them"""
+
+    def __init__(self, rag: LightRAG, max_active: int = 16, max_queued: int = 64,
+                 batch_delay: float = 0.005, max_batch: int = 32, retry_after: int = 1,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.rag = rag
+        self.admission = AdmissionController(max_active, max_queued)
+        self.batcher = QueryBatcher(rag, batch_delay, max_batch)
+        self.retry_after = retry_after
+        self.metrics = metrics if metrics is not None else (rag.metrics or MetricsRegistry())
+        self._requests = self.metrics.counter(
+            "lightrag_http_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status"))
+        self._latency = self.metrics.histogram(
+            "lightrag_http_request_duration_seconds", "HTTP request latency", ("endpoint",))
+        self._shed = self.metrics.counter(
+            "lightrag_http_shed_total", "Requests refused with 429 by admission control", ("endpoint",))
+        self._coalesced = self.metrics.counter(
+            "lightrag_http_coalesced_total", "Queries answered by an identical query already in progress")
+        self._active = self.metrics.gauge("lightrag_http_active_queries", "Queries holding an admission slot")
+        self._queued = self.metrics.gauge("lightrag_http_queued_queries", "Queries waiting for an admission slot")
+
+    @web.middleware
+    async def observe(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        endpoint = resource.canonical if resource is not None else "unmatched"
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            self._requests.inc(endpoint=endpoint, status=str(status))
+            self._latency.observe(time.perf_counter() - start, endpoint=endpoint)
+
+    def _overloaded(self, endpoint: str) -> web.Response:
+        self._shed.inc(endpoint=endpoint)
+        return error_response(429, "Too many queries in progress, retry later",
+                              headers={"Retry-After": str(self.retry_after)})
+
+    async def query(self, request: web.Request) -> web.Response:
+        query, param = parse_query(await read_json(request))
+        if self.batcher.running(query, param):
+            future = self.batcher.submit(query, param)[0]
+            self._coalesced.inc()
+        else:
+            if not await self.admission.acquire():
+                return self._overloaded("/query")
+            future, started = self.batcher.submit(query, param)
+            if started:
+                # The slot is held until the query finishes, even if the client goes away
+                future.add_done_callback(self.admission.release)
+            else:
+                self.admission.release()
+                self._coalesced.inc()
+        result: QueryResult = await asyncio.shield(future)
+        if not result.ok:
+            return error_response(500, f"Query failed: {result.error}")
+        return web.json_response({"answer": result.answer, "documents": result.documents})
+
+    async def query_stream(self, request: web.Request) -> web.StreamResponse:
+        query, param = parse_query(await read_json(request))
+        if not await self.admission.acquire():
+            return self._overloaded("/query/stream")
+        try:
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream",
+                                                   "Cache-Control": "no-cache"})
+            await response.prepare(request)
+            try:
+                async for event in self.rag.aquery_stream(query, param):
+                    data = {name: value for name, value in asdict(event).items()
+                            if name != "type" and value is not None}
+                    await response.write(f"event: {event.type}\ndata: {json.dumps(data)}\n\n".encode())
+            except Exception as e:
+                # Headers are sent already, so the failure is reported in the stream
+                logger.error(f"Streamed query {query!r} failed: {e}")
+                await response.write(f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n".encode())
+            await response.write_eof()
+            return response
+        finally:
+            self.admission.release()
+
+    async def retrieve(self, request: web.Request) -> web.Response:
+        query, param = parse_query(await read_json(request))
+        passages = await self.rag.aretrieve(query, param)
+        return web.json_response({"passages": [asdict(passage) for passage in passages]})
+
+    async def insert(self, request: web.Request) -> web.Response:
+        body = await read_json(request)
+        if isinstance(body.get("content"), str) and set(body) == {"content"}:
+            documents = [body["content"]]
+        elif (isinstance(body.get("documents"), list) and set(body) == {"documents"}
+              and all(isinstance(document, str) for document in body["documents"])):
+            documents = body["documents"]
+        else:
+            raise bad_request('Expected {"content": "..."} or {"documents": ["...", ...]}')
+        ids = await self.rag.ainsert_many(documents)
+        return web.json_response({"ids": ids})
+
+    async def health(self, request: web.Request) -> web.Response:
+        body = {"status": "ok", "documents": len(self.rag.corpus),
+                "active": self.admission.active, "queued": self.admission.queued}
+        if self.rag.ingest is not None:
+            body["ingest_pending"] = self.rag.ingest.stats.pending
+        return web.json_response(body)
+
+    async def render_metrics(self, request: web.Request) -> web.Response:
+        self._active.set(self.admission.active)
+        self._queued.set(self.admission.queued)
+        return web.Response(text=self.metrics.render(), content_type="text/plain",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+
+SERVICE = web.AppKey("service", QueryService)
+
+
+def error_response(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> web.Response:
+    return web.json_response({"error": message}, status=status, headers=headers)
+
+
+def bad_request(message: str) -> web.HTTPBadRequest:
+    return web.HTTPBadRequest(text=json.dumps({"error": message}), content_type="application/json")
+
+
+async def read_json(request: web.Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise bad_request("Request body is not valid JSON")
+    if not isinstance(body, dict):
+        raise bad_request("Request body must be a JSON object")
+    return body
+
+
+def parse_query(body: Dict[str, Any]) -> Tuple[str, QueryParam]:
+    """Query text and QueryParam of a request body; raises HTTPBadRequest when invalid"""
+    query = body.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise bad_request('"query" must be a non-empty string')
+    names = {f.name: f for f in fields(QueryParam)}
+    unknown = sorted(set(body) - set(names) - {"query"})
+    if unknown:
+        raise bad_request(f"Unknown fields: {', '.join(unknown)}")
+    param = QueryParam(**{name: value for name, value in body.items() if name in names})
+    if param.mode not in MODES:
+        raise bad_request(f'"mode" must be one of {", ".join(MODES)}')
+    for name in ("max_results", "max_context_tokens", "hops"):
+        value = getattr(param, name)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise bad_request(f'"{name}" must be a non-negative integer')
+    if not isinstance(param.temperature, (int, float)) or isinstance(param.temperature, bool):
+        raise bad_request('"temperature" must be a number')
+    if not isinstance(param.cache, bool):
+        raise bad_request('"cache" must be a boolean')
+    return query, param
+
+
+def create_app(rag: LightRAG, max_active: int = 16, max_queued: int = 64,
+               batch_delay: float = 0.005, max_batch: int = 32,
+               embedding_batch_delay: Optional[float] = 0.002, close_rag: bool = False,
+               metrics: Optional[MetricsRegistry] = None) -> web.Application:
+    """aiohttp application serving ``rag``.
+
+    Args:
+        rag: Instance to serve; its metrics registry also holds the service's metrics
+        max_active: Queries in progress at once before new ones have to wait
+        max_queued: Queries allowed to wait for a slot before new ones get 429
+        batch_delay: Seconds a query waits for concurrent ones to share its query_many batch
+        max_batch: Queries per batch at most
+        embedding_batch_delay: Seconds an embedding call waits for concurrent ones
+            to merge with (queries, retrieves, inserts and streams alike); None
+            leaves rag.embedding_func unwrapped
+        close_rag: Close ``rag`` when the application shuts down
+        metrics: Registry for the service's metrics and /metrics, instead of rag.metrics
+    """
+    service = QueryService(rag, max_active, max_queued, batch_delay, max_batch, metrics=metrics)
+    app = web.Application(middlewares=[service.observe])
+    app[SERVICE] = service
+    app.router.add_post("/query", service.query)
+    app.router.add_post("/query/stream", service.query_stream)
+    app.router.add_post("/retrieve", service.retrieve)
+    app.router.add_post("/insert", service.insert)
+    app.router.add_get("/health", service.health)
+    app.router.add_get("/metrics", service.render_metrics)
+
+    embed = rag.embedding_func
+    if embedding_batch_delay is not None:
+        rag.embedding_func = EmbeddingBatcher(embed, embedding_batch_delay)
+
+    async def cleanup(app: web.Application):
+        await service.batcher.close()
+        rag.embedding_func = embed
+        if close_rag:
+            await asyncio.to_thread(rag.close)
+
+    app.on_cleanup.append(cleanup)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a LightRAG instance over HTTP")
+    parser.add_argument("--working-dir", default="./lightrag_data")
+    parser.add_argument("--storage", default="supabase", choices=["supabase", "local"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-active", type=int, default=16, help="Queries in progress at once")
+    parser.add_argument("--max-queued", type=int, default=64, help="Queries waiting before 429")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--shards", type=int, default=None)
+    parser.add_argument("--background-ingest", action="store_true")
+    parser.add_argument("--offline", action="store_true",
+                        help="Use the fake LLM and hash embeddings, for trying the service without API keys")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.offline:
+        from .llm import hash_embedding
+        from .testing import FakeLLM
+        llm, options = FakeLLM(), {"embedding_func": hash_embedding}
+    else:
+        from .llm import gpt_4o_mini_complete, gpt_4o_mini_stream
+        llm, options = gpt_4o_mini_complete, {"llm_stream_func": gpt_4o_mini_stream}
+    rag = LightRAG(args.working_dir, llm, storage=args.storage, llm_concurrency=args.llm_concurrency,
+                   shards=args.shards, background_ingest=args.background_ingest, **options)
+    app = create_app(rag, args.max_active, args.max_queued, close_rag=True)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""Keyword and vector search over shards scored in parallel by worker processes"""
+import heapq
+import itertools
+import math
+import multiprocessing
+import os
+import threading
+import zlib
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+from .bm25 import tokenize
+from .vector_index import normalize_rows
+
+if TYPE_CHECKING:
+    from .bm25 import BM25Index, PostingArrays
+    from .vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+Hits = List[Tuple[str, float]]
+# (segment name, rows) of a SharedArray, or (segment name, terms, postings) of a Segment
+ArraySpec = Tuple[str, int]
+SegmentSpec = Tuple[str, int, int]
+
+
+def shard_of(item_id: str, shards: int) -> int:
+    """Shard of an id; the same in every process and run"""
+    return zlib.crc32(item_id.encode("utf-8")) % shards
+
+
+def _release(segment: shared_memory.SharedMemory, unlink: bool = True):
+    if unlink:
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+    try:
+        segment.close()
+    except BufferError:
+        pass  # A numpy view is still alive; the mapping goes when it does
+
+
+class SharedArray:
+    """Growable array in a shared memory segment, written by the process that created it.
+
+    Rows are written before ``size`` moves past them, so a worker reading
+    the first ``size`` rows of a spec never sees a partial write. Growing
+    copies the rows to a new segment twice as large and passes the old one
+    to ``retire``.
+    """
+
+    def __init__(self, dtype, row_shape: Tuple[int, ...], retire: Callable[[shared_memory.SharedMemory], None]):
+        self.dtype = np.dtype(dtype)
+        self.row_shape = row_shape
+        self.size = 0
+        self.array = np.zeros((0,) + row_shape, self.dtype)
+        self._segment: Optional[shared_memory.SharedMemory] = None
+        self._retire = retire
+
+    def append(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        needed = self.size + len(rows)
+        if needed > len(self.array):
+            capacity = max(needed, 2 * len(self.array), 1024)
+            segment = shared_memory.SharedMemory(
+                create=True, size=capacity * self.dtype.itemsize * int(np.prod(self.row_shape, dtype=np.int64))
+            )
+            array = np.ndarray((capacity,) + self.row_shape, self.dtype, buffer=segment.buf)
+            array[:self.size] = self.array[:self.size]
+            old, self._segment, self.array = self._segment, segment, array
+            if old is not None:
+                self._retire(old)
+        self.array[self.size:needed] = rows
+        self.size = needed
+
+    def spec(self) -> Optional[ArraySpec]:
+        return (self._segment.name, self.size) if self._segment is not None else None
+
+    def close(self):
+        self.array = np.zeros((0,) + self.row_shape, self.dtype)
+        if self._segment is not None:
+            _release(self._segment)
+            self._segment = None
+
+
+def _segment_arrays(buf, terms: int, postings: int):
+    """``(term_offsets, term_ids, rows, tfs)`` views of a postings segment's buffer"""
+    offsets = np.ndarray((terms + 1,), np.int64, buffer=buf)
+    term_ids = np.ndarray((terms,), np.int32, buffer=buf, offset=offsets.nbytes)
+    rows = np.ndarray((postings,), np.int32, buffer=buf, offset=offsets.nbytes + term_ids.nbytes)
+    tfs = np.ndarray((postings,), np.int32, buffer=buf, offset=offsets.nbytes + term_ids.nbytes + rows.nbytes)
+    return offsets, term_ids, rows, tfs
+
+
+class Segment:
+    """Immutable postings of some of a shard's documents, in shared memory, sorted by term id"""
+
+    def __init__(self, term_ids: np.ndarray, rows: np.ndarray, tfs: np.ndarray):
+        order = np.argsort(term_ids, kind="stable")
+        unique, counts = np.unique(term_ids[order], return_counts=True)
+        self.terms, self.postings = len(unique), len(rows)
+        size = 8 * (self.terms + 1) + 4 * (self.terms + 2 * self.postings)
+        self.segment = shared_memory.SharedMemory(create=True, size=size)
+        offsets, stored_terms, stored_rows, stored_tfs = self.arrays()
+        offsets[0] = 0
+        np.cumsum(counts, out=offsets[1:])
+        stored_terms[:] = unique
+        stored_rows[:] = rows[order]
+        stored_tfs[:] = tfs[order]
+
+    def arrays(self):
+        return _segment_arrays(self.segment.buf, self.terms, self.postings)
+
+    def triples(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """``(term_ids, rows, tfs)`` of every posting, copied out of shared memory"""
+        offsets, term_ids, rows, tfs = self.arrays()
+        return np.repeat(term_ids, np.diff(offsets)), rows.copy(), tfs.copy()
+
+    @property
+    def spec(self) -> SegmentSpec:
+        return self.segment.name, self.terms, self.postings
+
+
+class ShardedIndex:
+    """BM25 and cosine-similarity search over documents partitioned by id hash.
+
+    Every shard keeps its document lengths and vectors in growable shared
+    memory arrays, and its postings in immutable shared memory segments: a
+    batch of added documents becomes a new segment, and the newest two are
+    merged while the older is less than twice the size of the newer, so a
+    shard holds a logarithmic number of segments. A search sends one task
+    per non-empty shard to a process pool; the worker maps the shard's
+    segments, scores every query of the batch against them and returns the
+    shard's top k, and the per-shard lists are merged with a heap. Term
+    statistics are kept globally, so scores match BM25Index and VectorIndex.
+
+    The pool starts workers with forkserver (spawn where that is missing),
+    so scripts using it need an ``if __name__ == "__main__":`` guard.
+    """
+
+    def __init__(self, shards: int = 4, workers: Optional[int] = None, k1: float = 1.5, b: float = 0.75):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.shards = shards
+        self.workers = workers or min(shards, os.cpu_count() or 1)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # Serialises catching up with the source indexes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._searches = 0  # Searches whose tasks may still map retired segments
+        self._retired: List[shared_memory.SharedMemory] = []
+
+        self.vocab: Dict[str, int] = {}
+        self.df: List[int] = []
+        self.total_length = 0
+        self.keyword_count = 0
+        self.keyword_ids: List[List[str]] = [[] for _ in range(shards)]
+        self.lengths = [SharedArray(np.int32, (), self._retire) for _ in range(shards)]
+        self.segments: List[List[Segment]] = [[] for _ in range(shards)]
+
+        self.dim: Optional[int] = None
+        self.vector_count = 0
+        self.vector_ids: List[List[str]] = [[] for _ in range(shards)]
+        self.matrices: List[SharedArray] = []
+
+    def _retire(self, segment: shared_memory.SharedMemory):
+        """Unlink a replaced segment once no search in flight can still open it"""
+        if self._searches:
+            self._retired.append(segment)
+        else:
+            _release(segment)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=context)
+            logger.info(f"Started {self.workers} search workers for {self.shards} shards")
+        return self._pool
+
+    def _live(self) -> FrozenSet[str]:
+        names = [spec[0] for spec in (array.spec() for array in self.lengths + self.matrices) if spec]
+        names += [segment.segment.name for shard in self.segments for segment in shard]
+        return frozenset(names)
+
+    def add_keyword(self, docs: Sequence[Tuple[str, Dict[str, int], int]]) -> None:
+        """Index ``(doc_id, term frequencies, length)`` triples"""
+        with self._lock:
+            batches: List[Tuple[List[int], List[int], List[int]]] = [([], [], []) for _ in range(self.shards)]
+            lengths: List[List[int]] = [[] for _ in range(self.shards)]
+            for doc_id, term_freqs, length in docs:
+                shard = shard_of(doc_id, self.shards)
+                row = len(self.keyword_ids[shard])
+                self.keyword_ids[shard].append(doc_id)
+                lengths[shard].append(length)
+                term_ids, rows, tfs = batches[shard]
+                for term, tf in term_freqs.items():
+                    term_id = self.vocab.get(term)
+                    if term_id is None:
+                        term_id = self.vocab[term] = len(self.df)
+                        self.df.append(0)
+                    self.df[term_id] += 1
+                    term_ids.append(term_id)
+                    rows.append(row)
+                    tfs.append(tf)
+                self.total_length += length
+            for shard, (term_ids, rows, tfs) in enumerate(batches):
+                self.lengths[shard].append(lengths[shard])
+                if rows:
+                    self._add_segment(shard, np.array(term_ids, np.int32), np.array(rows, np.int32),
+                                      np.array(tfs, np.int32))
+            self.keyword_count += len(docs)
+
+    def load_keyword(self, arrays: "PostingArrays") -> None:
+        """Index every posting of a BM25Index export at once"""
+        with self._lock:
+            for term in arrays.terms:
+                self.vocab.setdefault(term, len(self.vocab))
+            term_ids = np.array([self.vocab[term] for term in arrays.terms], dtype=np.int32)
+            counts = np.diff(arrays.term_offsets)
+            self.df.extend([0] * (len(self.vocab) - len(self.df)))
+            df = np.array(self.df, dtype=np.int64)
+            np.add.at(df, term_ids, counts)
+            self.df = df.tolist()
+
+            shard = np.array([shard_of(doc_id, self.shards) for doc_id in arrays.ids], dtype=np.int64)
+            local = np.zeros(len(arrays.ids), dtype=np.int32)
+            posting_terms = np.repeat(term_ids, counts)
+            posting_shards = shard[arrays.rows]
+            for index in range(self.shards):
+                members = np.flatnonzero(shard == index)
+                start = len(self.keyword_ids[index])
+                local[members] = np.arange(start, start + len(members), dtype=np.int32)
+                self.keyword_ids[index].extend(arrays.ids[row] for row in members.tolist())
+                self.lengths[index].append(arrays.lengths[members])
+                selected = posting_shards == index
+                if selected.any():
+                    self._add_segment(index, posting_terms[selected], local[arrays.rows[selected]],
+                                      np.asarray(arrays.tfs)[selected])
+            self.total_length += arrays.total_length
+            self.keyword_count += len(arrays.ids)
+
+    def _add_segment(self, shard: int, term_ids: np.ndarray, rows: np.ndarray, tfs: np.ndarray):
+        segments = self.segments[shard]
+        segments.append(Segment(term_ids, rows, tfs))
+        while len(segments) > 1 and segments[-2].postings < 2 * segments[-1].postings:
+            newer, older = segments.pop(), segments.pop()
+            parts = [older.triples(), newer.triples()]
+            segments.append(Segment(*(np.concatenate(column) for column in zip(*parts))))
+            self._retire(older.segment)
+            self._retire(newer.segment)
+
+    def add_vectors(self, item_ids: Sequence[str], vectors: np.ndarray) -> None:
+        """Add embeddings, normalised to unit length"""
+        if not len(item_ids):
+            return
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.matrices = [SharedArray(np.float32, (self.dim,), self._retire) for _ in range(self.shards)]
+            shards = np.array([shard_of(item_id, self.shards) for item_id in item_ids])
+            for index in range(self.shards):
+                members = np.flatnonzero(shards == index)
+                if len(members):
+                    self.matrices[index].append(vectors[members])
+                    self.vector_ids[index].extend(item_ids[row] for row in members.tolist())
+            self.vector_count += len(item_ids)
+
+    def sync_keyword(self, index: "BM25Index", text_of: Callable[[str], str]) -> None:
+        """Add the documents of a BM25Index that were indexed since the last sync.
+
+        The first sync copies the index's postings; later ones tokenize the
+        texts of the new documents again, as only the index's term to
+        document direction is kept.
+        """
+        if self.keyword_count == index.doc_count:
+            return
+        with self._sync_lock:
+            if self.keyword_count == 0:
+                self.load_keyword(index.export())
+                return
+            docs = []
+            for doc_id in index.ids_since(self.keyword_count):
+                tokens = tokenize(text_of(doc_id))
+                docs.append((doc_id, dict(Counter(tokens)), len(tokens)))
+            self.add_keyword(docs)
+
+    def sync_vectors(self, index: "VectorIndex") -> None:
+        """Add the vectors of a VectorIndex that were added since the last sync"""
+        if self.vector_count == index.size:
+            return
+        with self._sync_lock:
+            self.add_vectors(*index.rows_since(self.vector_count))
+
+    def _start(self, score: Callable, tasks: List[Tuple[int, tuple]]) -> List[Tuple[int, Future]]:
+        """Submit one scoring task per shard; called under the lock that read the specs in ``tasks``"""
+        pool = self._executor()
+        live = self._live()
+        self._searches += 1
+        try:
+            return [(shard, pool.submit(score, *args, live)) for shard, args in tasks]
+        except BaseException:
+            self._searches -= 1
+            raise
+
+    def _collect(self, futures: List[Tuple[int, Future]]) -> List[Tuple[int, List]]:
+        """``(shard, per-query (rows, scores))`` results of the tasks of a search"""
+        try:
+            return [(shard, future.result()) for shard, future in futures]
+        finally:
+            with self._lock:
+                self._searches -= 1
+                if not self._searches:
+                    for segment in self._retired:
+                        _release(segment)
+                    self._retired.clear()
+
+    @staticmethod
+    def _merge(results: List[Tuple[int, List]], ids: List[List[str]], queries: int, top_k: int) -> List[Hits]:
+        merged = []
+        for position in range(queries):
+            ranked = [[(ids[shard][row], score) for row, score in zip(*per_query[position])]
+                      for shard, per_query in results]
+            merged.append(list(itertools.islice(heapq.merge(*ranked, key=lambda hit: -hit[1]), top_k)))
+        return merged
+
+    def search_keyword(self, queries: Sequence[str], top_k: int = 5) -> List[Hits]:
+        """BM25 top ``top_k`` ``(doc_id, score)`` pairs of each query, best first"""
+        with self._lock:
+            n_docs = self.keyword_count
+            if not n_docs or top_k <= 0:
+                return [[] for _ in queries]
+            avg_len = self.total_length / n_docs or 1.0
+            encoded = []
+            for query in queries:
+                term_ids = sorted({self.vocab[term] for term in tokenize(query) if term in self.vocab})
+                idfs = [math.log(1 + (n_docs - self.df[t] + 0.5) / (self.df[t] + 0.5)) for t in term_ids]
+                encoded.append((np.array(term_ids, dtype=np.int32), np.array(idfs)))
+            tasks = [(shard, (self.lengths[shard].spec(), [segment.spec for segment in self.segments[shard]],
+                              encoded, avg_len, self.k1, self.b, top_k))
+                     for shard in range(self.shards) if self.segments[shard]]
+            futures = self._start(_score_keyword, tasks)
+        return self._merge(self._collect(futures), self.keyword_ids, len(queries), top_k)
+
+    def search_vectors(self, query_vectors, top_k: int = 5) -> List[Hits]:
+        """Top ``top_k`` ``(id, cosine similarity)`` pairs of each query vector, best first"""
+        queries = normalize_rows(query_vectors)
+        with self._lock:
+            if not self.vector_count or top_k <= 0:
+                return [[] for _ in range(len(queries))]
+            tasks = [(shard, (matrix.spec(), self.dim, queries, top_k))
+                     for shard, matrix in enumerate(self.matrices) if matrix.size]
+            futures = self._start(_score_vectors, tasks)
+        return self._merge(self._collect(futures), self.vector_ids, len(queries), top_k)
+
+    def close(self) -> None:
+        """Stop the workers and free the shared memory"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        with self._lock:
+            for array in self.lengths + self.matrices:
+                array.close()
+            for segment in [s.segment for shard in self.segments for s in shard] + self._retired:
+                _release(segment)
+            self.segments = [[] for _ in range(self.shards)]
+            self._retired.clear()
+
+
+# Worker side: segments mapped by this process, by name
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach(name: str, live: FrozenSet[str]):
+    for stale in [stale for stale in _attached if stale not in live]:
+        _release(_attached.pop(stale), unlink=False)
+    segment = _attached.get(name)
+    if segment is None:
+        try:
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13; the pool shares the parent's resource tracker
+            segment = shared_memory.SharedMemory(name=name)
+        _attached[name] = segment
+    return segment.buf
+
+
+def _top(scores: np.ndarray, top_k: int, rows: Optional[np.ndarray] = None) -> Tuple[List[int], List[float]]:
+    """Rows of the ``top_k`` highest scores among ``rows`` (all by default), best first"""
+    if rows is None:
+        rows = np.arange(len(scores))
+    if top_k < len(rows):
+        rows = rows[np.argpartition(-scores[rows], top_k - 1)[:top_k]]
+    rows = rows[np.argsort(-scores[rows], kind="stable")]
+    return rows.tolist(), scores[rows].tolist()
+
+
+def _score_keyword(lengths_spec: ArraySpec, segment_specs: List[SegmentSpec],
+                   queries: List[Tuple[np.ndarray, np.ndarray]], avg_len: float, k1: float, b: float,
+                   top_k: int, live: FrozenSet[str]) -> List[Tuple[List[int], List[float]]]:
+    name, size = lengths_spec
+    lengths = np.ndarray((size,), np.int32, buffer=_attach(name, live))
+    norm = k1 * (1 - b + b * lengths / avg_len)
+    segments = [_segment_arrays(_attach(name, live), terms, postings) for name, terms, postings in segment_specs]
+    results = []
+    for term_ids, idfs in queries:
+        scores = np.zeros(size)
+        for offsets, segment_terms, rows, tfs in segments:
+            positions = np.searchsorted(segment_terms, term_ids)
+            for position, term_id, idf in zip(positions.tolist(), term_ids.tolist(), idfs.tolist()):
+                if position == len(segment_terms) or segment_terms[position] != term_id:
+                    continue
+                start, end = offsets[position], offsets[position + 1]
+                term_rows = rows[start:end]
+                term_tfs = tfs[start:end].astype(np.float64)
+                # A document is in one segment only, so its rows within a term are distinct
+                scores[term_rows] += idf * term_tfs * (k1 + 1) / (term_tfs + norm[term_rows])
+        results.append(_top(scores, top_k, np.flatnonzero(scores > 0)))
+    return results
+
+
+def _score_vectors(matrix_spec: ArraySpec, dim: int, queries: np.ndarray, top_k: int,
+                   live: FrozenSet[str]) -> List[Tuple[List[int], List[float]]]:
+    name, size = matrix_spec
+    matrix = np.ndarray((size, dim), np.float32, buffer=_attach(name, live))
+    scores = matrix @ queries.T
+    return [_top(scores[:, column], top_k) for column in range(scores.shape[1])]
@@ -0,0 +1,171 @@
+"""Versioned, memory-mapped snapshots of the corpus and indexes.
+
+A snapshot is a directory ``working_dir/snapshot/<generation>/`` holding a
+``manifest.json`` and one set of files per component:
+
+- corpus: ``documents.txt`` (``id<TAB>created_at`` lines), ``texts.bin``
+  (UTF-8 contents back to back) and ``text_offsets.npy`` (byte offsets)
+- chunks: ``chunk_docs.txt``, ``chunk_offsets.npy`` (first chunk of each
+  document) and ``chunk_spans.npy`` (character offsets)
+- vectors: ``vector_ids.txt`` and ``embeddings.npy`` (float32 unit rows)
+- bm25: ``bm25_ids.txt``, ``doc_lengths.npy``, ``terms.txt``,
+  ``term_offsets.npy``, ``posting_rows.npy`` and ``posting_tfs.npy``
+- graph: ``graph_names.jsonl``, ``graph_chunks.txt``, ``graph_edges.npy``,
+  ``graph_weights.npy``, ``graph_source_offsets.npy`` and ``graph_sources.npy``;
+  unlike the others it is rebuilt in memory on load, as graph traversal
+  works on dicts
+
+Arrays are opened with ``mmap_mode="r"`` and texts with ``mmap``, so opening
+a snapshot reads little more than the id lists, and processes opening the
+same snapshot share one copy of it in the page cache. The manifest records
+how far each component's append-only log had got; on load only the rest of
+the log is replayed. ``CURRENT`` names the live generation and is replaced
+atomically once a new generation is complete.
+"""
+import json
+import mmap
+import os
+import shutil
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+import logging
+
+from .storage import utc_now
+
+if TYPE_CHECKING:
+    import numpy as np
+    from .lightrag import LightRAG
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+DIRNAME = "snapshot"
+CURRENT_FILENAME = "CURRENT"
+MANIFEST_FILENAME = "manifest.json"
+
+
+class Snapshot:
+    """One snapshot generation, opened for reading"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILENAME), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.manifest.get('format')} in {directory}")
+        self._maps: List[mmap.mmap] = []
+
+    def section(self, name: str) -> Optional[Dict]:
+        """Manifest entry written by a component, or None if it is not in the snapshot"""
+        return self.manifest["sections"].get(name)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def array(self, name: str) -> "np.ndarray":
+        """A .npy file mapped read-only into memory"""
+        import numpy as np
+        try:
+            return np.load(self.path(name), mmap_mode="r")
+        except ValueError:
+            return np.load(self.path(name))  # Empty arrays cannot be mapped
+
+    def lines(self, name: str) -> List[str]:
+        with open(self.path(name), encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def blob(self, name: str):
+        """A binary file mapped read-only into memory"""
+        with open(self.path(name), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+
+def save_array(directory: str, name: str, array) -> None:
+    import numpy as np
+    np.save(os.path.join(directory, name), np.ascontiguousarray(array))
+
+
+def save_lines(directory: str, name: str, lines: Iterable[str]) -> None:
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def log_size(path: Optional[str]) -> int:
+    """Current size in bytes of an append-only log, 0 if it does not exist"""
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+def replay_offset(path: str, recorded: int) -> int:
+    """Where to resume replaying a log from after loading a snapshot.
+
+    A log shorter than the recorded offset was started afresh after the
+    snapshot was taken (the snapshot was copied without it, for example),
+    so all of it is new.
+    """
+    return recorded if log_size(path) >= recorded else 0
+
+
+def open_snapshot(working_dir: str) -> Optional[Snapshot]:
+    """The current snapshot in working_dir, or None if there is none"""
+    root = os.path.join(working_dir, DIRNAME)
+    try:
+        with open(os.path.join(root, CURRENT_FILENAME), encoding="utf-8") as f:
+            generation = f.read().strip()
+    except FileNotFoundError:
+        return None
+    try:
+        return Snapshot(os.path.join(root, generation))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable snapshot {generation} in {root}: {e}")
+        return None
+
+
+def write_snapshot(rag: "LightRAG") -> str:
+    """Write the corpus and indexes of ``rag`` as a new snapshot generation.
+
+    Older generations are removed once the new one is current; processes
+    that still have them mapped keep reading the unlinked files.
+
+    Returns:
+        Directory of the new generation
+    """
+    root = os.path.join(rag.working_dir, DIRNAME)
+    os.makedirs(root, exist_ok=True)
+    existing = [int(name) for name in os.listdir(root) if name.isdigit()]
+    generation = f"{max(existing, default=0) + 1:08d}"
+    tmp_dir = os.path.join(root, generation + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    sections = {
+        "corpus": rag.corpus.write_snapshot(tmp_dir),
+        "chunks": rag.chunks.write_snapshot(tmp_dir),
+        "bm25": rag.keyword_index.write_snapshot(tmp_dir),
+        "vectors": rag.vector_index.write_snapshot(tmp_dir),
+        "graph": rag.graph.write_snapshot(tmp_dir),
+    }
+    manifest = {"format": FORMAT_VERSION, "created_at": utc_now(), "sections": sections}
+    with open(os.path.join(tmp_dir, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    for name in os.listdir(tmp_dir):
+        with open(os.path.join(tmp_dir, name), "rb") as f:
+            os.fsync(f.fileno())
+    directory = os.path.join(root, generation)
+    os.replace(tmp_dir, directory)
+    current_tmp = os.path.join(root, CURRENT_FILENAME + ".tmp")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_tmp, os.path.join(root, CURRENT_FILENAME))
+
+    for name in os.listdir(root):
+        if name != generation and name.split(".")[0].isdigit():
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    logger.info(f"Wrote snapshot {generation}: {sections['corpus']['documents']} documents, "
+                f"{sections['chunks']['chunks']} chunks, {sections['vectors']['vectors']} vectors")
+    return directory
@@ -0,0 +1,241 @@
+"""Document storage backends for LightRAG"""
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def utc_now() -> str:
+    """Current UTC time as an ISO-8601 string with microsecond precision"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+class BaseStorage:
+    """Interface LightRAG uses to persist and read documents.
+
+    Documents are plain dicts with ``id``, ``content`` and ``created_at`` keys,
+    matching the columns of the Supabase ``documents`` table.
+    """
+
+    def insert(self, doc_id: str, content: str) -> None:
+        """Store a single document"""
+        raise NotImplementedError
+
+    def insert_many(self, rows: Sequence[Tuple[str, str]]) -> None:
+        """Store ``(doc_id, content)`` pairs in bulk; ids that already exist are left untouched"""
+        for doc_id, content in rows:
+            if self.get(doc_id) is None:
+                self.insert(doc_id, content)
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        """Return the document with the given id, or None"""
+        raise NotImplementedError
+
+    def get_many(self, doc_ids: List[str]) -> List[Dict]:
+        """Return the documents with the given ids, skipping unknown ids"""
+        docs = (self.get(doc_id) for doc_id in doc_ids)
+        return [doc for doc in docs if doc is not None]
+
+    def all(self) -> List[Dict]:
+        """Return every stored document"""
+        raise NotImplementedError
+
+    def fetch_page(self, after: Optional[Tuple[str, str]], limit: int) -> List[Dict]:
+        """Return up to ``limit`` documents ordered by ``(created_at, id)``.
+
+        Only rows strictly after the ``(created_at, id)`` key ``after`` are
+        returned, so callers can page through the table with keyset pagination.
+        """
+        docs = sorted(self.all(), key=lambda doc: (doc["created_at"], doc["id"]))
+        if after is not None:
+            docs = [doc for doc in docs if (doc["created_at"], doc["id"]) > tuple(after)]
+        return docs[:limit]
+
+    def count(self) -> int:
+        """Return the number of stored documents"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any resources held by the backend"""
+
+
+class SupabaseStorage(BaseStorage):
+    """Documents stored in the Supabase ``documents`` table.
+
+    The supabase client is created on first use, so constructing the
+    backend neither imports the client library nor touches the network.
+    """
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None,
+                 client=None, table: str = "documents"):
+        self.url = url
+        self.key = key
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.table_name = table
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from supabase import create_client
+                    self._client = create_client(
+                        self.url or os.environ.get("SUPABASE_URL"),
+                        self.key or os.environ.get("SUPABASE_KEY")
+                    )
+        return self._client
+
+    def table(self):
+        return self.client.table(self.table_name)
+
+    def insert(self, doc_id: str, content: str) -> None:
+        self.table().insert({
+            "id": doc_id,
+            "content": content,
+            "created_at": "now()"
+        }).execute()
+
+    def insert_many(self, rows: Sequence[Tuple[str, str]]) -> None:
+        from postgrest.types import ReturnMethod
+        if not rows:
+            return
+        # One bulk upsert per call; created_at falls back to the column default
+        self.table().upsert(
+            [{"id": doc_id, "content": content} for doc_id, content in rows],
+            on_conflict="id",
+            ignore_duplicates=True,
+            default_to_null=False,
+            returning=ReturnMethod.minimal
+        ).execute()
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        result = self.table().select("*").eq("id", doc_id).execute()
+        return result.data[0] if result.data else None
+
+    def get_many(self, doc_ids: List[str]) -> List[Dict]:
+        if not doc_ids:
+            return []
+        return self.table().select("*").in_("id", list(doc_ids)).execute().data
+
+    def all(self) -> List[Dict]:
+        return self.table().select("*").execute().data
+
+    def fetch_page(self, after: Optional[Tuple[str, str]], limit: int) -> List[Dict]:
+        query = self.table().select("*").order("created_at").order("id").limit(limit)
+        if after is not None:
+            created_at, doc_id = after
+            query = query.or_(
+                f'created_at.gt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.gt."{doc_id}")'
+            )
+        return query.execute().data
+
+    def count(self) -> int:
+        result = self.table().select("id", count="exact").limit(1).execute()
+        return result.count or 0
+
+
+class LocalStorage(BaseStorage):
+    """Documents stored in an embedded SQLite database under ``working_dir``.
+
+    Runs entirely in-process, so reads avoid any network round-trip and the
+    whole pipeline can be exercised without outside services.
+    """
+
+    FILENAME = "documents.db"
+
+    def __init__(self, working_dir: str):
+        os.makedirs(working_dir, exist_ok=True)
+        self.path = os.path.join(working_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id TEXT PRIMARY KEY, "
+                "content TEXT NOT NULL, "
+                "created_at TEXT NOT NULL)"
+            )
+        logger.info(f"Opened local document store at {self.path}")
+
+    def insert(self, doc_id: str, content: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO documents (id, content, created_at) VALUES (?, ?, ?)",
+                (doc_id, content, utc_now())
+            )
+
+    def insert_many(self, rows: Sequence[Tuple[str, str]]) -> None:
+        created_at = utc_now()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO documents (id, content, created_at) VALUES (?, ?, ?)",
+                [(doc_id, content, created_at) for doc_id, content in rows]
+            )
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, content, created_at FROM documents WHERE id = ?",
+                (doc_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_many(self, doc_ids: List[str]) -> List[Dict]:
+        if not doc_ids:
+            return []
+        placeholders = ",".join("?" * len(doc_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, content, created_at FROM documents WHERE id IN ({placeholders})",
+                list(doc_ids)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, content, created_at FROM documents ORDER BY created_at, id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def fetch_page(self, after: Optional[Tuple[str, str]], limit: int) -> List[Dict]:
+        with self._lock:
+            if after is None:
+                rows = self._conn.execute(
+                    "SELECT id, content, created_at FROM documents "
+                    "ORDER BY created_at, id LIMIT ?",
+                    (limit,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, content, created_at FROM documents "
+                    "WHERE (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?",
+                    (after[0], after[1], limit)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_storage(backend: str, working_dir: str) -> BaseStorage:
+    """Build a storage backend from its name ("supabase" or "local")"""
+    if backend == "supabase":
+        return SupabaseStorage()
+    if backend == "local":
+        return LocalStorage(working_dir)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,186 @@
+"""Hierarchical summaries of the corpus, maintained incrementally"""
+import asyncio
+import json
+import math
+import os
+import threading
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+from .bm25 import tokenize
+
+logger = logging.getLogger(__name__)
+
+SummarizeFunc = Callable[[List[str]], Awaitable[str]]
+
+
+class SummaryTree:
+    """Bottom-up summaries: chunk -> group -> ... -> root.
+
+    Chunks are leaves in insertion order. Every ``fanout`` consecutive
+    leaves form a level-1 group, every ``fanout`` level-1 groups a level-2
+    group, and so on until a single root remains. Adding chunks only marks
+    the last level-1 group dirty, so a refresh re-summarizes that group and
+    its ancestors while every other summary is reused.
+
+    Each recomputed node is appended as one JSON line to
+    ``summaries.jsonl`` in ``working_dir``; on load the latest line per
+    node wins.
+    """
+
+    FILENAME = "summaries.jsonl"
+
+    def __init__(self, working_dir: Optional[str] = None, fanout: int = 8):
+        if fanout < 2:
+            raise ValueError("fanout must be at least 2")
+        self.fanout = fanout
+        self.leaves: List[str] = []
+        self.leaf_set: Set[str] = set()
+        self.summaries: Dict[Tuple[int, int], str] = {}
+        self.dirty: Set[int] = set()
+        self.height = 0
+        self._lines = 0
+        self._lock = threading.Lock()
+        self.path = os.path.join(working_dir, self.FILENAME) if working_dir else None
+        if self.path and os.path.exists(self.path):
+            self._load()
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.leaf_set
+
+    @property
+    def is_stale(self) -> bool:
+        return bool(self.dirty) or (bool(self.leaves) and self.height == 0)
+
+    def _load(self):
+        groups: Dict[int, List[str]] = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._lines += 1
+                key = (entry["level"], entry["index"])
+                self.summaries[key] = entry["summary"]
+                if entry["level"] == 1:
+                    groups[entry["index"]] = entry["leaves"]
+                self.height = max(self.height, entry["level"])
+        for index in sorted(groups):
+            for chunk_id in groups[index]:
+                if chunk_id not in self.leaf_set:
+                    self.leaves.append(chunk_id)
+                    self.leaf_set.add(chunk_id)
+        logger.info(f"Loaded {len(self.summaries)} summaries over {len(self.leaves)} chunks")
+
+    def add(self, chunk_ids: Iterable[str]) -> None:
+        """Append chunks as new leaves and mark their groups dirty"""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                if chunk_id in self.leaf_set:
+                    continue
+                self.dirty.add(len(self.leaves) // self.fanout)
+                self.leaves.append(chunk_id)
+                self.leaf_set.add(chunk_id)
+
+    async def refresh(self, summarize: SummarizeFunc, chunk_text: Callable[[str], str]) -> int:
+        """Recompute dirty summaries level by level.
+
+        Args:
+            summarize: Coroutine turning a list of texts into one summary
+            chunk_text: Returns the text of a leaf chunk
+
+        Returns:
+            Number of summaries recomputed
+        """
+        with self._lock:
+            dirty = set(self.dirty)
+            self.dirty.clear()
+            leaves = list(self.leaves)
+        if not leaves:
+            return 0
+
+        try:
+            return await self._refresh(dirty, leaves, summarize, chunk_text)
+        except BaseException:
+            with self._lock:
+                self.dirty |= dirty
+            raise
+
+    async def _refresh(self, dirty: Set[int], leaves: List[str], summarize: SummarizeFunc,
+                       chunk_text: Callable[[str], str]) -> int:
+        fanout = self.fanout
+        dirty = set(dirty)
+        recomputed = 0
+        entries = []
+        level, child_count = 1, len(leaves)
+        while True:
+            count = math.ceil(child_count / fanout)
+            dirty |= {i for i in range(count) if (level, i) not in self.summaries}
+            order = sorted(dirty)
+            texts = []
+            for index in order:
+                children = range(index * fanout, min((index + 1) * fanout, child_count))
+                if level == 1:
+                    texts.append([chunk_text(leaves[i]) for i in children])
+                else:
+                    texts.append([self.summaries[(level - 1, i)] for i in children])
+            results = await asyncio.gather(*(summarize(t) for t in texts))
+
+            for index, summary in zip(order, results):
+                self.summaries[(level, index)] = summary
+                entry = {"level": level, "index": index, "summary": summary}
+                if level == 1:
+                    entry["leaves"] = leaves[index * fanout:(index + 1) * fanout]
+                entries.append(entry)
+            recomputed += len(order)
+
+            if count <= 1:
+                break
+            dirty = {i // fanout for i in dirty}
+            level, child_count = level + 1, count
+        self.height = max(self.height, level)
+
+        self._persist(entries, leaves)
+        if recomputed:
+            logger.info(f"Recomputed {recomputed} summaries (tree height {self.height})")
+        return recomputed
+
+    def _persist(self, entries: List[Dict], leaves: List[str]):
+        if not self.path or not entries:
+            return
+        with self._lock:
+            self._lines += len(entries)
+            if self._lines > 2 * len(self.summaries):
+                self._compact(leaves)
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(e) + "\n" for e in entries))
+
+    def _compact(self, leaves: List[str]):
+        """Rewrite the log with only the latest version of each summary"""
+        fanout = self.fanout
+        lines = []
+        for (level, index), summary in sorted(self.summaries.items()):
+            entry = {"level": level, "index": index, "summary": summary}
+            if level == 1:
+                entry["leaves"] = leaves[index * fanout:(index + 1) * fanout]
+            lines.append(json.dumps(entry) + "\n")
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(lines))
+        os.replace(tmp_path, self.path)
+        self._lines = len(lines)
+
+    def select(self, query: str, top_k: int) -> List[str]:
+        """The root summary followed by the ``top_k`` root children sharing most terms with the query"""
+        if self.height == 0:
+            return []
+        root = self.summaries[(self.height, 0)]
+        if self.height == 1:
+            return [root]
+        terms = set(tokenize(query))
+        level = self.height - 1
+        children = [self.summaries[(level, i)] for i in range(self.fanout)
+                    if (level, i) in self.summaries]
+        children.sort(key=lambda text: len(terms & set(tokenize(text))), reverse=True)
+        return [root] + children[:top_k]
@@ -0,0 +1,284 @@
+"""Offline stand-ins for Supabase, the LLM and the browser, plus a synthetic corpus"""
+import asyncio
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import logging
+
+from .browser import BrowserManager
+from .chunking import estimate_tokens
+from .storage import utc_now
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FakeResponse:
+    """Result of FakeQuery.execute(), shaped like a postgrest APIResponse"""
+    data: List[Dict]
+    count: Optional[int] = None
+
+
+_CONDITION = re.compile(r'^(\w+)\.(eq|neq|gt|gte|lt|lte)\.(.*)$')
+_COMPARE: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split a PostgREST logic expression on commas outside parentheses and quotes"""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _parse_filter(expression: str) -> Callable[[Dict], bool]:
+    """Predicate for one PostgREST filter term, e.g. ``and(a.eq."x",b.gt."y")``"""
+    for combinator, combine in (("and", all), ("or", any)):
+        if expression.startswith(combinator + "(") and expression.endswith(")"):
+            terms = [_parse_filter(t) for t in _split_top_level(expression[len(combinator) + 1:-1])]
+            return lambda row: combine(term(row) for term in terms)
+    match = _CONDITION.match(expression)
+    if match is None:
+        raise ValueError(f"Unsupported filter: {expression}")
+    column, op, value = match.groups()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    compare = _COMPARE[op]
+    return lambda row: row.get(column) is not None and compare(row[column], value)
+
+
+class FakeQuery:
+    """Chainable query builder over one FakeSupabaseClient table"""
+
+    def __init__(self, client: "FakeSupabaseClient", table: str):
+        self.client = client
+        self.table = table
+        self._filters: List[Callable[[Dict], bool]] = []
+        self._orders: List[str] = []
+        self._limit: Optional[int] = None
+        self._count = False
+        self._write: Optional[Callable[[], List[Dict]]] = None
+
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "FakeQuery":
+        self._count = count is not None
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column: str, values: Sequence) -> "FakeQuery":
+        values = set(values)
+        self._filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def or_(self, filters: str) -> "FakeQuery":
+        self._filters.append(_parse_filter(f"or({filters})"))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "FakeQuery":
+        if desc:
+            raise NotImplementedError("descending order is not supported")
+        self._orders.append(column)
+        return self
+
+    def limit(self, size: int) -> "FakeQuery":
+        self._limit = size
+        return self
+
+    def insert(self, rows, **kwargs) -> "FakeQuery":
+        self._write = lambda: self.client._write(self.table, rows, ignore_duplicates=False)
+        return self
+
+    def upsert(self, rows, ignore_duplicates: bool = False, **kwargs) -> "FakeQuery":
+        self._write = lambda: self.client._write(self.table, rows, ignore_duplicates)
+        return self
+
+    def execute(self) -> FakeResponse:
+        self.client.requests += 1
+        if self._write is not None:
+            return FakeResponse(self._write())
+        with self.client._lock:
+            rows = [row for row in self.client.tables.get(self.table, {}).values()
+                    if all(f(row) for f in self._filters)]
+        total = len(rows)
+        if self._orders:
+            rows.sort(key=lambda row: tuple(row.get(column) for column in self._orders))
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return FakeResponse([dict(row) for row in rows], total if self._count else None)
+
+
+class FakeSupabaseClient:
+    """In-memory stand-in for the parts of the supabase client SupabaseStorage uses.
+
+    Pass it as ``SupabaseStorage(client=FakeSupabaseClient())``. Rows get a
+    ``created_at`` timestamp on insert like the table's column default, and
+    ``requests`` counts round trips so batching can be measured.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, Dict[str, Dict]] = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def _write(self, table: str, rows, ignore_duplicates: bool) -> List[Dict]:
+        if isinstance(rows, dict):
+            rows = [rows]
+        written = []
+        with self._lock:
+            stored = self.tables.setdefault(table, {})
+            for row in rows:
+                row = dict(row)
+                if row["id"] in stored and ignore_duplicates:
+                    continue
+                if row.get("created_at") in (None, "now()"):
+                    row["created_at"] = utc_now()
+                stored[row["id"]] = row
+                written.append(row)
+        return written
+
+
+class FakeLLM:
+    """Deterministic LLM stand-in that counts calls and prompt tokens.
+
+    ``latency`` seconds are slept per call to model a remote API; the answer
+    is a fixed-length digest of the prompt.
+    """
+
+    def __init__(self, latency: float = 0.0, answer_tokens: int = 32):
+        self.latency = latency
+        self.answer_tokens = answer_tokens
+        self.calls = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt: str, temperature: Optional[float] = 0.7) -> str:
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += tokens
+        if self.latency:
+            time.sleep(self.latency)
+        words = prompt.split()[-self.answer_tokens:]
+        return " ".join(words) or "answer"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.prompt_tokens = 0
+
+
+@dataclass
+class FakeStepResult:
+    """The fields of a browser_use step result BrowserManager reads"""
+    done: bool
+    extracted_content: str = ""
+    current_url: str = ""
+    page_title: Optional[str] = None
+
+
+class FakeAgent:
+    """Stand-in for a browser_use Agent: finishes after ``steps`` steps with a synthetic page"""
+
+    def __init__(self, task: str, content: str, url: str, steps: int = 1, latency: float = 0.0):
+        self.task = task
+        self.content = content
+        self.url = url
+        self.steps = steps
+        self.latency = latency
+        self.taken = 0
+
+    async def step(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.taken += 1
+        if self.taken < self.steps:
+            return "browse", FakeStepResult(done=False)
+        return "extract", FakeStepResult(True, self.content, self.url, self.task)
+
+
+class FakeController:
+    """Stand-in for a browser_use Controller; fake agents keep no browser state"""
+
+
+class FakeBrowser(BrowserManager):
+    """BrowserManager whose agents return a synthetic page instead of driving a browser.
+
+    ``latency`` seconds are slept per agent step; every search gets a
+    distinct URL. Needs neither a browser nor browser_use.
+    """
+
+    def __init__(self, latency: float = 0.0, seed: int = 0, steps: int = 1):
+        super().__init__(agent_factory=self._create_fake_agent, controller_factory=FakeController)
+        self.latency = latency
+        self.steps = steps
+        self.searches = 0
+        self._random = random.Random(seed)
+
+    def _create_fake_agent(self, task: str, controller) -> FakeAgent:
+        self.searches += 1
+        content = f"{task}. " + _document(self._random)
+        return FakeAgent(task, content, f"https://example.com/{self.searches}", self.steps, self.latency)
+
+
+ENTITY_WORDS = """
+Alder Birch Cedar Delta Ember Falcon Granite Harbor Iris Juniper Kestrel Lumen
+Maple Nimbus Onyx Pioneer Quartz Raven Summit Tundra Umber Vertex Willow Zephyr
+""".split()
+ENTITY_KINDS = "Project Protocol Model Library Framework Dataset".split()
+TOPIC_WORDS = """
+training inference latency throughput memory cache index retrieval embedding
+vector graph summary query document storage network model parameter gradient
+optimizer batch token context prompt benchmark cluster replica shard schema
+""".split()
+VERBS = "improves reduces extends replaces depends on integrates with measures".split(" ")
+
+
+def _entity(rng: random.Random) -> str:
+    return f"{rng.choice(ENTITY_KINDS)} {rng.choice(ENTITY_WORDS)}"
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.sample(TOPIC_WORDS, 4)
+    return (f"{_entity(rng)} {rng.choice(VERBS)} {_entity(rng)} "
+            f"for {words[0]} {words[1]} and {words[2]} {words[3]}.")
+
+
+def _document(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(3, 8)))
+
+
+def generate_corpus(count: int, seed: int = 0) -> List[str]:
+    """``count`` distinct synthetic documents with entities, relations and topic terms"""
+    rng = random.Random(seed)
+    return [f"Report {i}. " + _document(rng) for i in range(count)]
+
+
+def generate_queries(count: int, seed: int = 1) -> List[str]:
+    """Questions over the vocabulary of generate_corpus"""
+    rng = random.Random(seed)
+    return [f"How does {_entity(rng)} affect {' '.join(rng.sample(TOPIC_WORDS, 2))}?"
+            for _ in range(count)]
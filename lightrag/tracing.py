@@ -0,0 +1,339 @@
+"""Per-query traces and a Prometheus-style metrics registry"""
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+@dataclass
+class QueryTrace:
+    """What one query spent its time and tokens on.
+
+    ``stages`` maps stage name to accumulated wall time in seconds. Stages
+    may nest (``retrieval`` includes the ``embedding`` of the query, for
+    example) so they do not add up to ``total_seconds``. Token counts are
+    local estimates, see ``chunking.estimate_tokens``.
+    """
+    query: str
+    mode: str
+    started_at: float = field(default_factory=time.time)
+    total_seconds: float = 0.0
+    stages: Dict[str, float] = field(default_factory=dict)
+    storage_rows: int = 0
+    storage_bytes: int = 0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    answer_cache_hits: int = 0
+    answer_cache_misses: int = 0
+    error: Optional[str] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_fetch(self, rows: int, size: int) -> None:
+        with self._lock:
+            self.storage_rows += rows
+            self.storage_bytes += size
+
+    def record_llm(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def record_cache(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def record_answer_cache(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.answer_cache_hits += 1
+            else:
+                self.answer_cache_misses += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "query": self.query,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "total_seconds": self.total_seconds,
+            "stages": dict(self.stages),
+            "storage_rows": self.storage_rows,
+            "storage_bytes": self.storage_bytes,
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "answer_cache_hits": self.answer_cache_hits,
+            "answer_cache_misses": self.answer_cache_misses,
+            "error": self.error,
+        }
+
+
+# asyncio.to_thread copies the context, so worker threads see the same trace
+_current: contextvars.ContextVar[Optional[QueryTrace]] = contextvars.ContextVar(
+    "lightrag_trace", default=None
+)
+
+
+def current_trace() -> Optional[QueryTrace]:
+    """Trace of the query running in this context, if any"""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Add the wall time of the block to the current trace's ``name`` stage"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(name, time.perf_counter() - start)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label combination"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if amount < 0:
+            raise ValueError("counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_number(value)}"
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, per label combination"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_number(value)}"
+                for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets per label combination"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = _format_labels(labels + [("le", _format_number(bound))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return "".join(metric.render() + "\n" for metric in metrics)
+
+
+REGISTRY = MetricsRegistry()
+
+TraceSink = Callable[[QueryTrace], None]
+
+
+def record_query_metrics(registry: MetricsRegistry, trace: QueryTrace) -> None:
+    """Aggregate a finished trace into the standard LightRAG metrics"""
+    mode = trace.mode
+    status = "error" if trace.error else "ok"
+    registry.counter("lightrag_queries_total", "Queries answered",
+                     ("mode", "status")).inc(mode=mode, status=status)
+    registry.histogram("lightrag_query_duration_seconds", "Wall time of a query",
+                       ("mode",)).observe(trace.total_seconds, mode=mode)
+    stages = registry.histogram("lightrag_stage_duration_seconds", "Wall time of a query stage",
+                                ("stage",))
+    for name, seconds in trace.stages.items():
+        stages.observe(seconds, stage=name)
+    registry.counter("lightrag_llm_calls_total", "LLM calls made by queries",
+                     ("mode",)).inc(trace.llm_calls, mode=mode)
+    registry.counter("lightrag_llm_prompt_tokens_total", "Estimated prompt tokens sent to the LLM",
+                     ("mode",)).inc(trace.prompt_tokens, mode=mode)
+    registry.counter("lightrag_llm_completion_tokens_total", "Estimated completion tokens received",
+                     ("mode",)).inc(trace.completion_tokens, mode=mode)
+    registry.counter("lightrag_llm_cache_hits_total", "LLM response cache hits").inc(trace.cache_hits)
+    registry.counter("lightrag_llm_cache_misses_total", "LLM response cache misses").inc(trace.cache_misses)
+    if trace.answer_cache_hits or trace.answer_cache_misses:
+        registry.counter("lightrag_answer_cache_hits_total",
+                         "Queries answered from the semantic answer cache").inc(trace.answer_cache_hits)
+        registry.counter("lightrag_answer_cache_misses_total",
+                         "Semantic answer cache lookups that missed").inc(trace.answer_cache_misses)
+    registry.counter("lightrag_storage_bytes_fetched_total",
+                     "Document bytes fetched from storage by queries").inc(trace.storage_bytes)
+
+
+@contextlib.contextmanager
+def traced(query: str, mode: str, registry: Optional[MetricsRegistry] = None,
+           sink: Optional[TraceSink] = None) -> Iterator[QueryTrace]:
+    """Trace the block as one query.
+
+    The trace is current inside the block; on exit its total time and any
+    error are recorded, it is aggregated into ``registry`` and handed to
+    ``sink``. A failing sink is logged, never raised.
+    """
+    trace = QueryTrace(query, mode)
+    token = _current.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    except GeneratorExit:
+        raise
+    except BaseException as e:
+        trace.error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        trace.total_seconds = time.perf_counter() - start
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Async generators may be finalised in a different context
+            _current.set(None)
+        if registry is not None:
+            record_query_metrics(registry, trace)
+        if sink is not None:
+            try:
+                sink(trace)
+            except Exception as e:
+                logger.error(f"Trace sink failed: {e}")
@@ -0,0 +1,196 @@
+"""Dense vector index with cosine-similarity top-k search"""
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+if TYPE_CHECKING:
+    from .snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length so a dot product is a cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """Embeddings kept as one contiguous float32 matrix of unit-length rows.
+
+    Rows are appended to a raw ``vectors.f32`` file and their ids to
+    ``vector_ids.txt`` in ``working_dir``, so adding vectors never rewrites
+    what is already on disk. Search is a single matrix-vector product
+    followed by ``argpartition``.
+
+    When started from a snapshot, the matrix is its memory-mapped
+    ``embeddings.npy`` and only vectors appended after it are read from the
+    files; the first add copies the matrix onto the heap.
+    """
+
+    VECTORS_FILENAME = "vectors.f32"
+    IDS_FILENAME = "vector_ids.txt"
+
+    def __init__(self, working_dir: Optional[str] = None, dim: Optional[int] = None,
+                 snapshot: Optional["Snapshot"] = None):
+        self.dim = dim
+        self.ids: List[str] = []
+        self.id_to_row = {}
+        self._matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        self._lock = threading.Lock()
+        self.vectors_path = os.path.join(working_dir, self.VECTORS_FILENAME) if working_dir else None
+        self.ids_path = os.path.join(working_dir, self.IDS_FILENAME) if working_dir else None
+        skip = 0
+        section = snapshot.section("vectors") if snapshot else None
+        if section:
+            self._matrix = snapshot.array("embeddings.npy")
+            self.ids = snapshot.lines("vector_ids.txt")
+            self.id_to_row = {item_id: row for row, item_id in enumerate(self.ids)}
+            self.dim = section["dim"] or self.dim
+            skip = section["log_rows"]
+            logger.info(f"Mapped {len(self.ids)} vectors from snapshot {snapshot.directory}")
+        if self.ids_path and os.path.exists(self.ids_path):
+            self._load(skip)
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """The ``(size, dim)`` matrix of stored unit vectors"""
+        return self._matrix[:self.size]
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.id_to_row
+
+    def _load(self, skip: int = 0):
+        """Read the vector files, leaving out the first ``skip`` rows already in a snapshot"""
+        with open(self.ids_path, encoding="utf-8") as f:
+            ids = f.read().splitlines()
+        if len(ids) < skip:
+            skip = 0  # The files were started afresh after the snapshot
+        ids = ids[skip:]
+        if not ids:
+            return
+        if self.dim is None:
+            self.dim = (os.path.getsize(self.vectors_path) // 4) // (len(ids) + skip)
+        raw = np.fromfile(self.vectors_path, dtype=np.float32, offset=skip * self.dim * 4)
+        vectors = raw[:raw.size - raw.size % self.dim].reshape(-1, self.dim)
+        # A crash between the two appends can leave one file longer than the other
+        count = min(len(ids), len(vectors))
+        if not self.ids:
+            self._matrix = np.ascontiguousarray(vectors[:count])
+            self.ids = ids[:count]
+            self.id_to_row = {item_id: row for row, item_id in enumerate(self.ids)}
+        else:
+            self._append(ids[:count], vectors[:count])
+        logger.info(f"Loaded {count} vectors of dimension {self.dim} from {self.vectors_path}")
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        if needed <= len(self._matrix) and self._matrix.flags.writeable:
+            return
+        capacity = max(needed, 2 * len(self._matrix), 64)
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        if self.size:
+            grown[:self.size] = self.matrix
+        self._matrix = grown
+
+    def _append(self, item_ids: List[str], vectors: np.ndarray):
+        """Add rows in memory only, skipping ids already present"""
+        keep = [row for row, item_id in enumerate(item_ids) if item_id not in self.id_to_row]
+        if len(keep) < len(item_ids):
+            item_ids = [item_ids[row] for row in keep]
+            vectors = vectors[keep]
+        self._reserve(len(item_ids))
+        self._matrix[self.size:self.size + len(item_ids)] = vectors
+        for item_id in item_ids:
+            self.id_to_row[item_id] = len(self.ids)
+            self.ids.append(item_id)
+
+    def add(self, item_id: str, vector: Sequence[float]) -> None:
+        """Add a single vector"""
+        self.add_many([item_id], [vector])
+
+    def add_many(self, item_ids: Sequence[str], vectors) -> None:
+        """Add vectors row by row; ids already present are skipped"""
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            if self.dim is None or self.size == 0:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+            keep = []
+            seen = set()
+            for row, item_id in enumerate(item_ids):
+                if item_id not in self.id_to_row and item_id not in seen:
+                    keep.append(row)
+                    seen.add(item_id)
+            if not keep:
+                return
+            new_ids = [item_ids[row] for row in keep]
+            new_vectors = vectors[keep]
+
+            self._append(new_ids, new_vectors)
+
+            if self.vectors_path:
+                with open(self.vectors_path, "ab") as f:
+                    f.write(new_vectors.tobytes())
+                with open(self.ids_path, "a", encoding="utf-8") as f:
+                    f.write("".join(item_id + "\n" for item_id in new_ids))
+
+    def rows_since(self, start: int) -> Tuple[List[str], np.ndarray]:
+        """Ids and a copy of the vectors added after the first ``start``"""
+        with self._lock:
+            return self.ids[start:], np.array(self.matrix[start:])
+
+    def search(self, query_vector: Sequence[float], top_k: int = 5) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` ``(id, cosine_similarity)`` pairs, best first"""
+        if self.size == 0 or top_k <= 0:
+            return []
+        query = normalize_rows(query_vector)[0]
+        scores = self.matrix @ query
+        if top_k < len(scores):
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[row], float(scores[row])) for row in top]
+
+    def search_many(self, query_vectors, top_k: int = 5) -> List[List[Tuple[str, float]]]:
+        """search() for a batch of queries with one matrix-matrix product"""
+        queries = normalize_rows(query_vectors)
+        if self.size == 0 or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        scores = self.matrix @ queries.T  # (size, len(queries))
+        if top_k < self.size:
+            top = np.argpartition(-scores, top_k - 1, axis=0)[:top_k]
+        else:
+            top = np.broadcast_to(np.arange(self.size)[:, None], scores.shape)
+        results = []
+        for column in range(scores.shape[1]):
+            rows = top[:, column]
+            column_scores = scores[rows, column]
+            rows = rows[np.argsort(-column_scores, kind="stable")]
+            results.append([(self.ids[row], float(scores[row, column])) for row in rows])
+        return results
+
+    def write_snapshot(self, directory: str) -> Dict:
+        """Write the matrix and ids to a snapshot directory; returns its manifest section"""
+        from .snapshot import save_array, save_lines
+        with self._lock:
+            save_array(directory, "embeddings.npy", self.matrix)
+            save_lines(directory, "vector_ids.txt", self.ids)
+            log_rows = 0
+            if self.ids_path and os.path.exists(self.ids_path):
+                with open(self.ids_path, encoding="utf-8") as f:
+                    log_rows = sum(1 for _ in f)
+            return {"vectors": self.size, "dim": self.dim, "log_rows": log_rows}
@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from lightrag.answer_cache import SemanticAnswerCache
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.testing import FakeLLM
+from lightrag.tracing import MetricsRegistry
+
+
+def test_nearest_entry_above_threshold_with_matching_scope_and_version():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put([1.0, 0.0, 0.0], "x answer", ["doc-x"], scope="naive", version=1, query="x")
+    cache.put([0.0, 1.0, 0.0], "y answer", scope="naive", version=1, query="y")
+
+    hit = cache.get([0.99, 0.05, 0.0], scope="naive", version=1)
+    assert (hit.query, hit.answer, hit.documents) == ("x", "x answer", ["doc-x"])
+    assert hit.similarity > 0.99
+    assert cache.get([0.7, 0.7, 0.0], scope="naive", version=1) is None  # below threshold
+    assert cache.get([1.0, 0.0, 0.0], scope="hybrid", version=1) is None
+    assert cache.get([1.0, 0.0, 0.0], scope="naive", version=2) is None
+    assert (cache.stats.hits, cache.stats.misses) == (1, 3)
+    assert cache.stats.hit_rate == 0.25
+
+
+def test_lru_eviction_and_invalidation():
+    cache = SemanticAnswerCache(max_entries=2, threshold=0.99)
+    a, b, c = np.eye(3)
+    cache.put(a, "a")
+    cache.put(b, "b")
+    assert cache.get(a).answer == "a"  # b is now least recently used
+    cache.put(c, "c")
+    assert cache.get(b) is None
+    assert cache.get(a).answer == "a" and cache.get(c).answer == "c"
+    assert cache.stats.evictions == 1 and len(cache) == 2
+
+    assert cache.invalidate(1) == 2
+    assert len(cache) == 0 and cache.stats.invalidations == 2
+    cache.put(a, "stale", version=0)  # computed before the corpus changed
+    assert len(cache) == 0
+    cache.put(a, "fresh", version=1)
+    assert cache.get(a, version=1).answer == "fresh"
+
+
+def test_paraphrases_are_answered_from_cache_until_insert(tmp_path):
+    llm = FakeLLM()
+    registry = MetricsRegistry()
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding,
+                   answer_cache=SemanticAnswerCache(threshold=0.85), metrics=registry)
+    rag.insert_many(["Python is a popular programming language.", "Rust is a systems language."])
+    param = QueryParam(mode="naive")
+
+    answer = rag.query("what is the python language", param)
+    assert llm.calls == 1
+    assert rag.query("What is the Python language?", param) == answer
+    assert rag.query("what is python language", param) == answer
+    assert llm.calls == 1
+    rag.query("what is python language", QueryParam(mode="naive", max_results=2))
+    assert llm.calls == 2  # different parameters
+
+    _, trace = rag.query_traced("what is the python language", param)
+    assert (trace.answer_cache_hits, trace.llm_calls) == (1, 0)
+    assert registry.counter("lightrag_answer_cache_hits_total", "").value() == 3
+
+    rag.insert("Python was created by Guido van Rossum.")
+    assert rag.answer_cache.stats.invalidations == 2
+    rag.query("what is the python language", param)
+    assert llm.calls == 3
+
+
+def test_query_many_and_stream_use_the_cache(tmp_path):
+    llm = FakeLLM()
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding,
+                   answer_cache=True)
+    rag.insert_many(["Python is a popular programming language.", "Rust is a systems language."])
+    param = QueryParam(mode="naive")
+
+    answer = rag.query("python language", param)
+    results = rag.query_many(["python language", "rust systems"], param)
+    assert [r.ok for r in results] == [True, True]
+    assert results[0].answer == answer and llm.calls == 2
+
+    events = list(rag.query_stream("rust systems", param))
+    assert events[-1].text == results[1].answer and llm.calls == 2
+    assert events[0].documents == results[1].documents
@@ -0,0 +1,112 @@
+import sys
+import os
+import threading
+import time
+import asyncio
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.cache import LLMResponseCache
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+
+LLM_LATENCY = 0.2
+
+
+def slow_llm(prompt: str, temperature: float = 0.7) -> str:
+    time.sleep(LLM_LATENCY)
+    return "answer"
+
+
+@pytest.fixture
+def rag(tmp_path):
+    rag = LightRAG(str(tmp_path), slow_llm, storage="local", embedding_func=hash_embedding)
+    rag.insert_many([
+        "Python is a popular programming language",
+        "Java is used for enterprise applications",
+    ])
+    rag.update_summaries()
+    yield rag
+    rag.close()
+
+
+def test_hybrid_takes_one_llm_hop(rag):
+    """Hybrid fuses retrieval results and makes a single synthesis call"""
+    start = time.perf_counter()
+    assert rag.query("programming with Python", QueryParam(mode="hybrid")) == "answer"
+    elapsed = time.perf_counter() - start
+    assert elapsed < 1.5 * LLM_LATENCY
+
+
+def test_llm_concurrency_limit(tmp_path):
+    """Summary groups are summarized concurrently, up to llm_concurrency at a time"""
+    docs = [f"document {i}" for i in range(4)]
+    timings = []
+    for concurrency in (4, 1):
+        rag = LightRAG(str(tmp_path / str(concurrency)), slow_llm, storage="local",
+                       embedding_func=hash_embedding, llm_concurrency=concurrency, summary_fanout=2)
+        rag.insert_many(docs)
+        start = time.perf_counter()
+        assert rag.update_summaries() == 3
+        timings.append(time.perf_counter() - start)
+        rag.close()
+    assert timings[0] < 2.5 * LLM_LATENCY
+    assert timings[1] >= 3 * LLM_LATENCY
+
+
+def test_llm_concurrency_is_shared_across_threads(tmp_path):
+    """Sync queries from several threads, each on its own loop, share one cap and one call per prompt"""
+    lock = threading.Lock()
+    active, peak, prompts = [0], [0], []
+
+    def tracking_llm(prompt, temperature=0.7):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            prompts.append(prompt)
+        time.sleep(0.1)
+        with lock:
+            active[0] -= 1
+        return "answer"
+
+    rag = LightRAG(str(tmp_path), tracking_llm, storage="local", embedding_func=hash_embedding,
+                   llm_concurrency=2, llm_cache=False)
+    rag.insert_many([f"document {i} about topic {i}" for i in range(8)])
+    threads = [threading.Thread(target=rag.query, args=(f"topic {i}", QueryParam(mode="naive")))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(prompts) == 8 and peak[0] == 2
+
+    rag.llm_cache = LLMResponseCache()
+    prompts.clear()
+    same = QueryParam(mode="naive", temperature=0)
+    threads = [threading.Thread(target=rag.query, args=("topic 3", same)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(prompts) == 1
+    rag.close()
+
+
+@pytest.mark.asyncio
+async def test_async_api_with_coroutine_llm(tmp_path):
+    calls = []
+
+    async def async_llm(prompt, temperature=0.7):
+        calls.append(prompt)
+        await asyncio.sleep(0)
+        return "async answer"
+
+    rag = LightRAG(str(tmp_path), async_llm, storage="local", embedding_func=hash_embedding)
+    doc_id = await rag.ainsert("Rust guarantees memory safety without garbage collection")
+    assert rag.storage.get(doc_id) is not None
+
+    assert await rag.aquery("memory safety", QueryParam(mode="naive")) == "async answer"
+    # The sync wrapper also works from inside a running event loop
+    assert rag.query("memory safety", QueryParam(mode="local")) == "async answer"
+    assert len(calls) == 2
+    rag.close()
@@ -0,0 +1,53 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.bm25 import BM25Index, tokenize
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What is the Python GIL?") == ["python", "gil"]
+
+
+def test_bm25_ranks_multi_word_queries():
+    """Documents matching more query terms rank first"""
+    index = BM25Index()
+    index.add_many([
+        ("a", "Python is a popular programming language"),
+        ("b", "Java is used for enterprise applications"),
+        ("c", "Programming in Python with type hints and Python tooling"),
+    ])
+    hits = index.search("python programming", top_k=2)
+    assert [doc_id for doc_id, _ in hits] == ["c", "a"]
+    assert index.search("haskell") == []
+
+
+def test_bm25_index_persists(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add("a", "supervised fine-tuning of language models")
+    index.add("a", "duplicate ids are ignored")
+
+    reopened = BM25Index(str(tmp_path))
+    assert reopened.doc_count == 1
+    assert reopened.search("fine-tuning")[0][0] == "a"
+
+
+def test_naive_mode_uses_index(tmp_path):
+    prompts = []
+
+    def llm(prompt, temperature=0.7):
+        prompts.append(prompt)
+        return "answer"
+
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding)
+    rag.insert("TensorFlow and PyTorch are deep learning frameworks")
+    rag.insert("JavaScript runs in browsers")
+    # Written behind LightRAG's back; picked up on the next query
+    rag.storage.insert("external", "PyTorch supports dynamic computation graphs")
+
+    assert rag.query("Which frameworks support PyTorch?", QueryParam(mode="naive")) == "answer"
+    assert "dynamic computation graphs" in prompts[-1]
+    assert "JavaScript" not in prompts[-1]
+    rag.close()
@@ -0,0 +1,91 @@
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.cache import LLMResponseCache
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), max_memory_entries=1)
+    key_a = cache.make_key("model", "prompt a", 0)
+    key_b = cache.make_key("model", "prompt b", 0)
+    assert key_a != cache.make_key("model", "prompt a", 0.7)
+
+    assert cache.get(key_a) is None
+    cache.set(key_a, "answer a")
+    cache.set(key_b, "answer b")  # evicts a from memory
+    assert cache.get(key_b) == "answer b"
+    assert cache.get(key_a) == "answer a"  # served from disk
+    assert (cache.stats.memory_hits, cache.stats.disk_hits, cache.stats.misses) == (1, 1, 1)
+    cache.close()
+
+    reopened = LLMResponseCache(str(tmp_path))
+    assert reopened.get(key_b) == "answer b"
+    reopened.close()
+
+
+def test_ttl_and_disk_limit(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), max_memory_entries=0, max_disk_entries=5, ttl=0.05)
+    for i in range(10):
+        cache.set(str(i), f"value {i}")
+    assert cache._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] <= 6
+    assert cache.get("9") == "value 9"
+    time.sleep(0.1)
+    assert cache.get("9") is None
+    cache.close()
+
+
+def test_query_hits_llm_once_per_cacheable_input(tmp_path):
+    calls = []
+
+    def llm(prompt, temperature=0.7):
+        calls.append(prompt)
+        return f"answer {len(calls)}"
+
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding)
+    rag.insert("Python is a popular programming language")
+
+    deterministic = QueryParam(mode="naive", temperature=0)
+    first = rag.query("python", deterministic)
+    assert rag.query("python", deterministic) == first
+    assert len(calls) == 1
+
+    # Non-zero temperature only caches when asked to
+    rag.query("python", QueryParam(mode="naive"))
+    rag.query("python", QueryParam(mode="naive"))
+    assert len(calls) == 3
+    rag.query("python", QueryParam(mode="naive", cache=True))
+    rag.query("python", QueryParam(mode="naive", cache=True))
+    assert len(calls) == 4
+    assert rag.llm_cache.stats.hits == 2
+    rag.close()
+
+
+def test_disk_tier_needs_a_stable_model_name(tmp_path):
+    deterministic = QueryParam(mode="naive", temperature=0)
+
+    def reopen(llm, **options):
+        rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding, **options)
+        rag.insert("Python is a popular programming language")
+        return rag
+
+    # Lambdas share a qualname, so they must not share cache entries
+    rag = reopen(lambda prompt, temperature=0.7: "first")
+    assert rag.query("python", deterministic) == "first"
+    rag.close()
+    rag = reopen(lambda prompt, temperature=0.7: "second")
+    assert rag.query("python", deterministic) == "second"
+    assert rag.llm_cache._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 0
+    rag.close()
+
+    # An explicit name makes the disk tier usable across processes
+    rag = reopen(lambda prompt, temperature=0.7: "named", llm_model_name="my-model")
+    assert rag.query("python", deterministic) == "named"
+    rag.close()
+    rag = reopen(lambda prompt, temperature=0.7: "other", llm_model_name="my-model")
+    assert rag.query("python", deterministic) == "named"
+    assert rag.llm_cache.stats.disk_hits == 1
+    rag.close()
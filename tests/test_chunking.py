@@ -0,0 +1,87 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from lightrag.chunking import ChunkStore, chunk_text, estimate_tokens, pack_context
+from lightrag.lightrag import LightRAG, QueryParam, compute_doc_id
+from lightrag.llm import hash_embedding
+from lightrag.testing import FakeLLM
+
+
+def test_estimate_tokens_counts_words_and_punctuation():
+    assert estimate_tokens("Hello, world!") == 4
+    assert estimate_tokens("") == 0
+
+
+def test_chunks_overlap_and_cover_the_text():
+    text = " ".join(f"w{i}" for i in range(25))
+    spans = chunk_text(text, chunk_size=10, overlap=3)
+    chunks = [text[start:end] for start, end in spans]
+    assert chunks[0].split() == [f"w{i}" for i in range(10)]
+    assert chunks[1].split()[:3] == ["w7", "w8", "w9"]
+    assert chunks[-1].endswith("w24")
+    assert all(estimate_tokens(c) <= 10 for c in chunks)
+    assert chunk_text("short text", chunk_size=10, overlap=3) == [(0, 10)]
+
+
+def test_pack_context_respects_budget():
+    candidates = [("a", "one two three"), ("b", "one two three four five"), ("c", "six")]
+    assert [key for key, _ in pack_context(candidates, 4)] == ["a", "c"]
+    assert pack_context(candidates, 0) == []
+
+
+def test_chunk_store_persists_offsets(tmp_path):
+    store = ChunkStore(str(tmp_path), chunk_size=4, overlap=1)
+    chunks = store.add_many([("doc", "a b c d e f g")])
+    assert [c.id for c in chunks] == ["doc#0", "doc#1"]
+
+    reopened = ChunkStore(str(tmp_path))
+    assert [(c.start, c.end) for c in reopened.by_doc["doc"]] == [(c.start, c.end) for c in chunks]
+
+
+def test_prompt_size_is_bounded(tmp_path):
+    prompts = []
+
+    def llm(prompt, temperature=0.7):
+        prompts.append(prompt)
+        return "answer"
+
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding,
+                   chunk_size=20, chunk_overlap=5)
+    rag.insert_many(f"Document {i} talks about topic {i % 7} in some detail. " * 5 for i in range(200))
+    assert len(rag.chunks) > 200
+
+    for mode in ["global", "semantic", "naive"]:
+        rag.query("topic 3 detail", QueryParam(mode=mode, max_context_tokens=200))
+        assert estimate_tokens(prompts[-1]) < 260
+    rag.close()
+
+
+def test_failed_insert_is_indexed_by_the_next_sync(tmp_path):
+    fail = [True]
+
+    def embed(texts):
+        if fail[0]:
+            raise RuntimeError("embedding service down")
+        return hash_embedding(texts)
+
+    doc = "Rust guarantees memory safety without a garbage collector"
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=embed)
+    with pytest.raises(RuntimeError, match="embedding service down"):
+        rag.insert(doc)
+    assert len(rag.chunks) == 0
+    rag.close()
+
+    # Nothing was chunked, so reopening indexes the stored document
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=embed)
+    with pytest.raises(RuntimeError, match="embedding service down"):
+        rag.retrieve("memory safety", QueryParam(mode="naive"))
+    fail[0] = False
+    for _ in range(2):  # After a failed sync, and again from disk
+        passages = rag.retrieve("memory safety", QueryParam(mode="naive"))
+        assert [passage.doc_id for passage in passages] == [compute_doc_id(doc)]
+        rag.close()
+        rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=embed)
+    rag.close()
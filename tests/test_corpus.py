@@ -0,0 +1,70 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.corpus import CorpusMirror
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.storage import LocalStorage
+
+
+class CountingStorage(LocalStorage):
+    """Local store that records page requests and refuses full-table reads"""
+
+    def __init__(self, working_dir):
+        super().__init__(working_dir)
+        self.pages = []
+
+    def fetch_page(self, after, limit):
+        page = super().fetch_page(after, limit)
+        self.pages.append(len(page))
+        return page
+
+    def all(self):
+        raise AssertionError("full table fetch")
+
+
+def test_mirror_pages_through_whole_table(tmp_path):
+    storage = CountingStorage(str(tmp_path))
+    storage.insert_many([(f"doc{i:02d}", f"content {i}") for i in range(10)])
+
+    mirror = CorpusMirror(storage, page_size=4)
+    assert len(mirror.refresh()) == 10
+    assert storage.pages == [4, 4, 2, 0]
+    assert [doc["id"] for doc in mirror.get_many(["doc03", "missing", "doc01"])] == ["doc03", "doc01"]
+
+    # Later refreshes only fetch rows past the high-water mark
+    storage.pages.clear()
+    assert mirror.refresh() == []
+    assert storage.pages == [0]
+    storage.insert("doc10", "content 10")
+    assert [doc["id"] for doc in mirror.refresh()] == ["doc10"]
+    assert len(mirror) == 11
+
+
+def test_refresh_interval_throttles_checks(tmp_path):
+    storage = CountingStorage(str(tmp_path))
+    mirror = CorpusMirror(storage, refresh_interval=60)
+    mirror.refresh()
+    mirror.refresh()
+    assert storage.pages == [0]
+    mirror.refresh(force=True)
+    assert storage.pages == [0, 0]
+
+
+def test_queries_do_not_refetch_corpus(tmp_path):
+    storage = CountingStorage(str(tmp_path))
+    rag = LightRAG(str(tmp_path), lambda prompt, temperature=0.7: prompt,
+                   storage=storage, embedding_func=hash_embedding)
+    rag.corpus.page_size = 2
+    rag.insert_many(["alpha document", "beta document", "gamma document"])
+    storage.insert("external", "delta document from another writer")
+
+    answer = rag.query("document", QueryParam(mode="global"))
+    assert "delta document" in answer and "alpha document" in answer
+    pages_after_first_query = len(storage.pages)
+
+    rag.query("delta", QueryParam(mode="naive"))
+    assert len(storage.pages) == pages_after_first_query + 1
+    assert storage.pages[-1] == 0
+    rag.close()
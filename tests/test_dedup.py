@@ -0,0 +1,90 @@
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from lightrag.dedup import Deduplicator, MinHasher, lsh_bands, shingles
+from lightrag.lightrag import LightRAG
+from lightrag.llm import hash_embedding
+from lightrag.testing import FakeLLM, generate_corpus
+
+ARTICLE = ("LoRA freezes the pretrained weights of a large language model and trains a pair of "
+           "low rank matrices per layer instead. This cuts the number of trainable parameters by "
+           "several orders of magnitude, which makes fine-tuning affordable on a single GPU. "
+           "The adapters can be merged into the base weights after training, so inference "
+           "latency does not change. QLoRA combines the method with four bit quantization.")
+
+
+def test_minhash_estimates_jaccard():
+    hasher = MinHasher(num_perm=256)
+    a, b = shingles(ARTICLE), shingles(ARTICLE.replace("single GPU", "single consumer GPU"))
+    jaccard = len(a & b) / len(a | b)
+    estimate = (hasher.signature(ARTICLE) == hasher.signature(
+        ARTICLE.replace("single GPU", "single consumer GPU"))).mean()
+    assert abs(estimate - jaccard) < 0.1
+    assert lsh_bands(128, 0.9) == (8, 16)
+
+
+def test_deduplicator_filters_and_persists(tmp_path):
+    dedup = Deduplicator(str(tmp_path), threshold=0.8)
+    rows = [("a", ARTICLE), ("b", ARTICLE.upper()), ("c", ARTICLE + " Read more."), ("d", "Unrelated text.")]
+    new_rows, duplicates = dedup.filter(rows)
+    assert [doc_id for doc_id, _ in new_rows] == ["a", "d"]
+    assert duplicates == {"b": "a", "c": "a"}
+
+    dedup.commit(["a"])
+    dedup.discard(["d"])
+    reopened = Deduplicator(str(tmp_path), threshold=0.8)
+    assert "a" in reopened and "d" not in reopened
+    assert reopened.filter([("e", ARTICLE + " Subscribe.")])[1] == {"e": "a"}
+    assert reopened.filter([("d", "Unrelated text.")])[1] == {}
+
+
+def test_insert_skips_near_duplicates(tmp_path):
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=hash_embedding)
+    first = rag.insert(ARTICLE)
+    assert rag.insert(ARTICLE + " Share this article.") == first
+    ids = rag.insert_many([ARTICLE.replace(".", ". "), "Something else entirely."])
+    assert ids[0] == first and ids[1] != first
+    assert rag.storage.count() == 2
+    rag.close()
+
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=hash_embedding,
+                   dedup_threshold=None)
+    assert rag.insert(ARTICLE + " Share this article.") != first
+    rag.close()
+
+
+def test_failed_insert_is_not_remembered(tmp_path):
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=hash_embedding)
+    insert_many = rag.storage.insert_many
+
+    def failing(rows):
+        raise ConnectionError("storage down")
+
+    rag.storage.insert_many = failing
+    with pytest.raises(ConnectionError):
+        rag.insert(ARTICLE)
+    rag.storage.insert_many = insert_many
+    doc_id = rag.insert(ARTICLE)
+    assert rag.storage.get(doc_id)["content"] == ARTICLE
+    rag.close()
+
+
+def test_check_cost_does_not_grow_with_corpus():
+    dedup = Deduplicator(threshold=0.9)
+    corpus = generate_corpus(4000)
+    probes = generate_corpus(200, seed=7)
+
+    def check_time():
+        start = time.perf_counter()
+        dedup.filter([(str(i), text) for i, text in enumerate(probes)])
+        dedup.discard(str(i) for i in range(len(probes)))
+        return time.perf_counter() - start
+
+    dedup.add_many((f"small{i}", text) for i, text in enumerate(corpus[:200]))
+    small = check_time()
+    dedup.add_many((f"large{i}", text) for i, text in enumerate(corpus[200:]))
+    assert check_time() < 3 * small + 0.05
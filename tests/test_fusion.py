@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.fusion import reciprocal_rank_fusion
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c"], ["c", "d"]], k=1)
+    assert [item for item, _ in fused] == ["c", "b", "a", "d"]
+    assert fused[0][1] == 1 / 4 + 1 / 3 + 1 / 2
+
+    weighted = reciprocal_rank_fusion([["a"], ["b"]], weights=[1.0, 2.0])
+    assert [item for item, _ in weighted] == ["b", "a"]
+
+
+def test_retrieve_fuses_without_llm_calls(tmp_path):
+    prompts = []
+
+    def llm(prompt, temperature=0.7):
+        prompts.append(prompt)
+        return "answer"
+
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding)
+    rag.insert_many([
+        "LoRA adapts large models with low rank matrices.",
+        "LoRA adapts large models with low rank matrices.",
+        "PyTorch implements LoRA for fine-tuning.",
+        "Gardening tips for spring tomatoes.",
+    ])
+    passages = rag.retrieve("LoRA fine-tuning", QueryParam(max_results=3))
+    assert prompts == []
+    contents = [p.content for p in passages]
+    assert len(contents) == len(set(contents))
+    assert contents[0] == "PyTorch implements LoRA for fine-tuning."
+    assert set(passages[0].sources) == {"keyword", "vector", "graph"}
+    assert [p.score for p in passages] == sorted((p.score for p in passages), reverse=True)
+
+    assert rag.query("LoRA fine-tuning", QueryParam(mode="hybrid")) == "answer"
+    assert len(prompts) == 1 and "PyTorch implements LoRA" in prompts[0]
+    rag.close()
@@ -0,0 +1,59 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.graph import KnowledgeGraph, extract_entities
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+
+
+def test_extract_entities_and_cooccurrence():
+    entities, relations = extract_entities(
+        "The LoRA method adapts Large Language Models. PyTorch implements LoRA."
+    )
+    assert entities == ["LoRA", "Large Language Models", "PyTorch"]
+    assert relations == [("LoRA", "Large Language Models"), ("PyTorch", "LoRA")]
+
+
+def test_graph_neighbourhood_and_persistence(tmp_path):
+    graph = KnowledgeGraph(str(tmp_path))
+    graph.add_many([
+        ("c1", (["A", "B"], [("A", "B")])),
+        ("c2", (["B", "C"], [("B", "C")])),
+        ("c3", (["C", "D"], [("C", "D")])),
+    ])
+    a = graph.match("tell me about a")[0]
+    assert {graph.names[n] for n in graph.neighbourhood([a], 1)} == {"A", "B"}
+    assert {graph.names[n] for n in graph.neighbourhood([a], 2)} == {"A", "B", "C"}
+
+    reopened = KnowledgeGraph(str(tmp_path))
+    b = reopened.node_ids["b"]
+    assert reopened.degree(b) == 2
+    assert reopened.shared_sources(b, reopened.node_ids["c"]) == ["c2"]
+    assert "c3" in reopened
+
+
+def test_local_and_global_use_the_graph(tmp_path):
+    prompts = []
+
+    def llm(prompt, temperature=0.7):
+        prompts.append(prompt)
+        return "answer"
+
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding)
+    rag.insert_many([
+        "Supervised Fine-Tuning adapts a Base Model with labelled examples.",
+        "LoRA is a cheap alternative to Supervised Fine-Tuning.",
+        "The Base Model was pretrained by OpenAI.",
+        "Paris is the capital of France.",
+    ])
+
+    rag.query("What is supervised fine-tuning?", QueryParam(mode="local", hops=1))
+    assert "Supervised Fine-Tuning -- LoRA" in prompts[-1]
+    assert "labelled examples" in prompts[-1]
+    assert "Paris" not in prompts[-1]
+
+    rag.query("How does LoRA relate to OpenAI?", QueryParam(mode="global"))
+    assert "Base Model -- OpenAI" in prompts[-1]
+    assert "Paris" not in prompts[-1]
+    rag.close()
@@ -0,0 +1,175 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import threading
+
+import pytest
+
+from lightrag.ingest import IngestPipeline
+from lightrag.lightrag import LightRAG, QueryParam, compute_doc_id
+from lightrag.llm import hash_embedding
+from lightrag.testing import FakeLLM, generate_corpus
+
+
+def make_rag(tmp_path, embedding_func=hash_embedding, **kwargs):
+    return LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=embedding_func,
+                    background_ingest=True, **kwargs)
+
+
+def test_inserts_return_at_once_and_embed_in_micro_batches(tmp_path):
+    calls = []
+    release = threading.Event()
+
+    def embed(texts):
+        release.wait(5)
+        calls.append(len(texts))
+        return hash_embedding(texts)
+
+    rag = make_rag(tmp_path, embed)
+    docs = generate_corpus(60)
+    ids = [rag.insert(doc) for doc in docs]
+    assert ids == [compute_doc_id(doc) for doc in docs]
+    assert rag.ingest.stats.pending == 60  # Nothing indexed while embedding is stalled
+
+    release.set()
+    assert rag.flush(timeout=10)
+    assert rag.ingest.stats.indexed == 60 and rag.ingest.stats.pending == 0
+    assert len(calls) < 10 and sum(calls) >= 60
+    assert len(rag.retrieve(docs[0], QueryParam(max_results=3))) == 3
+    rag.close()
+
+
+def test_wait_indexed_reports_duplicates_and_failures(tmp_path):
+    fail = threading.Event()
+
+    def embed(texts):
+        if fail.is_set():
+            raise RuntimeError("embedding service down")
+        return hash_embedding(texts)
+
+    rag = make_rag(tmp_path, embed)
+    first = rag.insert("Python is a popular programming language.")
+    assert rag.wait_indexed(first, timeout=5) == first
+    copy = rag.insert("python is a popular   programming language.")
+    assert rag.wait_indexed(copy, timeout=5) == first
+
+    fail.set()
+    doc_id = rag.insert("Rust is a systems language.")
+    with pytest.raises(RuntimeError, match="embedding service down"):
+        rag.wait_indexed(doc_id, timeout=5)
+    assert list(rag.ingest.failed) == [doc_id]
+    rag.close()
+
+    # The failed document stays journaled and is ingested by the next pipeline
+    rag = make_rag(tmp_path)
+    assert rag.wait_indexed(doc_id, timeout=5) == doc_id
+    assert rag.corpus.get(doc_id) is not None
+    rag.close()
+    with open(os.path.join(tmp_path, IngestPipeline.JOURNAL_FILENAME)) as f:
+        assert f.read() == ""
+
+
+def test_resume_from_journal_after_crash(tmp_path):
+    docs = generate_corpus(5)
+    rows = [(compute_doc_id(doc), doc) for doc in docs]
+    with open(os.path.join(tmp_path, IngestPipeline.JOURNAL_FILENAME), "w") as f:
+        for doc_id, content in rows:
+            f.write(json.dumps({"id": doc_id, "content": content}) + "\n")
+        f.write(json.dumps({"done": [rows[0][0]]}) + "\n")
+        f.write('{"id": "torn')  # Process killed mid-write
+
+    rag = make_rag(tmp_path)
+    assert rag.flush(timeout=10)
+    assert rag.ingest.stats.indexed == 4
+    assert all(rag.corpus.get(doc_id) is not None for doc_id, _ in rows[1:])
+    rag.close()
+
+
+def test_submit_blocks_while_queue_is_full(tmp_path):
+    release = threading.Event()
+
+    def embed(texts):
+        release.wait(5)
+        return hash_embedding(texts)
+
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=embed)
+    pipeline = IngestPipeline(rag, batch_size=1, max_queued=2)
+    writer = threading.Thread(
+        target=lambda: [pipeline.submit([(compute_doc_id(d), d)]) for d in generate_corpus(8)]
+    )
+    writer.start()
+    writer.join(0.3)
+    assert writer.is_alive()
+    release.set()
+    writer.join(5)
+    assert not writer.is_alive()
+    assert pipeline.flush(timeout=10) and pipeline.stats.indexed == 8
+    pipeline.close()
+
+
+def test_queries_run_safely_while_batches_commit(tmp_path):
+    rag = make_rag(tmp_path)
+    docs = generate_corpus(1000)
+    rag.insert_many(docs[:50])
+    rag.flush(timeout=10)
+    queries = [" ".join(doc.split()[:12]) for doc in docs[:60]]
+    done = threading.Event()
+
+    def insert():
+        for start in range(50, len(docs), 25):
+            rag.insert_many(docs[start:start + 25])
+        rag.flush(timeout=60)
+        done.set()
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-4)  # Switch threads often enough to interleave reads and commits
+    try:
+        thread = threading.Thread(target=insert)
+        thread.start()
+        failures = []
+        while not done.is_set():
+            for mode in ("naive", "local", "global"):
+                results = rag.query_many(queries, QueryParam(mode=mode))
+                failures.extend(result.error for result in results if not result.ok)
+        thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert failures == []
+    assert rag.keyword_index.doc_count == len(rag.chunks)
+    rag.close()
+
+
+def test_staged_documents_are_indexed_after_a_failed_commit(tmp_path):
+    rag = make_rag(tmp_path)
+    rag.retrieve("warm up")  # Past the first sync, which checks every document
+    add_many = rag.graph.add_many
+
+    def fail_once(extractions):
+        rag.graph.add_many = add_many
+        raise RuntimeError("graph write failed")
+
+    rag.graph.add_many = fail_once
+    doc = "Rust guarantees memory safety without a garbage collector"
+    doc_id = rag.insert(doc)
+    with pytest.raises(RuntimeError, match="graph write failed"):
+        rag.wait_indexed(doc_id, timeout=5)
+    # The document is mirrored, so only the retry set gets it indexed
+    assert rag.corpus.get(doc_id) is not None and not rag.chunks.has_doc(doc_id)
+    passages = rag.retrieve("memory safety", QueryParam(mode="naive"))
+    assert [passage.doc_id for passage in passages] == [doc_id]
+    rag.close()
+
+
+def test_staged_but_uncommitted_batch_is_indexed_on_reopen(tmp_path):
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=hash_embedding)
+    docs = generate_corpus(3)
+    rag._stage_batch([(compute_doc_id(doc), doc) for doc in docs])
+    rag.close()  # Process stops before the commit
+
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=hash_embedding)
+    passages = rag.retrieve(docs[1], QueryParam(mode="naive", max_results=1))
+    assert passages[0].doc_id == compute_doc_id(docs[1])
+    assert all(rag.chunks.has_doc(compute_doc_id(doc)) for doc in docs)
+    rag.close()
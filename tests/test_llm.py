@@ -0,0 +1,107 @@
+import sys
+import os
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag import llm
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers chat completions by echoing the prompt; throttles the first requests"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            throttle = server.throttle > 0
+            server.throttle -= 1
+
+        if throttle:
+            payload = json.dumps({"error": {"message": "slow down", "type": "rate_limit"}}).encode()
+            self.send_response(429)
+            self.send_header("Retry-After", "0.05")
+        else:
+            prompt = body["messages"][-1]["content"]
+            payload = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": f"echo: {prompt}"},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+            }).encode()
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.connections = set()
+    server.throttle = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    llm.clear_chat_clients()
+    yield server, f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+    llm.clear_chat_clients()
+
+
+def test_clients_are_pooled_per_configuration(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    a = llm.get_chat_client("gpt-4", 25, 0.7, "http://localhost:1/v1")
+    assert llm.get_chat_client("gpt-4", 25, 0.7, "http://localhost:1/v1") is a
+    assert llm.get_chat_client("gpt-4", 60, 0.7, "http://localhost:1/v1") is not a
+    llm.clear_chat_clients()
+
+
+def test_complete_reuses_connections(stub_server):
+    server, base_url = stub_server
+    for i in range(3):
+        assert llm.complete(f"hello {i}", base_url=base_url) == f"echo: hello {i}"
+    assert server.requests == 3
+    assert len(server.connections) == 1
+
+
+def test_batch_complete_retries_rate_limits(stub_server):
+    server, base_url = stub_server
+    server.throttle = 2
+    prompts = [f"prompt {i}" for i in range(10)]
+    results = asyncio.run(llm.abatch_complete(prompts, base_url=base_url, concurrency=4, backoff=0.01))
+    assert results == [f"echo: {p}" for p in prompts]
+    assert server.requests == 12
+
+
+def test_batch_complete_gives_up_after_max_retries(stub_server):
+    server, base_url = stub_server
+    server.throttle = 100
+    with pytest.raises(llm.openai.RateLimitError):
+        asyncio.run(llm.abatch_complete(["p"], base_url=base_url, max_retries=1, backoff=0.01))
+    assert server.requests == 2
+
+
+def test_pooled_client_survives_across_event_loops(stub_server):
+    server, base_url = stub_server
+    for i in range(2):
+        assert asyncio.run(llm.acomplete(f"run {i}", base_url=base_url)) == f"echo: run {i}"
@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from lightrag.bm25 import BM25Index
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.storage import SupabaseStorage
+from lightrag.testing import FakeLLM, FakeSupabaseClient, generate_corpus, generate_queries
+from lightrag.vector_index import VectorIndex
+
+
+def test_batched_search_matches_single_search():
+    docs = generate_corpus(200)
+    queries = generate_queries(10)
+    keyword = BM25Index()
+    keyword.add_many((str(i), text) for i, text in enumerate(docs))
+    for hits, query in zip(keyword.search_many(queries, 5), queries):
+        single = keyword.search(query, 5)
+        assert [doc_id for doc_id, _ in hits] == [doc_id for doc_id, _ in single]
+        assert np.allclose([s for _, s in hits], [s for _, s in single])
+
+    vectors = VectorIndex()
+    vectors.add_many([str(i) for i in range(len(docs))], hash_embedding(docs))
+    batched = vectors.search_many(hash_embedding(queries), 5)
+    for query, hits in zip(queries, batched):
+        single = vectors.search(hash_embedding([query])[0], 5)
+        assert [doc_id for doc_id, _ in hits] == [doc_id for doc_id, _ in single]
+        assert np.allclose([s for _, s in hits], [s for _, s in single])
+
+
+def test_query_many_shares_work_and_isolates_errors(tmp_path):
+    embedding_calls = []
+
+    def embed(texts):
+        embedding_calls.append(len(texts))
+        return hash_embedding(texts)
+
+    llm = FakeLLM()
+
+    def flaky_llm(prompt, temperature=0.7):
+        if "explode" in prompt:
+            raise RuntimeError("model overloaded")
+        return llm(prompt, temperature)
+
+    client = FakeSupabaseClient()
+    rag = LightRAG(str(tmp_path), flaky_llm, storage=SupabaseStorage(client=client), embedding_func=embed)
+    rag.insert_many(generate_corpus(50))
+    rag.retrieve("warm up the corpus mirror")
+    embedding_calls.clear()
+    requests = client.requests
+
+    queries = generate_queries(6) + [generate_queries(1)[0], "explode Protocol Alder"]
+    results = rag.query_many(queries, QueryParam(mode="hybrid"))
+
+    assert [r.query for r in results] == queries
+    assert all(r.ok and r.answer and r.documents for r in results[:7])
+    assert results[6] is results[0]
+    assert isinstance(results[7].error, RuntimeError)
+    assert embedding_calls == [7]
+    assert client.requests - requests == 1
+    assert llm.calls == 6
+    rag.close()
+
+
+def test_batched_retrieval_failure_falls_back_per_query(tmp_path):
+    def embed(texts):
+        if len(texts) > 1 and not any(text.startswith("Document") for text in texts):
+            raise RuntimeError("batch too large")  # Fails the batched query embedding only
+        if any("poison" in text for text in texts):
+            raise ValueError("bad input")
+        return hash_embedding(texts)
+
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=embed)
+    rag.insert_many([f"Document {i}: {text}" for i, text in enumerate(generate_corpus(30))])
+    queries = generate_queries(4) + ["poison query"]
+    results = rag.query_many(queries, QueryParam(mode="semantic"))
+    assert all(result.ok and result.documents for result in results[:4])
+    assert isinstance(results[4].error, ValueError)
+    assert [result.answer for result in results[:4]] == [rag.query(query, QueryParam(mode="semantic"))
+                                                        for query in queries[:4]]
+    rag.close()
@@ -0,0 +1,194 @@
+import sys
+import os
+import asyncio
+import threading
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from aiohttp.test_utils import TestClient, TestServer
+
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.server import SERVICE, EmbeddingBatcher, QueryBatcher, create_app
+from lightrag.testing import FakeLLM, generate_corpus, generate_queries
+from lightrag.tracing import MetricsRegistry
+
+DOCS = [
+    "Python is a popular programming language for data science",
+    "Rust guarantees memory safety without a garbage collector",
+    "LoRA adapters fine tune large language models cheaply",
+]
+
+
+def make_rag(path, llm=None, **options):
+    return LightRAG(str(path), llm or FakeLLM(), storage="local", embedding_func=hash_embedding,
+                    metrics=MetricsRegistry(), **options)
+
+
+def parse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], lines["data"]))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_endpoints_end_to_end(tmp_path):
+    rag = make_rag(tmp_path)
+    async with TestClient(TestServer(create_app(rag, close_rag=True))) as client:
+        response = await client.post("/insert", json={"documents": DOCS})
+        assert response.status == 200
+        ids = (await response.json())["ids"]
+        assert len(ids) == 3
+        response = await client.post("/insert", json={"content": "Go has goroutines for concurrency"})
+        assert len((await response.json())["ids"]) == 1
+
+        response = await client.post("/retrieve", json={"query": "memory safety", "max_results": 2})
+        passages = (await response.json())["passages"]
+        assert passages[0]["doc_id"] == ids[1]
+        assert len(passages) <= 2 and {"id", "content", "score", "sources"} <= set(passages[0])
+
+        param = QueryParam(mode="naive", max_results=2)
+        response = await client.post("/query", json={"query": "memory safety", "mode": "naive", "max_results": 2})
+        body = await response.json()
+        assert response.status == 200
+        assert body["answer"] == await rag.aquery("memory safety", param)
+        assert body["documents"][0] == ids[1]
+
+        response = await client.post("/query/stream", json={"query": "memory safety", "mode": "naive"})
+        assert response.headers["Content-Type"] == "text/event-stream"
+        events = parse_events(await response.text())
+        assert [name for name, _ in events][0] == "retrieval" and events[-1][0] == "done"
+        assert {name for name, _ in events[1:-1]} == {"token"}
+
+        for body in ({"query": "x", "mode": "fast"}, {"query": "x", "depth": 2}, {"query": ""},
+                     {"query": "x", "max_results": "5"}):
+            response = await client.post("/query", json=body)
+            assert response.status == 400 and "error" in await response.json()
+        response = await client.post("/insert", data="not json")
+        assert response.status == 400
+
+        health = await (await client.get("/health")).json()
+        assert health == {"status": "ok", "documents": 4, "active": 0, "queued": 0}
+        metrics = await (await client.get("/metrics")).text()
+        assert 'lightrag_http_requests_total{endpoint="/query",status="200"} 1' in metrics
+        assert 'lightrag_http_requests_total{endpoint="/query",status="400"} 4' in metrics
+        assert "lightrag_queries_total" in metrics
+    assert rag.embedding_func is hash_embedding
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_are_coalesced_and_batched(tmp_path):
+    llm = FakeLLM(latency=0.2)
+    rag = make_rag(tmp_path, llm)
+    rag.insert_many(generate_corpus(30))
+    embedded = []
+    embed = rag.embedding_func = lambda texts: embedded.append(len(texts)) or hash_embedding(texts)
+    queries = generate_queries(4)
+    app = create_app(rag, batch_delay=0.02)
+    async with TestClient(TestServer(app)) as client:
+        llm.reset()
+        requests = [{"query": queries[0], "mode": "semantic"}] * 8 + [
+            {"query": query, "mode": "semantic"} for query in queries[1:]]
+        responses = await asyncio.gather(*(client.post("/query", json=body) for body in requests))
+        bodies = [await response.json() for response in responses]
+        assert all(response.status == 200 for response in responses)
+        assert len({body["answer"] for body in bodies[:8]}) == 1
+        assert llm.calls == 4  # One synthesis per distinct query
+        assert embedded == [4]  # One embedding call for the whole batch
+        assert app[SERVICE].batcher.batches == 1
+        metrics = await (await client.get("/metrics")).text()
+        assert "lightrag_http_coalesced_total 7" in metrics
+    assert rag.embedding_func is embed
+    rag.close()
+
+
+@pytest.mark.asyncio
+async def test_overload_is_shed_with_429(tmp_path):
+    rag = make_rag(tmp_path, FakeLLM(latency=0.3))
+    rag.insert_many(DOCS)
+    app = create_app(rag, max_active=1, max_queued=1, close_rag=True)
+    async with TestClient(TestServer(app)) as client:
+        responses = await asyncio.gather(*(
+            client.post("/query", json={"query": f"language {i}", "mode": "naive"}) for i in range(5)))
+        statuses = sorted(response.status for response in responses)
+        assert statuses == [200, 200, 429, 429, 429]
+        shed = [response for response in responses if response.status == 429]
+        assert all(response.headers["Retry-After"] == "1" for response in shed)
+        assert app[SERVICE].admission.active == 0
+        metrics = await (await client.get("/metrics")).text()
+        assert 'lightrag_http_shed_total{endpoint="/query"} 3' in metrics
+
+
+@pytest.mark.asyncio
+async def test_inserts_while_querying(tmp_path):
+    rag = make_rag(tmp_path)
+    docs = generate_corpus(600)
+    rag.insert_many(docs[:40])
+    queries = [" ".join(doc.split()[:12]) for doc in docs[:40]]
+    app = create_app(rag, max_active=64, max_queued=256, close_rag=True)
+
+    async def insert(client):
+        for start in range(40, len(docs), 40):
+            response = await client.post("/insert", json={"documents": docs[start:start + 40]})
+            assert response.status == 200
+
+    async def query(client):
+        statuses = []
+        for mode in ("naive", "local", "global", "hybrid") * 2:
+            responses = await asyncio.gather(*(client.post("/query", json={"query": query, "mode": mode})
+                                               for query in queries))
+            statuses += [response.status for response in responses]
+        return statuses
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-4)  # Switch threads often enough to interleave reads and inserts
+    try:
+        async with TestClient(TestServer(app)) as client:
+            _, statuses = await asyncio.gather(insert(client), query(client))
+            health = await (await client.get("/health")).json()
+    finally:
+        sys.setswitchinterval(interval)
+    assert set(statuses) == {200}
+    assert health["documents"] == len(docs)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_batch_releases_its_queries(tmp_path):
+    rag = make_rag(tmp_path, FakeLLM(latency=0.5))
+    rag.insert_many(DOCS)
+    batcher = QueryBatcher(rag, max_delay=0)
+    param = QueryParam(mode="naive")
+    future, started = batcher.submit("memory safety", param)
+    await asyncio.sleep(0.05)
+    for task in list(batcher._tasks):
+        task.cancel()
+    await asyncio.sleep(0.01)
+    assert future.cancelled() and not batcher.running("memory safety", param)
+
+    rag.llm_model_func = FakeLLM()
+    future, started = batcher.submit("memory safety", param)
+    assert started and (await future).ok
+    await batcher.close()
+    rag.close()
+
+
+def test_embedding_batcher_merges_concurrent_calls():
+    calls = []
+    batcher = EmbeddingBatcher(lambda texts: calls.append(list(texts)) or hash_embedding(texts), max_delay=0.05)
+    inputs = [[f"text {i}", f"other {i}"] for i in range(6)]
+    results = [None] * len(inputs)
+
+    def run(i):
+        results[i] = batcher(inputs[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) < len(inputs) and batcher.batches == len(calls)
+    for texts, vectors in zip(inputs, results):
+        assert np.allclose(vectors, hash_embedding(texts))
@@ -0,0 +1,87 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multiprocessing import shared_memory
+
+import pytest
+
+from lightrag.bm25 import BM25Index
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.shards import ShardedIndex, shard_of
+from lightrag.testing import FakeLLM, generate_corpus, generate_queries
+from lightrag.vector_index import VectorIndex
+
+
+def assert_same_ranking(expected, actual, places=6):
+    """Same scores in the same order, and the same ids apart from ties"""
+    assert [round(score, places) for _, score in actual] == [round(score, places) for _, score in expected]
+    boundary = round(expected[-1][1], places) if expected else None
+    untied = lambda hits: {item_id for item_id, score in hits if round(score, places) != boundary}
+    assert untied(actual) == untied(expected)
+
+
+def test_sharded_search_matches_the_unsharded_indexes():
+    texts = {f"chunk{i}": doc[:500] for i, doc in enumerate(generate_corpus(1200))}
+    items = list(texts.items())
+    keyword, vectors = BM25Index(), VectorIndex()
+    sharded = ShardedIndex(shards=3, workers=2)
+    try:
+        for start in range(0, len(items), 100):
+            batch = items[start:start + 100]
+            keyword.add_many(batch)
+            vectors.add_many([item_id for item_id, _ in batch], hash_embedding([text for _, text in batch]))
+            if start % 300 == 0:  # Catch up every few batches, as queries would
+                sharded.sync_keyword(keyword, texts.get)
+                sharded.sync_vectors(vectors)
+        sharded.sync_keyword(keyword, texts.get)
+        sharded.sync_vectors(vectors)
+
+        assert sum(len(ids) for ids in sharded.keyword_ids) == len(items)
+        assert all(shard_of(item_id, 3) == shard for shard, ids in enumerate(sharded.keyword_ids) for item_id in ids)
+        assert all(len(segments) <= 3 for segments in sharded.segments)
+
+        queries = generate_queries(15)
+        for expected, actual in zip(keyword.search_many(queries, 8), sharded.search_keyword(queries, 8)):
+            assert_same_ranking(expected, actual)
+        embeddings = hash_embedding(queries)
+        for expected, actual in zip(vectors.search_many(embeddings, 8), sharded.search_vectors(embeddings, 8)):
+            assert_same_ranking(expected, actual, places=5)
+    finally:
+        sharded.close()
+
+
+def test_first_sync_copies_an_exported_index():
+    keyword = BM25Index()
+    keyword.add_many([("a", "lora adapters fine tune llama"), ("b", "llama weights"), ("c", "rust borrow checker")])
+    sharded = ShardedIndex(shards=2, workers=1)
+    try:
+        sharded.sync_keyword(keyword, text_of=None)  # Never asked for texts on the first sync
+        assert sharded.search_keyword(["llama lora"], 5) == [keyword.search("llama lora", 5)]
+        assert sharded.search_keyword(["unknown"], 5) == [[]]
+    finally:
+        sharded.close()
+
+
+def test_lightrag_with_shards(tmp_path):
+    docs = generate_corpus(150)
+    plain = LightRAG(str(tmp_path / "plain"), FakeLLM(), storage="local", embedding_func=hash_embedding)
+    rag = LightRAG(str(tmp_path / "sharded"), FakeLLM(), storage="local", embedding_func=hash_embedding, shards=4)
+    for target in (plain, rag):
+        target.insert_many(docs[:100])
+    query = generate_queries(1)[0]
+    for mode in ("naive", "semantic"):
+        assert rag.query(query, QueryParam(mode=mode)) == plain.query(query, QueryParam(mode=mode))
+    names = [segment.segment.name for shard in rag.sharded.segments for segment in shard]
+
+    rag.insert_many(docs[100:])  # Picked up by the next search
+    passages = rag.retrieve(docs[-1][:200], QueryParam(max_results=1))
+    assert passages[0].doc_id in {rag.chunks.get(chunk_id).doc_id for chunk_id in rag.vector_index.ids[-20:]}
+    assert rag.sharded.keyword_count == rag.keyword_index.doc_count
+
+    rag.close()
+    plain.close()
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.snapshot import DIRNAME, open_snapshot
+from lightrag.storage import SupabaseStorage
+from lightrag.testing import FakeLLM, FakeSupabaseClient, generate_corpus, generate_queries
+
+
+def make_rag(tmp_path, client):
+    return LightRAG(str(tmp_path), FakeLLM(), storage=SupabaseStorage(client=client),
+                    embedding_func=hash_embedding, dedup_threshold=None)
+
+
+def ranking(rag, query):
+    return [(p.id, round(p.score, 6)) for p in rag.retrieve(query, QueryParam(max_results=5))]
+
+
+def test_reopened_snapshot_maps_state_and_skips_corpus_load(tmp_path):
+    client = FakeSupabaseClient()
+    rag = make_rag(tmp_path, client)
+    rag.insert_many(generate_corpus(300), batch_size=100)
+    queries = generate_queries(5)
+    expected = [ranking(rag, query) for query in queries]
+    keyword = [rag.keyword_index.search(query, 5) for query in queries]
+    directory = rag.save_snapshot()
+    rag.close()
+    assert sorted(os.listdir(directory)) == sorted([
+        "manifest.json", "documents.txt", "texts.bin", "text_offsets.npy",
+        "chunk_docs.txt", "chunk_offsets.npy", "chunk_spans.npy", "vector_ids.txt",
+        "embeddings.npy", "bm25_ids.txt", "doc_lengths.npy", "terms.txt", "term_offsets.npy",
+        "posting_rows.npy", "posting_tfs.npy", "graph_names.jsonl", "graph_chunks.txt",
+        "graph_edges.npy", "graph_weights.npy", "graph_source_offsets.npy", "graph_sources.npy",
+    ])
+
+    requests = client.requests
+    reopened = make_rag(tmp_path, client)
+    assert len(reopened.corpus) == 300 and not reopened.corpus.documents
+    assert isinstance(reopened.vector_index.matrix, np.memmap)
+    assert isinstance(reopened.keyword_index.base.posting_rows, np.memmap)
+    assert reopened.graph.adjacency == rag.graph.adjacency and reopened.graph.sources == rag.graph.sources
+    assert ranking(reopened, queries[0]) == expected[0]
+    assert client.requests - requests == 1  # Only the check for rows past the snapshot
+    assert [ranking(reopened, query) for query in queries] == expected
+    for query, hits in zip(queries, keyword):
+        assert [doc_id for doc_id, _ in reopened.keyword_index.search(query, 5)] == [d for d, _ in hits]
+    reopened.close()
+
+
+def test_writes_after_a_snapshot_are_replayed_from_the_logs(tmp_path):
+    client = FakeSupabaseClient()
+    rag = make_rag(tmp_path, client)
+    docs = generate_corpus(40)
+    rag.insert_many(docs[:30])
+    rag.save_snapshot()
+    rag.insert_many(docs[30:35])  # Appended to the logs after the snapshot
+    rag.close()
+
+    reopened = make_rag(tmp_path, client)
+    assert len(reopened.chunks) == len(rag.chunks)
+    assert reopened.keyword_index.doc_count == rag.keyword_index.doc_count
+    assert reopened.vector_index.size == rag.vector_index.size
+    assert reopened.graph.adjacency == rag.graph.adjacency and reopened.graph.sources == rag.graph.sources
+    reopened.insert_many(docs[35:])  # Grows the mapped matrix onto the heap
+    passages = reopened.retrieve(docs[-1][:200], QueryParam(max_results=1))
+    assert passages[0].content == docs[-1][:len(passages[0].content)]
+    assert len(reopened.corpus) == 40
+
+    first = open_snapshot(str(tmp_path)).directory
+    reopened.save_snapshot()
+    second = open_snapshot(str(tmp_path)).directory
+    assert first != second and not os.path.exists(first)
+    assert sorted(os.listdir(os.path.join(tmp_path, DIRNAME))) == sorted(["CURRENT", os.path.basename(second)])
+    reopened.close()
+
+    again = make_rag(tmp_path, client)
+    assert again.vector_index.size == reopened.vector_index.size
+    assert again.keyword_index.doc_count == reopened.keyword_index.doc_count
+    again.close()
@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import subprocess
+
+HEAVY_MODULES = ["numpy", "openai", "langchain_openai", "browser_use", "supabase"]
+
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from lightrag import LightRAG, QueryParam
+rag = LightRAG(sys.argv[1], lambda prompt, **kwargs: "", storage="local")
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def run_startup(working_dir):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, str(working_dir), *HEAVY_MODULES],
+        cwd=root, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_and_construction_skip_heavy_dependencies(tmp_path):
+    result = run_startup(tmp_path)
+    assert result["loaded"] == []
+    # Generous bound; typically well under 0.1s
+    assert result["seconds"] < 1.0
+
+
+def test_heavy_components_are_created_on_first_use(tmp_path):
+    from lightrag.lightrag import LightRAG
+    from lightrag.llm import hash_embedding
+    from lightrag.testing import FakeLLM
+
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=hash_embedding)
+    assert rag._vector_index is None and rag._dedup is None and rag._browser is None
+    assert rag._graph is None
+    rag.insert("Python is a popular programming language.")
+    assert rag._vector_index is not None and rag._dedup is not None
+    assert rag.retrieve("python")
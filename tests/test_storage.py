@@ -0,0 +1,84 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.storage import LocalStorage
+
+
+def fake_llm(prompt: str, temperature: float = 0.7) -> str:
+    """Deterministic stand-in for an LLM: echoes the prompt back"""
+    return f"ANSWER: {prompt}"
+
+
+@pytest.fixture
+def local_rag(tmp_path):
+    """Create a LightRAG instance backed by the local document store"""
+    rag = LightRAG(
+        working_dir=str(tmp_path / "lightrag_local"),
+        llm_model_func=fake_llm,
+        storage="local",
+        embedding_func=hash_embedding
+    )
+    yield rag
+    rag.close()
+
+
+def test_local_storage_roundtrip(tmp_path):
+    """Documents written to the local store survive reopening it"""
+    storage = LocalStorage(str(tmp_path))
+    storage.insert("a", "first document")
+    storage.insert("b", "second document")
+    storage.close()
+
+    storage = LocalStorage(str(tmp_path))
+    assert storage.count() == 2
+    assert storage.get("a")["content"] == "first document"
+    assert storage.get("missing") is None
+    assert [doc["id"] for doc in storage.all()] == ["a", "b"]
+    storage.close()
+
+
+def test_local_backend_insert_and_query(local_rag):
+    """The whole pipeline runs against the local backend"""
+    doc_id = local_rag.insert("Python is a popular programming language")
+    assert local_rag.storage.get(doc_id)["content"] == "Python is a popular programming language"
+    assert local_rag.supabase is None
+
+    for mode in ["naive", "local", "global", "semantic", "hybrid"]:
+        result = local_rag.query("python", QueryParam(mode=mode))
+        assert isinstance(result, str)
+        assert len(result) > 0
+
+
+def test_query_without_documents(local_rag):
+    """Querying an empty store reports that nothing is available"""
+    assert local_rag.query("anything") == "No documents available to search."
+
+
+def test_insert_many_batches_and_dedupes(local_rag):
+    """Bulk inserts stream in batches and derive ids from content"""
+    embed_calls = []
+
+    def counting_embedding(texts):
+        embed_calls.append(len(texts))
+        return hash_embedding(texts)
+
+    local_rag.embedding_func = counting_embedding
+    batches = []
+    docs = (f"document number {i}" for i in range(25))
+    doc_ids = local_rag.insert_many(docs, batch_size=10, on_batch=batches.append)
+
+    assert len(doc_ids) == len(set(doc_ids)) == 25
+    assert [b.size for b in batches] == [10, 10, 5]
+    assert batches[-1].total_inserted == 25
+    assert embed_calls == [10, 10, 5]
+    assert local_rag.storage.count() == 25
+
+    # Re-inserting existing content is a no-op and returns the same ids
+    assert local_rag.insert("document number 3") == doc_ids[3]
+    assert local_rag.insert_many(["document number 0"]) == [doc_ids[0]]
+    assert local_rag.storage.count() == 25
+    assert embed_calls == [10, 10, 5]
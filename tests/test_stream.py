@@ -0,0 +1,72 @@
+import sys
+import os
+import time
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+
+
+def llm(prompt, temperature=0.7):
+    return "intermediate answer"
+
+
+def stream_llm(prompt, temperature=0.7):
+    for token in ["Python ", "is ", "great"]:
+        time.sleep(0.01)
+        yield token
+
+
+@pytest.fixture
+def rag(tmp_path):
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding,
+                   llm_stream_func=stream_llm)
+    rag.insert_many([
+        "Python is a popular programming language",
+        "Java is used for enterprise applications",
+    ])
+    yield rag
+    rag.close()
+
+
+def test_query_stream_emits_retrieval_then_tokens(rag):
+    events = list(rag.query_stream("python", QueryParam(mode="naive", max_results=1)))
+    assert [e.type for e in events] == ["retrieval", "token", "token", "token", "done"]
+    assert len(events[0].documents) == 1
+    assert rag.corpus.get(events[0].documents[0])["content"].startswith("Python")
+    assert events[-1].text == "Python is great"
+    assert 0 < events[-1].time_to_first_token
+
+
+def test_hybrid_streams_only_the_final_synthesis(rag):
+    events = list(rag.query_stream("python", QueryParam(mode="hybrid")))
+    assert "".join(e.text for e in events if e.type == "token") == "Python is great"
+    assert rag.corpus.get(events[0].documents[0])["content"].startswith("Python")
+
+
+@pytest.mark.asyncio
+async def test_async_stream_and_fallback(tmp_path):
+    async def async_stream(prompt, temperature=0.7):
+        for token in ["a", "b"]:
+            yield token
+
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding,
+                   llm_stream_func=async_stream)
+    rag.insert("Rust guarantees memory safety")
+    tokens = [e.text async for e in rag.aquery_stream("memory", QueryParam(mode="local"))
+              if e.type == "token"]
+    assert tokens == ["a", "b"]
+
+    # Without a streaming function the whole completion arrives as one token
+    rag.llm_stream_func = None
+    tokens = [e.text async for e in rag.aquery_stream("memory", QueryParam(mode="local"))
+              if e.type == "token"]
+    assert tokens == ["intermediate answer"]
+    rag.close()
+
+
+def test_abandoned_stream_stops_cleanly(rag):
+    stream = rag.query_stream("python", QueryParam(mode="naive"))
+    assert next(stream).type == "retrieval"
+    stream.close()
@@ -0,0 +1,93 @@
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.summaries import SummaryTree
+
+
+async def join_summary(texts):
+    return "(" + " ".join(texts) + ")"
+
+
+def test_refresh_only_recomputes_affected_branch(tmp_path):
+    tree = SummaryTree(str(tmp_path), fanout=2)
+    tree.add(["a", "b", "c", "d", "e"])
+    assert asyncio.run(tree.refresh(join_summary, str.upper)) == 3 + 2 + 1
+    assert tree.summaries[(tree.height, 0)] == "(((A B) (C D)) ((E)))"
+
+    tree.add(["f"])
+    assert asyncio.run(tree.refresh(join_summary, str.upper)) == 3
+    assert tree.summaries[(3, 0)] == "(((A B) (C D)) ((E F)))"
+    assert asyncio.run(tree.refresh(join_summary, str.upper)) == 0
+
+    reopened = SummaryTree(str(tmp_path), fanout=2)
+    assert reopened.leaves == ["a", "b", "c", "d", "e", "f"]
+    assert reopened.summaries == tree.summaries
+    assert not reopened.is_stale
+
+
+def test_select_prefers_matching_branches():
+    tree = SummaryTree(fanout=2)
+    tree.add(["x", "y", "z"])
+    texts = {"x": "python code", "y": "more python", "z": "italian pizza"}
+    asyncio.run(tree.refresh(join_summary, texts.get))
+    assert tree.select("pizza", top_k=1) == [
+        "((python code more python) (italian pizza))", "(italian pizza)"
+    ]
+
+
+def test_global_mode_reads_cached_summaries(tmp_path):
+    prompts = []
+
+    def llm(prompt, temperature=0.7):
+        prompts.append(prompt)
+        return f"summary {len(prompts)}" if prompt.startswith("Summarize") else "answer"
+
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding,
+                   summary_fanout=2)
+    rag.insert_many([f"Fact number {i} about Topic {i}." for i in range(4)])
+
+    rag.query("Summarize the topics", QueryParam(mode="global"))
+    summary_calls = [p for p in prompts if p.startswith("Summarize the key")]
+    assert len(summary_calls) == 3
+    assert "Summaries:" in prompts[-1]
+
+    prompts.clear()
+    rag.query("Summarize the topics", QueryParam(mode="global"))
+    assert len(prompts) == 1
+
+    prompts.clear()
+    rag.insert("Fact number 4 about Topic 4.")
+    rag.query("Summarize the topics", QueryParam(mode="global"))
+    # New group, its new parent and the new root; the two existing groups are reused
+    assert len([p for p in prompts if p.startswith("Summarize the key")]) == 3
+    rag.close()
+
+
+def test_unsummarized_chunks_survive_a_restart(tmp_path):
+    def llm(prompt, temperature=0.7):
+        return "summary" if prompt.startswith("Summarize") else "answer"
+
+    def open_rag():
+        return LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding,
+                        summary_fanout=4)
+
+    rag = open_rag()
+    rag.insert_many([f"Fact number {i} about Topic {i}." for i in range(20)])
+    rag.close()
+
+    rag = open_rag()  # Nothing was summarized before the restart
+    assert rag.update_summaries() > 0
+    assert len(rag.summaries.leaves) == 20
+    assert rag.summaries.select("topics", 2)
+    rag.insert_many([f"Another fact {i} about Subject {i}." for i in range(20)])
+    rag.close()
+
+    rag = open_rag()  # Half summarized, half inserted since
+    rag.update_summaries()
+    assert len(rag.summaries.leaves) == len(rag.chunks) == 40
+    assert not rag.summaries.is_stale
+    rag.close()
@@ -0,0 +1,49 @@
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_lightrag import MODES, run
+from lightrag.corpus import CorpusMirror
+from lightrag.storage import SupabaseStorage
+from lightrag.testing import FakeLLM, FakeSupabaseClient, generate_corpus
+
+
+def test_fake_supabase_supports_storage_and_keyset_pages():
+    client = FakeSupabaseClient()
+    storage = SupabaseStorage(client=client)
+    storage.insert_many([(f"d{i}", f"document {i}") for i in range(25)])
+    storage.insert_many([("d0", "changed")])
+
+    assert storage.count() == 25
+    assert storage.get("d0")["content"] == "document 0"
+    assert [doc["id"] for doc in storage.get_many(["d3", "missing"])] == ["d3"]
+
+    mirror = CorpusMirror(storage, page_size=10)
+    mirror.refresh()
+    assert len(mirror.all()) == 25
+    storage.insert("late", "written by another process")
+    mirror.refresh(force=True)
+    assert mirror.get("late")["content"] == "written by another process"
+
+
+def test_fake_llm_counts_tokens():
+    llm = FakeLLM()
+    assert llm("one two three") == "one two three"
+    llm("four, five")
+    assert (llm.calls, llm.prompt_tokens) == (2, 6)
+    assert len(set(generate_corpus(50))) == 50
+
+
+def test_benchmark_report_is_json():
+    report = json.loads(json.dumps(run([30], query_count=4, web_searches=2)))
+    result = report["results"][0]
+    assert result["documents"] == 30
+    assert result["insert"]["storage_requests"] == 1
+    assert set(result["query"]) == set(MODES)
+    for mode in MODES:
+        stats = result["query"][mode]
+        assert stats["count"] == 4 and stats["llm_calls"] == 4
+        assert 0 < stats["p50_ms"] <= stats["p95_ms"]
+    assert result["query_many"]["hybrid"]["llm_calls"] == 4
+    assert result["search_web"]["count"] == 2
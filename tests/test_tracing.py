@@ -0,0 +1,76 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.testing import FakeLLM
+from lightrag.tracing import MetricsRegistry
+
+
+def make_rag(tmp_path, **kwargs):
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=hash_embedding, **kwargs)
+    rag.insert_many(["Python is a popular programming language.", "Rust is a systems language."])
+    return rag
+
+
+def test_trace_records_stages_llm_calls_and_cache(tmp_path):
+    traces = []
+    registry = MetricsRegistry()
+    rag = make_rag(tmp_path, metrics=registry, trace_sink=traces.append)
+
+    answer, trace = rag.query_traced("python language", QueryParam(mode="semantic", temperature=0))
+    assert answer and trace.error is None
+    assert traces == [trace]
+    assert {"storage", "retrieval", "embedding", "llm"} <= set(trace.stages)
+    assert trace.total_seconds >= trace.stages["retrieval"]
+    assert trace.llm_calls == 1 and trace.prompt_tokens > 0 and trace.completion_tokens > 0
+    assert (trace.cache_hits, trace.cache_misses) == (0, 1)
+
+    _, again = rag.query_traced("python language", QueryParam(mode="semantic", temperature=0))
+    assert (again.llm_calls, again.cache_hits) == (0, 1)
+    assert registry.counter("lightrag_queries_total", "", ("mode", "status")).value(
+        mode="semantic", status="ok") == 2
+    rag.close()
+
+
+def test_stream_and_failures_are_traced(tmp_path):
+    traces = []
+    rag = make_rag(tmp_path, metrics=None, trace_sink=traces.append)
+    list(rag.query_stream("python", QueryParam(mode="naive")))
+    assert traces[-1].llm_calls == 1 and "first_token" in traces[-1].stages
+
+    def broken(prompt, temperature=0.7):
+        raise RuntimeError("boom")
+
+    rag.llm_model_func = broken
+    try:
+        rag.query("python", QueryParam(mode="naive"))
+    except RuntimeError:
+        pass
+    assert traces[-1].error == "RuntimeError: boom"
+    rag.close()
+
+
+def test_prometheus_rendering():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests", ("path",)).inc(path='/a"b')
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.1)
+    latency.observe(5)
+    registry.gauge("queued", "Queued").set(3)
+    assert registry.render() == (
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1"} 1\n'
+        'latency_seconds_bucket{le="+Inf"} 2\n'
+        "latency_seconds_sum 5.1\n"
+        "latency_seconds_count 2\n"
+        "# HELP queued Queued\n"
+        "# TYPE queued gauge\n"
+        "queued 3\n"
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="/a\\"b"} 1\n'
+    )
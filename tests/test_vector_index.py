@@ -0,0 +1,53 @@
+import sys
+import os
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.lightrag import LightRAG, QueryParam
+from lightrag.llm import hash_embedding
+from lightrag.vector_index import VectorIndex
+
+
+def test_vector_search_orders_by_cosine():
+    index = VectorIndex()
+    index.add_many(["x", "y", "xy"], np.array([[1, 0], [0, 1], [1, 1]], dtype=np.float32))
+    hits = index.search([1, 0.1], top_k=2)
+    assert [item_id for item_id, _ in hits] == ["x", "xy"]
+    assert hits[0][1] > hits[1][1]
+    assert len(index.search([1, 0], top_k=10)) == 3
+
+
+def test_vector_index_persists(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    index.add("a", [3.0, 4.0])
+    index.add_many(["b", "a"], [[0.0, 2.0], [1.0, 1.0]])
+
+    reopened = VectorIndex(str(tmp_path))
+    assert reopened.ids == ["a", "b"]
+    assert reopened.matrix.dtype == np.float32
+    np.testing.assert_allclose(reopened.matrix[0], [0.6, 0.8], rtol=1e-6)
+
+
+def test_hash_embedding_is_deterministic():
+    a, b, c = hash_embedding(["deep learning frameworks", "deep learning frameworks", "sunny weather"])
+    np.testing.assert_array_equal(a, b)
+    assert float(a @ b) > float(a @ c)
+
+
+def test_semantic_mode_sends_only_top_documents(tmp_path):
+    prompts = []
+
+    def llm(prompt, temperature=0.7):
+        prompts.append(prompt)
+        return "answer"
+
+    rag = LightRAG(str(tmp_path), llm, storage="local", embedding_func=hash_embedding)
+    rag.insert("TensorFlow and PyTorch are popular deep learning frameworks")
+    rag.insert("The weather today is sunny with clear skies")
+    rag.insert("Italian cuisine is known for pasta and pizza")
+
+    rag.query("deep learning frameworks", QueryParam(mode="semantic", max_results=1))
+    assert len(prompts) == 1
+    assert "PyTorch" in prompts[0]
+    assert "pizza" not in prompts[0] and "sunny" not in prompts[0]
+    rag.close()
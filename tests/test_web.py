@@ -0,0 +1,59 @@
+import sys
+import os
+import asyncio
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lightrag.browser import BrowserManager, normalize_url
+from lightrag.lightrag import LightRAG
+from lightrag.llm import hash_embedding
+from lightrag.testing import FakeAgent, FakeBrowser, FakeController, FakeLLM
+
+STEP_LATENCY = 0.1
+
+
+def stub_factory(task, controller):
+    """Agent per topic; "slow" topics never finish, "dup" topics land on the same page"""
+    topic = task.rsplit(": ", 1)[1]
+    if topic.startswith("slow"):
+        return FakeAgent(task, "", "", steps=1000, latency=STEP_LATENCY)
+    url = "https://Example.com/shared/#top" if topic.startswith("dup") else f"https://example.com/{topic}"
+    return FakeAgent(task, f"Page about {topic}.", url, steps=2, latency=STEP_LATENCY / 2)
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.com/a/#frag") == normalize_url("https://example.com/a")
+    assert normalize_url("") == ""
+
+
+def test_search_web_many_runs_concurrently_and_dedups(tmp_path):
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=hash_embedding)
+    rag.browser = BrowserManager(agent_factory=stub_factory, controller_factory=FakeController)
+    batches = []
+    insert_many = rag.insert_many
+    rag.insert_many = lambda docs, batch_size: batches.append(len(docs)) or insert_many(docs, batch_size)
+
+    queries = [f"topic{i}" for i in range(8)] + ["dup-a", "dup-b", "slow"]
+    start = time.perf_counter()
+    contents = asyncio.run(rag.search_web_many(queries, concurrency=4, timeout=0.5, batch_size=3))
+    elapsed = time.perf_counter() - start
+
+    # Serially this would take 10 x 0.1s plus the 0.5s timeout
+    assert elapsed < 1.0
+    assert contents[:8] == [f"Page about topic{i}." for i in range(8)]
+    assert contents[8:10] == ["Page about dup-a.", "Page about dup-b."]
+    assert contents[10] is None
+    assert sum(batches) == 9 and max(batches) == 3
+    assert len(rag.corpus) == 9
+    assert len(rag.browser._idle_controllers) == 4
+    rag.close()
+
+
+def test_fake_browser_runs_without_browser_use(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "browser_use", None)  # Any import of it now fails
+    rag = LightRAG(str(tmp_path), FakeLLM(), storage="local", embedding_func=hash_embedding)
+    rag.browser = FakeBrowser()
+    contents = asyncio.run(rag.search_web_many(["alpha", "beta"], concurrency=2))
+    assert all(content and "information about" in content for content in contents)
+    assert len(rag.corpus) == 2
+    rag.close()